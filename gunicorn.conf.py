@@ -0,0 +1,40 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import os
+import shutil
+
+# Third-party imports: Other.
+from decouple import config
+
+###############################################################################
+# SERVER HOOKS
+###############################################################################
+
+"""
+Notes on the gunicorn configuration.
+
+* gunicorn loads this file from the working directory, so the Procfile needs
+no extra arguments.
+
+* With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to files
+in that directory (see thintimer/metrics.py). The directory is emptied when
+the server starts, so values of a previous run are not counted, and the
+files of exited workers are marked dead so their gauges are dropped.
+"""
+
+PROMETHEUS_MULTIPROC_DIR = config('PROMETHEUS_MULTIPROC_DIR', default='')
+
+def on_starting(server):
+    if PROMETHEUS_MULTIPROC_DIR:
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR)
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = PROMETHEUS_MULTIPROC_DIR
+
+def child_exit(server, worker):
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,7 +1,172 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+from datetime import datetime
+
+# Third-party imports: Django natives.
 from django.contrib import admin
-from .models import Task, Entry
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, QuerySet
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+# Local imports.
+from .models import Entry, Task
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the admin of large tables.
+
+* Changelists never count a whole table. `show_full_result_count` is off,
+and `EstimatedCountPaginator` takes the row count of an unfiltered table
+from the PostgreSQL statistics (`pg_class.reltuples`, summed over the
+partitions of a partitioned table). Filtered lists, and small or
+non-PostgreSQL tables, are counted exactly up to COUNT_LIMIT rows: pages past
+the limit are not linked, narrow the list with filters instead.
+
+* Rows are listed with their task or user joined (`list_select_related`),
+and foreign keys are edited with raw id or autocomplete widgets rather than
+a dropdown of every row.
+
+* The entries changelist is ordered by `start_time`, and its filters and date
+hierarchy are ranges on `start_time`, all served by the `entry_start_idx`
+index. The date hierarchy lists the years (or the months of a year) between
+the first and last entries, found with two index probes, instead of reading
+every entry for its distinct dates: a year or month without entries can be
+listed.
+"""
+
+# Above this many estimated rows, an unfiltered table is not counted.
+ESTIMATE_THRESHOLD = 100_000
+
+# Filtered lists are counted up to this many rows.
+COUNT_LIMIT = 100_000
+
+###############################################################################
+# PAGINATION
+###############################################################################
+
+def estimate_rows(model, using='default'):
+    """
+    Return the planner's estimate of the number of rows of a model's table.
+
+    Parameters
+    ----------
+    model : type
+        The model.
+    using : str, optional
+        The database alias.
+
+    Returns
+    -------
+    int or None
+        The estimated row count, or None if the database keeps no
+        statistics for it (other databases than PostgreSQL, or a table never
+        analyzed).
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+
+    # A partitioned table has no rows of its own: add up its partitions.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT SUM(reltuples) FROM pg_class WHERE reltuples > 0 AND (oid = %s::regclass "
+            "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass))",
+            [model._meta.db_table] * 2,
+        )
+        estimate = cursor.fetchone()[0]
+
+    return int(estimate) if estimate else None
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that estimates large counts instead of counting every row.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+###############################################################################
+# DATE HIERARCHY
+###############################################################################
+
+class DateRangeHierarchyQuerySet(QuerySet):
+    """
+    Entry queryset listing the years and months of the date hierarchy from
+    the first and last entries. See the notes above.
+    """
+
+    def datetimes(self, field_name, kind, *args, **kwargs):
+        if kind not in ('year', 'month'):
+            return super().datetimes(field_name, kind, *args, **kwargs)
+
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+
+        first, last = (timezone.localtime(bounds[key]) for key in ('first', 'last'))
+        if kind == 'year':
+            periods = [(year, 1) for year in range(first.year, last.year + 1)]
+        else:
+            periods = [
+                divmod(month, 12) for month in range(first.year * 12 + first.month - 1, last.year * 12 + last.month)
+            ]
+            periods = [(year, month + 1) for year, month in periods]
+
+        return [timezone.make_aware(datetime(year, month, 1)) for year, month in periods]
+
+###############################################################################
+# MODEL ADMINS
+###############################################################################
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """
+    Admin of tasks.
+    """
+
+    list_display = ('name', 'user', 'total_time_spent', 'created_at', 'entries')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'tags')
+    search_fields = ('name',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    @admin.display(description='Entries')
+    def entries(self, task):
+        url = reverse('admin:main_app_entry_changelist')
+        return format_html('<a href="{}?task__id__exact={}">View entries</a>', url, task.pk)
+
+@admin.register(Entry)
+class EntryAdmin(admin.ModelAdmin):
+    """
+    Admin of entries.
+    """
 
-# Register your models here.
+    list_display = ('id', 'task', 'start_time', 'end_time', 'total_time')
+    list_select_related = ('task',)
+    list_filter = (('start_time', admin.DateFieldListFilter),)
+    date_hierarchy = 'start_time'
+    ordering = ('-start_time',)
+    autocomplete_fields = ('task',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
-admin.site.register(Task)
-admin.site.register(Entry)
+    def get_queryset(self, request):
+        return DateRangeHierarchyQuerySet(self.model).order_by(*self.get_ordering(request))
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 class MainAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main_app'
+
+    def ready(self):
+        # Connect the login attempt counters of the metrics.
+        from thintimer import metrics  # noqa: F401
+
+        # Connect the placement of new users on the shards.
+        from . import sharding  # noqa: F401
@@ -0,0 +1,273 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import sys
+import zlib
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+# Third-party imports: Django natives.
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+# Local imports.
+from .models import Entry, EntryArchive, EntryRollup
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the entry archive.
+
+* Entries older than a cutoff are moved out of `main_app_entry` into
+`EntryArchive` rows, one per batch of entries of a single task. Each batch
+stores the entries as packed 64-bit integers (id, start, end in microseconds
+since the epoch) compressed with zlib, a few bytes per entry instead of a
+table row plus its index entries.
+
+* For every archived entry, its duration is added to the `EntryRollup` of its
+task and UTC day. Reports read the rollups next to the live entries, so their
+totals do not change when entries are archived. Their grouping by day, week
+or month may: archived time stays in its UTC day whatever the user's time
+zone (see user_auth/timezones.py).
+
+* `Task.total_time_spent` already includes archived entries, and neither
+archiving nor restoring touches it: entries are removed with a queryset
+delete and restored with `bulk_create`, which bypass `Entry.save()` and
+`Entry.delete()`.
+
+* Restoring reinserts the entries of whole batches with their original ids
+and subtracts them from the rollups.
+"""
+
+BATCH_SIZE = 5000
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+###############################################################################
+# ENCODING
+###############################################################################
+
+def pack_entries(rows):
+    """
+    Encode entries into a compressed binary payload.
+
+    Parameters
+    ----------
+    rows : iterable of tuple
+        The (id, start_time, end_time) of each entry.
+
+    Returns
+    -------
+    bytes
+        The zlib-compressed little-endian int64 triplets.
+    """
+    values = array('q')
+    for entry_id, start_time, end_time in rows:
+        values.extend((entry_id, (start_time - EPOCH) // MICROSECOND, (end_time - EPOCH) // MICROSECOND))
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return zlib.compress(values.tobytes())
+
+def unpack_entries(data):
+    """
+    Decode a payload produced by `pack_entries()`.
+
+    Parameters
+    ----------
+    data : bytes
+        The compressed payload.
+
+    Returns
+    -------
+    list of tuple
+        The (id, start_time, end_time) of each entry, with aware datetimes.
+    """
+    values = array('q')
+    values.frombytes(zlib.decompress(bytes(data)))
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return [
+        (values[i], EPOCH + values[i + 1] * MICROSECOND, EPOCH + values[i + 2] * MICROSECOND)
+        for i in range(0, len(values), 3)
+    ]
+
+###############################################################################
+# ROLLUPS
+###############################################################################
+
+def _apply_rollups(task_id, rows, sign, using=DEFAULT_DB_ALIAS):
+    """
+    Add (or subtract) entries from the daily rollups of a task.
+
+    Parameters
+    ----------
+    task_id : int
+        The task the entries belong to.
+    rows : list of tuple
+        The (id, start_time, end_time) of each entry.
+    sign : int
+        1 to add the entries, -1 to subtract them.
+    using : str, optional
+        The database alias holding the task.
+
+    Returns
+    -------
+    None
+    """
+    totals = defaultdict(lambda: [timedelta(0), 0])
+    for _, start_time, end_time in rows:
+        day_totals = totals[start_time.astimezone(dt_timezone.utc).date()]
+        day_totals[0] += end_time - start_time
+        day_totals[1] += 1
+
+    existing = {
+        rollup.day: rollup
+        for rollup in EntryRollup.objects.using(using).filter(task_id=task_id, day__in=list(totals))
+    }
+    to_create, to_update, to_delete = [], [], []
+
+    for day, (total_time, entry_count) in totals.items():
+        rollup = existing.get(day)
+        if rollup is None:
+            # Nothing to subtract from, e.g. the rollup was deleted by hand.
+            if sign > 0:
+                to_create.append(EntryRollup(task_id=task_id, day=day, total_time=total_time, entry_count=entry_count))
+            continue
+        rollup.total_time += sign * total_time
+        rollup.entry_count += sign * entry_count
+        if rollup.entry_count > 0:
+            to_update.append(rollup)
+        else:
+            to_delete.append(rollup.pk)
+
+    EntryRollup.objects.using(using).bulk_create(to_create)
+    EntryRollup.objects.using(using).bulk_update(to_update, ['total_time', 'entry_count'])
+    EntryRollup.objects.using(using).filter(pk__in=to_delete).delete()
+
+def rollups_for_range(user, start_date, end_date):
+    """
+    Return the archived totals of a user's tasks between two days.
+
+    Parameters
+    ----------
+    user : User
+        The owner of the tasks.
+    start_date : datetime.date
+        The first day (inclusive).
+    end_date : datetime.date
+        The last day (inclusive).
+
+    Returns
+    -------
+    QuerySet
+        A QuerySet of EntryRollup objects.
+    """
+    return EntryRollup.objects.filter(task__user=user, day__gte=start_date, day__lte=end_date)
+
+###############################################################################
+# ARCHIVE AND RESTORE
+###############################################################################
+
+def archive_entries(before, batch_size=BATCH_SIZE, progress=None, using=DEFAULT_DB_ALIAS):
+    """
+    Move every entry that started before a cutoff into the archive.
+
+    Each batch is archived in its own transaction, so the command can be
+    interrupted and resumed safely.
+
+    Parameters
+    ----------
+    before : datetime.datetime
+        Entries starting before this instant are archived.
+    batch_size : int, optional
+        Maximum number of entries per archive batch.
+    progress : callable, optional
+        Called with (task_id, count) after each batch.
+    using : str, optional
+        The database to archive, e.g. a shard (see main_app/sharding.py).
+
+    Returns
+    -------
+    int
+        The number of archived entries.
+    """
+    archived = 0
+    task_ids = list(
+        Entry.objects.using(using).filter(start_time__lt=before)
+        .order_by('task_id').values_list('task_id', flat=True).distinct()
+    )
+
+    for task_id in task_ids:
+        while True:
+            with transaction.atomic(using=using):
+                rows = list(
+                    Entry.objects.using(using).filter(task_id=task_id, start_time__lt=before)
+                    .order_by('start_time')
+                    .values_list('id', 'start_time', 'end_time')[:batch_size]
+                )
+                if not rows:
+                    break
+
+                EntryArchive.objects.using(using).create(
+                    task_id=task_id,
+                    start_time=rows[0][1],
+                    end_time=max(row[2] for row in rows),
+                    entry_count=len(rows),
+                    data=pack_entries(rows),
+                )
+                _apply_rollups(task_id, rows, 1, using)
+                Entry.objects.using(using).filter(id__in=[row[0] for row in rows]).delete()
+
+            archived += len(rows)
+            if progress:
+                progress(task_id, len(rows))
+
+    return archived
+
+def restore_entries(archives, batch_size=BATCH_SIZE, progress=None):
+    """
+    Move archived entries back into the entries table.
+
+    Parameters
+    ----------
+    archives : QuerySet
+        The EntryArchive batches to restore, restored on their database.
+    batch_size : int, optional
+        Number of entries per INSERT statement.
+    progress : callable, optional
+        Called with (task_id, count) after each batch.
+
+    Returns
+    -------
+    int
+        The number of restored entries.
+    """
+    restored = 0
+    using = archives.db
+
+    for archive_id in list(archives.order_by('pk').values_list('pk', flat=True)):
+        with transaction.atomic(using=using):
+            archive = EntryArchive.objects.using(using).select_for_update().get(pk=archive_id)
+            rows = unpack_entries(archive.data)
+
+            Entry.objects.using(using).bulk_create(
+                [Entry(id=entry_id, task_id=archive.task_id, start_time=start_time, end_time=end_time)
+                 for entry_id, start_time, end_time in rows],
+                batch_size=batch_size,
+            )
+            _apply_rollups(archive.task_id, rows, -1, using)
+            archive.delete()
+
+        restored += len(rows)
+        if progress:
+            progress(archive.task_id, len(rows))
+
+    return restored
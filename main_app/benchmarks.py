@@ -0,0 +1,742 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import json
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, reset_queries
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+# Third-party imports: Django DRF.
+from rest_framework.renderers import JSONRenderer
+
+# Local imports.
+from thintimer import compression
+from thintimer.renderers import MessagePackRenderer, ORJSONRenderer
+from . import loadgen
+from .models import Entry, Task
+from .serializers import EntrySerializer
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the benchmark suite.
+
+* `seed_data()` generates users, tagged tasks and entries with the load
+generator of main_app/loadgen.py, which bulk-inserts them.
+
+* `run_benchmarks()` requests every endpoint of `thintimer/urls.py` as one of
+the seeded users and records, per endpoint, the number of SQL queries, the
+p50/p99 latency and the peak Python memory allocated while serving it.
+
+* `render_pages()` times the rendering of every page template alone, first
+with empty template caches (loading and compiling the template, rendering
+the per-user fragments) and then warm.
+
+* `benchmark_renderers()` times the serialization of a large entry list, with
+both duration formats, and its rendering by each API renderer.
+
+* `benchmark_compression()` measures, for the largest API responses, the
+bytes saved and the CPU time spent by each response compression encoding.
+
+* `benchmark_sqlite_writes()` compares the throughput of concurrent entry
+creation on SQLite files with Django's default settings and with the tuned
+profile of thintimer/sqlite_tuned, counting the writes that failed with
+"database is locked".
+
+* `compare()` checks the results against a stored baseline. Query counts
+must not grow at all, since they do not depend on the machine; latency and
+memory may grow by a relative tolerance.
+
+* The `benchmark` management command runs the suite on a throw-away test
+database and can update the baseline. The test suite checks query counts
+only, on a small dataset.
+"""
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+BENCHMARK_PREFIX = 'benchmark'
+BENCHMARK_USERNAME = f'{BENCHMARK_PREFIX}0'
+BENCHMARK_PASSWORD = 'benchmark-password'
+BENCHMARK_METRICS_TOKEN = 'benchmark-metrics-token'
+METRICS = ('queries', 'p50_ms', 'p99_ms', 'peak_kb')
+
+# Page URL names mapped to their template and context, for `render_pages()`.
+PAGE_TEMPLATES = {
+    'home': ('homepage.html', {}),
+    'task_management': ('task_management.html', {}),
+    'edit_entries': ('edit_entries.html', {}),
+    'timer': ('timer.html', {}),
+    'run_reports': ('run_reports.html', {}),
+    'project_homepage': ('login.html', {}),
+    'signup_page': ('signup.html', {}),
+    'settings': ('settings.html', {'time_zone': 'UTC'}),
+}
+
+# Extra request headers of some benchmark cases, for `run_benchmarks()`. The
+# metrics endpoint is scraped with the token that the run configures.
+CASE_HEADERS = {
+    'metrics': {'HTTP_AUTHORIZATION': f'Bearer {BENCHMARK_METRICS_TOKEN}'},
+}
+
+# URL names of the largest API responses, for `benchmark_compression()`.
+COMPRESSION_CASES = ('entry-list', 'entry-get-entries-for-range', 'task-list', 'generate_report', 'export_account')
+
+# URL names that are not benchmarked, and why.
+EXCLUDED_URLS = {
+    'delete_account': "deletes the benchmark user",
+    'user_logout': "ends the benchmark session",
+    'password_reset_confirm': "requires a one-time token",
+    'entry-import-entries': "requires a file upload",
+}
+
+###############################################################################
+# DATA GENERATION
+###############################################################################
+
+def seed_data(users=10, tasks=5, entries=100, seed=0):
+    """
+    Generate the benchmark dataset.
+
+    Parameters
+    ----------
+    users : int, optional
+        Number of users.
+    tasks : int, optional
+        Average number of tasks per user.
+    entries : int, optional
+        Average number of entries per user, spread over the last 90 days.
+    seed : int, optional
+        Seed of the random generator, for reproducible datasets.
+
+    Returns
+    -------
+    User
+        The benchmark user.
+    """
+    loadgen.generate(
+        users=users, tasks=tasks, entries=entries, days=90, seed=seed,
+        prefix=BENCHMARK_PREFIX, password=BENCHMARK_PASSWORD,
+    )
+
+    return User.objects.get(username=BENCHMARK_USERNAME)
+
+###############################################################################
+# BENCHMARK CASES
+###############################################################################
+
+def benchmark_cases(user):
+    """
+    Return the requests to benchmark, one per URL name.
+
+    Parameters
+    ----------
+    user : User
+        The benchmark user, owner of the requested tasks and entries.
+
+    Returns
+    -------
+    dict
+        URL names mapped to (method, path, data) tuples. Idempotent writes
+        (updating the username to its current value, and so on) are used for
+        mutating endpoints.
+    """
+    entry = Entry.objects.filter(task__user=user).select_related('task').order_by('-start_time').first()
+    task = entry.task
+    today = timezone.localdate()
+    report = {'startDate': (today - timedelta(days=30)).isoformat(), 'endDate': today.isoformat()}
+
+    return {
+        'user_login': ('post', reverse('user_login'), {'username': user.username, 'password': BENCHMARK_PASSWORD}),
+        'user_signup': ('post', reverse('user_signup'), {'username': user.username, 'email': 'x@example.com', 'password': 'x'}),
+        'metrics': ('get', reverse('metrics'), None),
+        'api-root': ('get', reverse('api-root'), None),
+        'task-list': ('get', reverse('task-list'), None),
+        'task-detail': ('get', reverse('task-detail', kwargs={'pk': task.pk}), None),
+        'entry-list': ('get', reverse('entry-list'), None),
+        'entry-detail': ('get', reverse('entry-detail', kwargs={'pk': entry.pk}), None),
+        'entry-get-entries-for-date': (
+            'get', reverse('entry-get-entries-for-date', kwargs={'date': entry.start_time.date().isoformat()}), None,
+        ),
+        'entry-get-entries-for-range': (
+            'get', reverse('entry-get-entries-for-range'), {'start': report['startDate'], 'end': report['endDate'], 'totals': 'true'},
+        ),
+        'generate_report': ('get', reverse('generate_report'), dict(report, group_by='task,day')),
+        'generate_xlsx_report': ('get', reverse('generate_xlsx_report'), dict(report, frequency='daily')),
+        'export_account': ('get', reverse('export_account'), None),
+        'update_username': ('post', reverse('update_username'), {'new_username': user.username}),
+        'update_email': ('post', reverse('update_email'), {'new_email': user.email}),
+        'update_time_zone': ('post', reverse('update_time_zone'), {'time_zone': 'UTC'}),
+        'reset_password': (
+            'post', reverse('reset_password'), {'old_password': BENCHMARK_PASSWORD, 'new_password': BENCHMARK_PASSWORD},
+        ),
+        'project_homepage': ('get', reverse('project_homepage'), None),
+        'signup_page': ('get', reverse('signup_page'), None),
+        'home': ('get', reverse('home'), None),
+        'task_management': ('get', reverse('task_management'), None),
+        'edit_entries': ('get', reverse('edit_entries'), None),
+        'timer': ('get', reverse('timer'), None),
+        'run_reports': ('get', reverse('run_reports'), None),
+        'settings': ('get', reverse('settings'), None),
+        'password_reset': ('get', reverse('password_reset'), None),
+        'password_reset_done': ('get', reverse('password_reset_done'), None),
+        'password_reset_complete': ('get', reverse('password_reset_complete'), None),
+    }
+
+def url_names():
+    """
+    Return the names of the project's URL patterns, outside of the admin.
+
+    Returns
+    -------
+    set of str
+        The URL names.
+    """
+    names = set()
+    patterns = list(get_resolver().url_patterns)
+
+    while patterns:
+        pattern = patterns.pop()
+        if hasattr(pattern, 'url_patterns'):
+            if getattr(pattern, 'app_name', None) != 'admin':
+                patterns.extend(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+
+    return names
+
+###############################################################################
+# MEASUREMENT
+###############################################################################
+
+def _percentile(values, percentile):
+    """
+    Return a percentile of a list of values, by nearest rank.
+
+    Parameters
+    ----------
+    values : list of float
+        The measured values.
+    percentile : float
+        The percentile, between 0 and 100.
+
+    Returns
+    -------
+    float
+        The value at that rank.
+    """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(percentile / 100 * len(ordered)) - 1))
+
+    return ordered[rank]
+
+def measure(client, method, path, data, repeat=20, measure_memory=True, headers=None):
+    """
+    Measure one endpoint.
+
+    Parameters
+    ----------
+    client : Client
+        A logged in test client.
+    method : str
+        'get' or 'post'.
+    path : str
+        The URL path.
+    data : dict or None
+        Query parameters (GET) or JSON body (POST).
+    repeat : int, optional
+        Number of timed requests.
+    measure_memory : bool, optional
+        Also make one request under tracemalloc to record peak memory.
+    headers : dict, optional
+        Extra request headers, as WSGI environ keys.
+
+    Returns
+    -------
+    dict
+        The `status`, `queries`, `p50_ms`, `p99_ms` and `peak_kb` metrics.
+    """
+    headers = headers or {}
+
+    def request():
+        if method == 'get':
+            response = client.get(path, data, **headers)
+        else:
+            response = client.post(path, data, content_type='application/json', **headers)
+        # Streaming responses do their work while they are consumed.
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    # Warm up caches, then count queries on a single request. Each request
+    # resets the query log, so it must start out empty.
+    request()
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response = request()
+    query_count = len(queries)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        request()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    peak_kb = None
+    if measure_memory:
+        tracemalloc.start()
+        request()
+        peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'queries': query_count,
+        'p50_ms': round(statistics.median(timings), 3) if timings else None,
+        'p99_ms': round(_percentile(timings, 99), 3) if timings else None,
+        'peak_kb': peak_kb,
+    }
+
+def run_benchmarks(user, repeat=20, measure_memory=True, names=None):
+    """
+    Measure every benchmarked endpoint as a user.
+
+    Parameters
+    ----------
+    user : User
+        The benchmark user.
+    repeat : int, optional
+        Number of timed requests per endpoint.
+    measure_memory : bool, optional
+        Also record peak memory.
+    names : iterable of str, optional
+        Only measure these URL names.
+
+    Returns
+    -------
+    dict
+        URL names mapped to their metrics, see `measure()`.
+    """
+    client = Client()
+    results = {}
+
+    # Page templates resolve static URLs without the manifest produced by
+    # collectstatic, which does not exist on a fresh checkout.
+    with override_settings(
+        STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        METRICS_ENABLED=True, METRICS_TOKEN=BENCHMARK_METRICS_TOKEN,
+    ):
+        for name, (method, path, data) in sorted(benchmark_cases(user).items()):
+            if names and name not in names:
+                continue
+            # Password changes rotate the session hash, so log in afresh.
+            user.refresh_from_db()
+            client.force_login(user)
+            results[name] = measure(
+                client, method, path, data, repeat=repeat, measure_memory=measure_memory, headers=CASE_HEADERS.get(name),
+            )
+
+    return results
+
+def _time(function, repeat):
+    """
+    Return the median duration of calls to a function, in milliseconds.
+
+    Parameters
+    ----------
+    function : callable
+        The function, called without arguments.
+    repeat : int
+        Number of timed calls.
+
+    Returns
+    -------
+    float
+        The median duration.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return round(statistics.median(timings), 3)
+
+###############################################################################
+# TEMPLATES
+###############################################################################
+
+def render_pages(user, repeat=200):
+    """
+    Measure the render time of every page template.
+
+    Parameters
+    ----------
+    user : User
+        The user the pages are rendered for.
+    repeat : int, optional
+        Number of timed warm renders per page.
+
+    Returns
+    -------
+    dict
+        Page URL names mapped to the `cold_us` render time, with empty
+        template and fragment caches, and the `p50_us` and `p99_us` warm
+        render times, in microseconds.
+    """
+    request = RequestFactory().get('/')
+    request.user = user
+    results = {}
+
+    with override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+        for name, (template_name, context) in sorted(PAGE_TEMPLATES.items()):
+            for loader in engines['django'].engine.template_loaders:
+                loader.reset()
+            cache.clear()
+
+            started = time.perf_counter()
+            render_to_string(template_name, context, request=request)
+            cold = (time.perf_counter() - started) * 1e6
+
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                render_to_string(template_name, context, request=request)
+                timings.append((time.perf_counter() - started) * 1e6)
+
+            results[name] = {
+                'cold_us': round(cold, 1),
+                'p50_us': round(statistics.median(timings), 1) if timings else None,
+                'p99_us': round(_percentile(timings, 99), 1) if timings else None,
+            }
+
+    return results
+
+###############################################################################
+# RENDERERS
+###############################################################################
+
+def benchmark_renderers(size=10000, repeat=5):
+    """
+    Measure the serialization and rendering of a large entry list.
+
+    The entries are built in memory, so no database is needed.
+
+    Parameters
+    ----------
+    size : int, optional
+        Number of entries.
+    repeat : int, optional
+        Number of timed runs of each step.
+
+    Returns
+    -------
+    dict
+        'serialize_string' and 'serialize_seconds' mapped to the `p50_ms`
+        of serializing the entries with each duration format, and
+        'render_<format>' mapped to the `p50_ms` and `bytes` of rendering
+        the serialized entries with DRF's stdlib JSON renderer ('json'),
+        the orjson renderer ('orjson') and the MessagePack renderer
+        ('msgpack').
+    """
+    task = Task(pk=1, name='Benchmark task')
+    start = timezone.now()
+    entries = [
+        Entry(pk=index, task=task, start_time=start + timedelta(minutes=index), end_time=start + timedelta(minutes=index, seconds=1500))
+        for index in range(size)
+    ]
+
+    results = {}
+    with override_settings(API_DURATIONS_AS_SECONDS=False):
+        results['serialize_string'] = {'p50_ms': _time(lambda: EntrySerializer(entries, many=True).data, repeat)}
+    with override_settings(API_DURATIONS_AS_SECONDS=True):
+        results['serialize_seconds'] = {'p50_ms': _time(lambda: EntrySerializer(entries, many=True).data, repeat)}
+        data = EntrySerializer(entries, many=True).data
+
+    for name, renderer in (('json', JSONRenderer()), ('orjson', ORJSONRenderer()), ('msgpack', MessagePackRenderer())):
+        results[f'render_{name}'] = {
+            'p50_ms': _time(lambda: renderer.render(data, renderer.media_type), repeat),
+            'bytes': len(renderer.render(data, renderer.media_type)),
+        }
+
+    return results
+
+###############################################################################
+# COMPRESSION
+###############################################################################
+
+def benchmark_compression(user, repeat=5, names=COMPRESSION_CASES):
+    """
+    Measure the compression of large API responses.
+
+    Parameters
+    ----------
+    user : User
+        The benchmark user.
+    repeat : int, optional
+        Number of timed compressions per response and encoding.
+    names : iterable of str, optional
+        URL names of the benchmark cases to measure.
+
+    Returns
+    -------
+    dict
+        URL names mapped to the uncompressed `bytes` of their response and,
+        for each encoding, its compressed `<encoding>_bytes` and the
+        `<encoding>_ms` it takes to compress the response.
+    """
+    client = Client()
+    client.force_login(user)
+    cases = benchmark_cases(user)
+    results = {}
+
+    for name in names:
+        method, path, data = cases[name]
+        response = getattr(client, method)(path, data, HTTP_ACCEPT_ENCODING='identity')
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+
+        results[name] = {'bytes': len(body)}
+        for encoding in compression.ENCODINGS:
+            results[name][f'{encoding}_bytes'] = len(compression.compress(body, encoding))
+            results[name][f'{encoding}_ms'] = _time(lambda: compression.compress(body, encoding), repeat)
+
+    return results
+
+###############################################################################
+# SQLITE WRITES
+###############################################################################
+
+def _sqlite_database(alias, path, engine, pragmas):
+    """
+    Add a database alias on a new SQLite file and migrate it.
+
+    Parameters
+    ----------
+    alias : str
+        The database alias to add.
+    path : Path
+        The path of the SQLite file.
+    engine : str
+        The database backend, e.g. 'django.db.backends.sqlite3'.
+    pragmas : dict
+        The `PRAGMAS` of the database, for thintimer/sqlite_tuned.
+
+    Returns
+    -------
+    None
+    """
+    databases = {
+        DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+        alias: {'ENGINE': engine, 'NAME': str(path), 'PRAGMAS': pragmas},
+    }
+    connections.settings[alias] = connections.configure_settings(databases)[alias]
+    call_command('migrate', database=alias, verbosity=0)
+
+def _create_entries(alias, task, count, start, results):
+    """
+    Create entries of a task one by one, listing them after each write as
+    the timer page does.
+
+    Parameters
+    ----------
+    alias : str
+        The database alias to write to.
+    task : Task
+        The task of the entries.
+    count : int
+        Number of entries to create.
+    start : datetime
+        Start time of the first entry; the others follow a minute apart.
+    results : list
+        Receives the (created, locked) numbers of writes, where locked
+        writes failed with "database is locked".
+
+    Returns
+    -------
+    None
+    """
+    created = locked = 0
+    try:
+        for index in range(count):
+            started = start + timedelta(minutes=index)
+            try:
+                Entry(task=task, start_time=started, end_time=started + timedelta(seconds=30)).save(using=alias)
+                Entry.objects.using(alias).filter(task=task).count()
+            except OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                locked += 1
+            else:
+                created += 1
+    finally:
+        connections[alias].close()
+        results.append((created, locked))
+
+def benchmark_sqlite_writes(threads=8, entries=100):
+    """
+    Measure the throughput of concurrent entry creation on SQLite.
+
+    Each profile runs on a new, migrated database file: 'default' with
+    Django's SQLite backend and settings, 'tuned' with thintimer/sqlite_tuned
+    and the `SQLITE_PRAGMAS` setting. Every thread creates the entries of its
+    own task over its own connection.
+
+    Parameters
+    ----------
+    threads : int, optional
+        Number of concurrent writers.
+    entries : int, optional
+        Number of entries created by each writer.
+
+    Returns
+    -------
+    dict
+        The profiles mapped to their `journal_mode`, the `created` entries,
+        the `locked` writes that failed with "database is locked", and the
+        `entries_per_s` created.
+    """
+    profiles = {
+        'default': ('django.db.backends.sqlite3', {}),
+        'tuned': ('thintimer.sqlite_tuned', settings.SQLITE_PRAGMAS),
+    }
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for profile, (engine, pragmas) in profiles.items():
+            alias = f'{BENCHMARK_PREFIX}_sqlite_{profile}'
+            _sqlite_database(alias, Path(directory) / f'{profile}.sqlite3', engine, pragmas)
+            try:
+                user = User.objects.db_manager(alias).create_user(BENCHMARK_USERNAME, password=BENCHMARK_PASSWORD)
+                tasks = [Task.objects.using(alias).create(user=user, name=f'Task {index}') for index in range(threads)]
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    journal_mode = cursor.fetchone()[0]
+
+                # Threads write on separate days, so that no entries overlap.
+                start = timezone.now() - timedelta(days=threads)
+                counts = []
+                workers = [
+                    threading.Thread(target=_create_entries, args=(alias, task, entries, start + timedelta(days=index), counts))
+                    for index, task in enumerate(tasks)
+                ]
+                started = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+                elapsed = time.perf_counter() - started
+            finally:
+                connections[alias].close()
+                del connections[alias]
+                del connections.settings[alias]
+
+            created = sum(count for count, _ in counts)
+            results[profile] = {
+                'journal_mode': journal_mode,
+                'created': created,
+                'locked': sum(count for _, count in counts),
+                'entries_per_s': round(created / elapsed, 1),
+            }
+
+    return results
+
+###############################################################################
+# BASELINE
+###############################################################################
+
+def load_baseline(path=BASELINE_PATH):
+    """
+    Load a stored baseline.
+
+    Parameters
+    ----------
+    path : Path, optional
+        The baseline JSON file.
+
+    Returns
+    -------
+    dict
+        URL names mapped to their metrics, or an empty dict if there is no
+        baseline yet.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+
+    return json.loads(path.read_text())['results']
+
+def save_baseline(results, path=BASELINE_PATH, **dataset):
+    """
+    Store results as the new baseline.
+
+    Parameters
+    ----------
+    results : dict
+        URL names mapped to their metrics.
+    path : Path, optional
+        The baseline JSON file.
+    dataset : dict
+        Description of the dataset the results were measured on.
+
+    Returns
+    -------
+    None
+    """
+    document = {'created_at': datetime.now().isoformat(timespec='seconds'), 'dataset': dataset, 'results': results}
+    Path(path).write_text(json.dumps(document, indent=2, sort_keys=True) + '\n')
+
+def compare(results, baseline, tolerance=0.25, metrics=METRICS):
+    """
+    Return the regressions of results against a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        URL names mapped to their measured metrics.
+    baseline : dict
+        URL names mapped to their baseline metrics.
+    tolerance : float, optional
+        Allowed relative growth of latency and memory.
+    metrics : tuple of str, optional
+        The metrics to compare.
+
+    Returns
+    -------
+    list of str
+        One message per regression, empty if there is none.
+    """
+    regressions = []
+
+    for name, measured in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        for metric in metrics:
+            value, limit = measured.get(metric), expected.get(metric)
+            if value is None or limit is None:
+                continue
+            if metric != 'queries':
+                limit = limit * (1 + tolerance)
+            if value > limit:
+                regressions.append(f"{name}: {metric} {value} > {limit:g} (baseline {expected[metric]})")
+
+    return regressions
@@ -0,0 +1,232 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import csv
+import io
+import json
+import zipfile
+
+# Local imports.
+from .archive import unpack_entries
+from .models import Entry, EntryArchive, Task
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the account export.
+
+* `stream_export()` yields a zip archive of a user's tasks and entries as it
+is written, for a `StreamingHttpResponse`. Rows are read in batches of
+CHUNK_SIZE, each batch a short query for the rows after the last id read
+(keyset pagination), and compressed chunk by chunk, so memory use does not
+depend on the size of the account. Unlike a server-side cursor, this holds
+no transaction or server connection open while the response is sent, and
+works behind PgBouncer in transaction mode (see thintimer/pool.py).
+
+* The archive holds `tasks` and `entries` files, as NDJSON (one JSON object
+per line) or CSV. Entries moved to the compressed archive (main_app/archive.py)
+are exported too, flagged with `archived`.
+
+* Times are ISO 8601 in UTC and durations are in seconds. The entries file
+has the `task`, `start_time` and `end_time` columns of the import format,
+so it can be imported again as is (main_app/importer.py).
+"""
+
+CHUNK_SIZE = 2000
+ARCHIVES_PER_QUERY = 10
+FORMATS = ('ndjson', 'csv')
+TASK_FIELDS = ('id', 'name', 'description', 'tags', 'total_time_spent', 'created_at', 'updated_at')
+ENTRY_FIELDS = ('id', 'task_id', 'task', 'start_time', 'end_time', 'archived')
+
+###############################################################################
+# ROWS
+###############################################################################
+
+def _batches(queryset, size=CHUNK_SIZE):
+    """
+    Yield the rows of a queryset in keyset-paginated batches, by id.
+
+    Parameters
+    ----------
+    queryset : QuerySet
+        The rows, as model instances or with the id as first value.
+    size : int, optional
+        Number of rows per query.
+
+    Yields
+    ------
+    object
+        The rows, in order of id.
+    """
+    queryset = queryset.order_by('id')
+    last = None
+    while True:
+        batch = list((queryset if last is None else queryset.filter(id__gt=last))[:size])
+        yield from batch
+        if len(batch) < size:
+            return
+
+        last = batch[-1].id if hasattr(batch[-1], 'id') else batch[-1][0]
+
+def _task_rows(user, names):
+    """
+    Yield the export rows of a user's tasks.
+
+    Parameters
+    ----------
+    user : User
+        The owner of the tasks.
+    names : dict
+        Filled with the task names by id, for the entries.
+
+    Yields
+    ------
+    dict
+        One row per task.
+    """
+    tasks = Task.objects.filter(user=user).prefetch_related('tags')
+
+    for task in _batches(tasks):
+        names[task.id] = task.name
+        yield {
+            'id': task.id,
+            'name': task.name,
+            'description': task.description,
+            'tags': sorted(tag.name for tag in task.tags.all()),
+            'total_time_spent': task.total_time_spent.total_seconds(),
+            'created_at': task.created_at.isoformat(),
+            'updated_at': task.updated_at.isoformat(),
+        }
+
+def _entry_rows(user, names):
+    """
+    Yield the export rows of a user's live and archived entries.
+
+    Parameters
+    ----------
+    user : User
+        The owner of the entries.
+    names : dict
+        The task names by id.
+
+    Yields
+    ------
+    dict
+        One row per entry.
+    """
+    entries = Entry.objects.filter(task__user=user).values_list('id', 'task_id', 'start_time', 'end_time')
+    for entry_id, task_id, start_time, end_time in _batches(entries):
+        yield {
+            'id': entry_id, 'task_id': task_id, 'task': names[task_id],
+            'start_time': start_time.isoformat(), 'end_time': end_time.isoformat(), 'archived': False,
+        }
+
+    # Each archive holds up to a batch of entries, see archive_entries().
+    archives = EntryArchive.objects.filter(task__user=user).values_list('id', 'task_id', 'data')
+    for _, task_id, data in _batches(archives, size=ARCHIVES_PER_QUERY):
+        for entry_id, start_time, end_time in unpack_entries(data):
+            yield {
+                'id': entry_id, 'task_id': task_id, 'task': names[task_id],
+                'start_time': start_time.isoformat(), 'end_time': end_time.isoformat(), 'archived': True,
+            }
+
+###############################################################################
+# ARCHIVE
+###############################################################################
+
+class _Buffer:
+    """
+    Write-only file collecting the bytes written by `zipfile` until they are
+    yielded. Without `tell()` and `seek()`, zipfile writes a streamable zip.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _encode(rows, fields, file_format):
+    """
+    Yield rows encoded in chunks of `CHUNK_SIZE`.
+
+    Parameters
+    ----------
+    rows : iterable of dict
+        The rows.
+    fields : tuple of str
+        The columns, for CSV.
+    file_format : str
+        One of `FORMATS`.
+
+    Yields
+    ------
+    bytes
+        The encoded chunks, starting with the header row for CSV.
+    """
+    text = io.StringIO()
+    writer = csv.writer(text) if file_format == 'csv' else None
+    if writer:
+        writer.writerow(fields)
+
+    for number, row in enumerate(rows, start=1):
+        if writer:
+            if isinstance(row.get('tags'), list):
+                row['tags'] = ', '.join(row['tags'])
+            writer.writerow([row[field] for field in fields])
+        else:
+            text.write(json.dumps(row) + '\n')
+
+        if number % CHUNK_SIZE == 0:
+            yield text.getvalue().encode()
+            text.seek(0)
+            text.truncate()
+
+    yield text.getvalue().encode()
+
+def stream_export(user, file_format='ndjson'):
+    """
+    Yield a zip archive of a user's tasks and entries, chunk by chunk.
+
+    Parameters
+    ----------
+    user : User
+        The exported account.
+    file_format : str, optional
+        Format of the files in the archive, one of `FORMATS`.
+
+    Yields
+    ------
+    bytes
+        Consecutive parts of the zip archive.
+    """
+    names = {}
+    buffer = _Buffer()
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, rows, fields in [
+            ('tasks', _task_rows(user, names), TASK_FIELDS),
+            ('entries', _entry_rows(user, names), ENTRY_FIELDS),
+        ]:
+            # Sizes are unknown in advance: allow ZIP64 for large files.
+            with archive.open(f'{name}.{file_format}', 'w', force_zip64=True) as member:
+                for chunk in _encode(rows, fields, file_format):
+                    member.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+
+    yield buffer.pop()
@@ -0,0 +1,414 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import codecs
+import csv
+import json
+from itertools import islice
+
+# Third-party imports: Django natives.
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# Local imports.
+from . import overlaps, sharding
+from .models import Entry, Task, parse_tag_names
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the bulk import of entries.
+
+* Files are parsed as streams, one row at a time, and imported in chunks of
+`CHUNK_SIZE` rows, so memory use does not grow with the size of the file.
+Supported formats are CSV (with a header row), JSON (an array of objects)
+and NDJSON (one object per line).
+
+* Each row has a `task` name, a `start_time` and an `end_time` (ISO 8601;
+times without an offset are in the given time zone), and optionally the
+`description` and comma-separated `tags` used when the task is created.
+
+* Tasks are matched by name among the user's tasks; missing ones are created.
+Rows already imported (same task and start time) are skipped, so an import
+can be run again after a failure. Invalid rows are reported and skipped, as
+are rows overlapping another entry of the user when `ENTRY_PREVENT_OVERLAPS`
+is on (see main_app/overlaps.py).
+
+* Entries are inserted with `bulk_create`, which bypasses `Entry.save()` and
+its per-row task update; task totals are rebuilt once at the end with one
+UPDATE.
+
+* Everything is read and written on the user's shard (see
+main_app/sharding.py), so the 'import_entries' command and the API import
+the same way. Imports are refused while the user's data is being moved.
+"""
+
+CHUNK_SIZE = 5000
+FORMATS = ('csv', 'json', 'ndjson')
+MAX_ERRORS = 100
+READ_SIZE = 64 * 1024
+
+###############################################################################
+# PARSING
+###############################################################################
+
+def detect_format(filename):
+    """
+    Return the import format of a file from its extension.
+
+    Parameters
+    ----------
+    filename : str
+        The file name.
+
+    Returns
+    -------
+    str
+        One of `FORMATS`.
+
+    Raises
+    ------
+    ValueError
+        If the extension is not recognized.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension == 'jsonl':
+        extension = 'ndjson'
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown file format '{extension}', expected one of: {', '.join(FORMATS)}.")
+
+    return extension
+
+def _lines(text):
+    """
+    Yield the lines of a text stream read in chunks.
+
+    Parameters
+    ----------
+    text : iterable of str
+        Chunks of the text, which may split lines anywhere.
+
+    Yields
+    ------
+    str
+        Each line, with its line ending.
+    """
+    partial = ''
+    for chunk in text:
+        lines = (partial + chunk).splitlines(keepends=True)
+        # Hold back an incomplete last line, including a '\r' that may be
+        # the first half of '\r\n'.
+        partial = lines.pop() if lines and not lines[-1].endswith('\n') else ''
+        yield from lines
+    if partial:
+        yield partial
+
+def _iter_json_array(text):
+    """
+    Yield the elements of a JSON array read incrementally from a text stream.
+
+    Parameters
+    ----------
+    text : iterable of str
+        Chunks of the JSON document.
+
+    Yields
+    ------
+    object
+        Each element of the top-level array.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(text)
+    buffer, position, started = '', 0, False
+
+    while True:
+        # Skip whitespace and separators before the next element.
+        while position < len(buffer) and buffer[position] in ' \t\r\n,' + ('' if started else '['):
+            started = started or buffer[position] == '['
+            position += 1
+
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                if buffer[position:].strip():
+                    raise ValueError("Invalid JSON: the array is truncated or malformed.")
+                return
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        if not started:
+            raise ValueError("Invalid JSON: expected an array of objects.")
+
+        yield element
+        position = end
+
+def parse_rows(stream, file_format):
+    """
+    Yield the rows of an import file as dictionaries.
+
+    Parameters
+    ----------
+    stream : binary file
+        The file, opened in binary mode.
+    file_format : str
+        One of `FORMATS`.
+
+    Yields
+    ------
+    dict
+        Each row. Rows that are not objects are yielded as is and reported
+        as invalid by `import_entries()`.
+    """
+    # Decode incrementally; 'utf-8-sig' drops the BOM added by spreadsheets.
+    text = codecs.iterdecode(iter(lambda: stream.read(READ_SIZE), b''), 'utf-8-sig')
+
+    if file_format == 'csv':
+        yield from csv.DictReader(_lines(text))
+    elif file_format == 'ndjson':
+        for line in _lines(text):
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from _iter_json_array(text)
+
+###############################################################################
+# VALIDATION
+###############################################################################
+
+def _parse_time(value, tzinfo):
+    """
+    Parse an ISO 8601 date and time, making it aware in a time zone.
+
+    Parameters
+    ----------
+    value : str
+        The date and time.
+    tzinfo : tzinfo
+        The time zone of times without an offset.
+
+    Returns
+    -------
+    datetime.datetime or None
+        The aware datetime, or None if the value is not a valid date and time.
+    """
+    try:
+        parsed = parse_datetime(str(value or '').strip())
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, tzinfo)
+
+    return parsed
+
+def validate_row(row, tzinfo):
+    """
+    Validate one import row.
+
+    Parameters
+    ----------
+    row : dict
+        The parsed row.
+    tzinfo : tzinfo
+        The time zone of times without an offset.
+
+    Returns
+    -------
+    dict
+        The cleaned `task`, `start_time`, `end_time`, `description` and
+        `tags`.
+
+    Raises
+    ------
+    ValueError
+        If the row is invalid.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("expected an object")
+
+    name = str(row.get('task') or '').strip()
+    if not name:
+        raise ValueError("missing task name")
+    if len(name) > Task._meta.get_field('name').max_length:
+        raise ValueError("task name is too long")
+
+    start_time = _parse_time(row.get('start_time'), tzinfo)
+    end_time = _parse_time(row.get('end_time'), tzinfo)
+    if start_time is None or end_time is None:
+        raise ValueError("start_time and end_time must be ISO 8601 dates and times")
+    if end_time < start_time:
+        raise ValueError("end_time is before start_time")
+
+    tags = row.get('tags') or ''
+    if not isinstance(tags, (str, list)) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("tags must be a list of names or a comma-separated string")
+    try:
+        tags = parse_tag_names(tags)
+    except ValueError:
+        raise ValueError("tag name is too long")
+
+    return {
+        'task': name,
+        'start_time': start_time,
+        'end_time': end_time,
+        'description': row.get('description') or None,
+        'tags': tags,
+    }
+
+###############################################################################
+# IMPORT
+###############################################################################
+
+def _import_chunk(user, rows, tasks, using):
+    """
+    Import one chunk of valid rows.
+
+    Parameters
+    ----------
+    user : User
+        The owner of the imported entries.
+    rows : list of dict
+        The validated rows, with their row `number`.
+    tasks : dict
+        The user's task ids by name, updated with the created tasks.
+    using : str
+        The database alias of the user's shard.
+
+    Returns
+    -------
+    tuple
+        The number of imported entries, of skipped duplicates and of created
+        tasks, and the numbers of the rows rejected as overlapping.
+    """
+    created = 0
+    with transaction.atomic(using=using):
+        # Create the missing tasks, with the description and tags of their
+        # first row.
+        missing = {}
+        for row in rows:
+            if row['task'] not in tasks:
+                missing.setdefault(row['task'], row)
+        for name, row in missing.items():
+            task = Task.objects.using(using).create(user=user, name=name, description=row['description'])
+            if row['tags']:
+                task.set_tag_names(row['tags'])
+            tasks[name] = task.id
+            created += 1
+
+        # Skip the rows imported before, by task and start time.
+        existing = set(
+            Entry.objects.using(using).filter(
+                task_id__in={tasks[row['task']] for row in rows},
+                start_time__in={row['start_time'] for row in rows},
+            ).values_list('task_id', 'start_time')
+        )
+        entries, numbers, seen = [], [], set()
+        for row in rows:
+            key = (tasks[row['task']], row['start_time'])
+            if key in existing or key in seen:
+                continue
+            seen.add(key)
+            entries.append(Entry(task_id=key[0], start_time=row['start_time'], end_time=row['end_time']))
+            numbers.append(row['number'])
+
+        rejected = []
+        if overlaps.prevents_overlaps():
+            overlapping = overlaps.find_overlaps(user, [(entry.start_time, entry.end_time) for entry in entries], using=using)
+            rejected = [numbers[index] for index in sorted(overlapping)]
+            entries = [entry for index, entry in enumerate(entries) if index not in overlapping]
+
+        Entry.objects.using(using).bulk_create(entries)
+
+    return len(entries), len(rows) - len(entries) - len(rejected), created, rejected
+
+def import_entries(user, rows, tzinfo=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Import entries for a user.
+
+    Parameters
+    ----------
+    user : User
+        The owner of the imported entries.
+    rows : iterable of dict
+        The rows, see `parse_rows()`.
+    tzinfo : tzinfo, optional
+        The time zone of times without an offset. Defaults to the current
+        time zone.
+    chunk_size : int, optional
+        Number of rows validated and inserted together.
+    progress : callable, optional
+        Called with the summary so far after each chunk.
+
+    Returns
+    -------
+    dict
+        The number of `rows` read, of `imported` entries, of `skipped`
+        duplicates, of `tasks_created` and of `invalid` rows (including
+        overlapping ones), with the first `errors` as {'row': number,
+        'error': message}.
+
+    Raises
+    ------
+    ValueError
+        If the file cannot be parsed, or the user's data is being moved.
+        Chunks imported before the error are kept; the import can be run
+        again to complete it.
+    """
+    using, moving = sharding.shard_of(user.pk) if sharding.is_enabled() else (DEFAULT_DB_ALIAS, False)
+    if moving:
+        raise ValueError("Your data is being moved, try again in a moment.")
+
+    tzinfo = tzinfo or timezone.get_current_timezone()
+    tasks = {}
+    for task_id, name in Task.objects.using(using).filter(user=user).order_by('-id').values_list('id', 'name'):
+        tasks[name] = task_id  # The oldest task wins among duplicated names.
+    summary = {'rows': 0, 'imported': 0, 'skipped': 0, 'tasks_created': 0, 'invalid': 0, 'errors': []}
+
+    rows = iter(rows)
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            valid = []
+            for number, row in enumerate(chunk, start=summary['rows'] + 1):
+                try:
+                    valid.append({**validate_row(row, tzinfo), 'number': number})
+                except ValueError as error:
+                    summary['invalid'] += 1
+                    if len(summary['errors']) < MAX_ERRORS:
+                        summary['errors'].append({'row': number, 'error': str(error)})
+            summary['rows'] += len(chunk)
+
+            if valid:
+                imported, skipped, created, rejected = _import_chunk(user, valid, tasks, using)
+                summary['imported'] += imported
+                summary['skipped'] += skipped
+                summary['tasks_created'] += created
+                summary['invalid'] += len(rejected)
+                for number in rejected[:MAX_ERRORS - len(summary['errors'])]:
+                    summary['errors'].append({'row': number, 'error': "overlaps another entry"})
+
+            if progress:
+                progress(summary)
+    except (csv.Error, UnicodeDecodeError, json.JSONDecodeError) as error:
+        raise ValueError(f"Could not parse the file after row {summary['rows']}: {error}") from error
+    except IntegrityError as error:
+        # E.g. entries overlapping under the exclusion constraint.
+        raise ValueError(f"Could not import the chunk ending at row {summary['rows']}: {error}") from error
+    finally:
+        # Rebuild the totals of the user's tasks in one UPDATE.
+        if summary['imported']:
+            Task.objects.using(using).filter(user=user).rebuild_totals()
+
+    return summary
@@ -0,0 +1,238 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import csv
+import io
+import math
+import random
+from datetime import timedelta
+
+# Third-party imports: Django natives.
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Local imports.
+from .models import Entry, Tag, Task
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the synthetic data generator.
+
+* Data is generated deterministically from a seed: the same arguments always
+produce the same users, tasks, tags and entries (relative to the current day).
+
+* Distributions aim to look like real time tracking. Each user has a few
+tags from a shared vocabulary; task usage follows a Zipf-like distribution
+(a few tasks get most of the time); entries fall mostly on weekdays, start
+around early afternoon and last log-normally around 45 minutes.
+
+* Rows are inserted with `bulk_create` in batches, or with PostgreSQL `COPY`
+for entries (through psycopg2's `copy_expert()`, the only PostgreSQL driver
+of Django 4.1), so `Entry.save()` and its per-row task update are bypassed.
+`Task.total_time_spent` is rebuilt afterwards in one grouped UPDATE.
+
+* Users are generated in chunks so memory use does not grow with the size
+of the dataset.
+"""
+
+TAG_VOCABULARY = (
+    'admin', 'billing', 'client', 'design', 'docs', 'email', 'finance', 'hiring', 'internal', 'meeting',
+    'ops', 'planning', 'research', 'review', 'sales', 'support', 'testing', 'training', 'travel', 'writing',
+)
+USER_CHUNK = 200
+
+###############################################################################
+# DISTRIBUTIONS
+###############################################################################
+
+def _task_weights(count):
+    """
+    Return Zipf-like usage weights for a user's tasks.
+
+    Parameters
+    ----------
+    count : int
+        Number of tasks.
+
+    Returns
+    -------
+    list of float
+        The cumulative weights, for `random.choices(cum_weights=...)`.
+    """
+    weights, total = [], 0.0
+    for rank in range(1, count + 1):
+        total += 1 / rank
+        weights.append(total)
+
+    return weights
+
+def _entry(rng, now, days):
+    """
+    Draw the start and end of one entry.
+
+    Parameters
+    ----------
+    rng : random.Random
+        The seeded random generator.
+    now : datetime.datetime
+        The end of the generated period, at midnight.
+    days : int
+        Length of the generated period, in days.
+
+    Returns
+    -------
+    tuple of datetime.datetime
+        The start and end times.
+    """
+    # Mostly weekdays: redraw weekend days four times out of five.
+    while True:
+        day = now - timedelta(days=rng.randrange(1, days + 1))
+        if day.weekday() < 5 or rng.random() < 0.2:
+            break
+
+    hour = min(max(rng.gauss(13, 2.5), 7), 20)
+    minutes = min(max(rng.lognormvariate(math.log(45), 0.7), 5), 240)
+    start_time = day + timedelta(hours=hour)
+
+    return start_time, start_time + timedelta(minutes=minutes)
+
+###############################################################################
+# GENERATION
+###############################################################################
+
+def _copy_entries(rows):
+    """
+    Insert entries with PostgreSQL COPY, through psycopg2's `copy_expert()`.
+
+    Parameters
+    ----------
+    rows : list of tuple
+        The (task_id, start_time, end_time) of each entry.
+
+    Returns
+    -------
+    None
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for task_id, start_time, end_time in rows:
+        writer.writerow((task_id, start_time.isoformat(), end_time.isoformat()))
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            "COPY main_app_entry (task_id, start_time, end_time) FROM STDIN WITH (FORMAT csv)", buffer,
+        )
+
+def generate(users=100, tasks=8, entries=500, days=365, seed=0, prefix='load', password=None,
+             batch_size=10000, use_copy=False, progress=None):
+    """
+    Generate a synthetic dataset.
+
+    Parameters
+    ----------
+    users : int, optional
+        Number of users, named `<prefix><number>`.
+    tasks : int, optional
+        Average number of tasks per user.
+    entries : int, optional
+        Average number of entries per user.
+    days : int, optional
+        Number of days before today over which entries are spread.
+    seed : int, optional
+        Seed of the random generator.
+    prefix : str, optional
+        Username prefix. Usernames must not exist yet.
+    password : str, optional
+        Password of every generated user. Users get an unusable password
+        when not given.
+    batch_size : int, optional
+        Number of rows per INSERT (or COPY) statement.
+    use_copy : bool, optional
+        Insert entries with COPY. Requires PostgreSQL and psycopg2.
+    progress : callable, optional
+        Called with (users done, entries done) after each chunk of users.
+
+    Returns
+    -------
+    dict
+        The number of generated `users`, `tasks`, `tags` and `entries`.
+    """
+    if use_copy and (connection.vendor != 'postgresql' or connection.Database.__name__ != 'psycopg2'):
+        raise ValueError("COPY requires PostgreSQL and the psycopg2 driver.")
+
+    rng = random.Random(seed)
+    hashed_password = make_password(password) if password else make_password(None)
+    now = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = {'users': 0, 'tasks': 0, 'tags': 0, 'entries': 0}
+    first_user_id = None
+
+    for first in range(0, users, USER_CHUNK):
+        usernames = [f'{prefix}{i}' for i in range(first, min(first + USER_CHUNK, users))]
+
+        with transaction.atomic():
+            User.objects.bulk_create([User(username=name, password=hashed_password) for name in usernames])
+            user_ids = list(User.objects.filter(username__in=usernames).order_by('id').values_list('id', flat=True))
+            first_user_id = first_user_id or user_ids[0]
+
+            # Tags: a few per user, from the shared vocabulary.
+            Tag.objects.bulk_create(
+                [Tag(user_id=user_id, name=name)
+                 for user_id in user_ids for name in rng.sample(TAG_VOCABULARY, rng.randint(2, 6))],
+                batch_size=batch_size,
+            )
+            user_tags = {}
+            for tag_id, user_id in Tag.objects.filter(user_id__in=user_ids).order_by('id').values_list('id', 'user_id'):
+                user_tags.setdefault(user_id, []).append(tag_id)
+
+            # Tasks: around the requested average per user.
+            Task.objects.bulk_create(
+                [Task(user_id=user_id, name=f'Task {i + 1}')
+                 for user_id in user_ids for i in range(max(1, round(rng.uniform(0.5, 1.5) * tasks)))],
+                batch_size=batch_size,
+            )
+            user_tasks = {}
+            for task_id, user_id in Task.objects.filter(user_id__in=user_ids).order_by('id').values_list('id', 'user_id'):
+                user_tasks.setdefault(user_id, []).append(task_id)
+
+            # Tag up to three tags on each task.
+            links = [
+                Task.tags.through(task_id=task_id, tag_id=tag_id)
+                for user_id, task_ids in user_tasks.items() for task_id in task_ids
+                for tag_id in rng.sample(user_tags[user_id], min(len(user_tags[user_id]), rng.randint(0, 3)))
+            ]
+            Task.tags.through.objects.bulk_create(links, batch_size=batch_size)
+
+            # Entries, inserted in batches.
+            rows = []
+            for user_id in user_ids:
+                task_ids = user_tasks[user_id]
+                weights = _task_weights(len(task_ids))
+                for _ in range(max(0, round(rng.uniform(0.5, 1.5) * entries))):
+                    rows.append((rng.choices(task_ids, cum_weights=weights)[0], *_entry(rng, now, days)))
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                if use_copy:
+                    _copy_entries(batch)
+                else:
+                    Entry.objects.bulk_create([Entry(task_id=row[0], start_time=row[1], end_time=row[2]) for row in batch])
+
+        counts['users'] += len(user_ids)
+        counts['tasks'] += sum(len(task_ids) for task_ids in user_tasks.values())
+        counts['tags'] += sum(len(tag_ids) for tag_ids in user_tags.values())
+        counts['entries'] += len(rows)
+        if progress:
+            progress(counts['users'], counts['entries'])
+
+    # Rebuild the task totals in one grouped UPDATE.
+    if first_user_id is not None:
+        Task.objects.filter(user_id__gte=first_user_id, user__username__startswith=prefix).rebuild_totals()
+
+    return counts
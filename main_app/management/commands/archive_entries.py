@@ -0,0 +1,113 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+from datetime import datetime, timedelta
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Local imports.
+from main_app.archive import BATCH_SIZE, archive_entries, restore_entries
+from main_app.models import EntryArchive
+from main_app.sharding import shard_of
+
+###############################################################################
+# COMMAND
+###############################################################################
+
+class Command(BaseCommand):
+    """
+    Move old entries into the compressed archive, or restore them.
+
+    Archived entries leave per-day rollups behind, so reports keep their
+    totals while the entries table and its indexes stay small. Every shard
+    is processed in turn, see main_app/sharding.py.
+    """
+
+    help = "Archive entries older than a threshold, or restore archived entries."
+
+    def add_arguments(self, parser):
+        """
+        Add the command line arguments.
+
+        Parameters
+        ----------
+        parser : CommandParser
+            The argument parser of the command.
+
+        Returns
+        -------
+        None
+        """
+        parser.add_argument(
+            '--older-than', type=int, default=settings.ENTRY_ARCHIVE_AFTER_DAYS,
+            help="Archive entries that started more than this many days ago.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f"Number of entries per archive batch (default: {BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--restore', action='store_true',
+            help="Restore archived entries instead of archiving.",
+        )
+        parser.add_argument(
+            '--user',
+            help="With --restore, only restore the entries of this username.",
+        )
+        parser.add_argument(
+            '--since', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+            help="With --restore, only restore batches ending on or after this date (YYYY-MM-DD).",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run the archival or the restore.
+
+        Parameters
+        ----------
+        args : tuple
+            Positional arguments.
+        options : dict
+            Parsed command line options.
+
+        Returns
+        -------
+        None
+        """
+        def progress(task_id, count):
+            self.stdout.write(f"Task {task_id}: {count} entries.")
+
+        if options['restore']:
+            databases, user_id = settings.DATABASE_SHARDS, None
+            if options['user']:
+                # Users live on the default database, their entries on their shard.
+                try:
+                    user_id = User.objects.get(username=options['user']).pk
+                except User.DoesNotExist:
+                    raise CommandError(f"User '{options['user']}' does not exist.")
+                databases = [shard_of(user_id)[0]]
+
+            count = 0
+            for database in databases:
+                archives = EntryArchive.objects.using(database).all()
+                if user_id is not None:
+                    archives = archives.filter(task__user_id=user_id)
+                if options['since']:
+                    archives = archives.filter(end_time__date__gte=options['since'])
+                count += restore_entries(archives, batch_size=options['batch_size'], progress=progress)
+
+            self.stdout.write(self.style.SUCCESS(f"Restored {count} entries."))
+            return
+
+        before = timezone.now() - timedelta(days=options['older_than'])
+        count = sum(
+            archive_entries(before, batch_size=options['batch_size'], progress=progress, using=database)
+            for database in settings.DATABASE_SHARDS
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {count} entries started before {before:%Y-%m-%d}."))
@@ -0,0 +1,153 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import json
+
+# Third-party imports: Django natives.
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+
+# Local imports.
+from main_app import benchmarks
+
+###############################################################################
+# COMMAND
+###############################################################################
+
+class Command(BaseCommand):
+    """
+    Benchmark every endpoint on a seeded, throw-away test database.
+
+    Records query counts, p50/p99 latency and peak memory per endpoint,
+    compares them with the stored baseline and fails on regressions. The
+    project database is never touched.
+    """
+
+    help = "Measure query counts, latency and memory of every endpoint against a baseline."
+
+    def add_arguments(self, parser):
+        """
+        Add the command line arguments.
+
+        Parameters
+        ----------
+        parser : CommandParser
+            The argument parser of the command.
+
+        Returns
+        -------
+        None
+        """
+        parser.add_argument('--users', type=int, default=1000, help="Number of seeded users (default: 1000).")
+        parser.add_argument('--tasks', type=int, default=8, help="Average tasks per user (default: 8).")
+        parser.add_argument('--entries', type=int, default=1000, help="Average entries per user (default: 1000).")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the data generator (default: 0).")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed requests per endpoint (default: 20).")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="Allowed relative growth of latency and memory (default: 0.25).",
+        )
+        parser.add_argument('--baseline', default=str(benchmarks.BASELINE_PATH), help="Baseline JSON file.")
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help="Store the results as the new baseline instead of comparing (not with --endpoint).",
+        )
+        parser.add_argument('--endpoint', action='append', help="Only measure this URL name (repeatable).")
+        parser.add_argument(
+            '--templates', action='store_true',
+            help="Also report the render time of every page template, cold and warm.",
+        )
+        parser.add_argument(
+            '--renderers', type=int, metavar='SIZE',
+            help="Also report the serialization and render time of a list of SIZE entries per API renderer.",
+        )
+        parser.add_argument(
+            '--compression', action='store_true',
+            help="Also report the size and compression time of the largest API responses per encoding.",
+        )
+        parser.add_argument(
+            '--sqlite-writes', type=int, metavar='THREADS',
+            help="Also report the entry creation throughput of THREADS concurrent writers per SQLite profile.",
+        )
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database between runs.")
+
+    def handle(self, *args, **options):
+        """
+        Seed the test database, run the benchmarks and compare the results.
+
+        Parameters
+        ----------
+        args : tuple
+            Positional arguments.
+        options : dict
+            Parsed command line options.
+
+        Returns
+        -------
+        None
+        """
+        # A baseline of a few endpoints would drop the regression gate of
+        # all the others.
+        if options['update_baseline'] and options['endpoint']:
+            raise CommandError("--update-baseline measures every endpoint and cannot be combined with --endpoint.")
+
+        runner = DiscoverRunner(verbosity=0, keepdb=options['keepdb'])
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+
+        try:
+            self.stdout.write(
+                f"Seeding {options['users']} users, {options['tasks']} tasks and "
+                f"{options['entries']} entries per user..."
+            )
+            user = benchmarks.seed_data(
+                users=options['users'], tasks=options['tasks'],
+                entries=options['entries'], seed=options['seed'],
+            )
+            results = benchmarks.run_benchmarks(user, repeat=options['repeat'], names=options['endpoint'])
+            renders = benchmarks.render_pages(user) if options['templates'] else {}
+            renderers = benchmarks.benchmark_renderers(options['renderers']) if options['renderers'] else {}
+            compressions = benchmarks.benchmark_compression(user) if options['compression'] else {}
+            sqlite_writes = benchmarks.benchmark_sqlite_writes(options['sqlite_writes']) if options['sqlite_writes'] else {}
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        for name, metrics in results.items():
+            self.stdout.write(f"{name:30} {json.dumps(metrics, sort_keys=True)}")
+
+        if renders:
+            self.stdout.write("Template render times:")
+            for name, metrics in renders.items():
+                self.stdout.write(f"{name:30} {json.dumps(metrics, sort_keys=True)}")
+
+        if renderers:
+            self.stdout.write(f"Serialization and rendering of {options['renderers']} entries:")
+            for name, metrics in renderers.items():
+                self.stdout.write(f"{name:30} {json.dumps(metrics, sort_keys=True)}")
+
+        if compressions:
+            self.stdout.write("Response compression:")
+            for name, metrics in compressions.items():
+                self.stdout.write(f"{name:30} {json.dumps(metrics, sort_keys=True)}")
+
+        if sqlite_writes:
+            self.stdout.write(f"Concurrent entry creation by {options['sqlite_writes']} SQLite writers:")
+            for name, metrics in sqlite_writes.items():
+                self.stdout.write(f"{name:30} {json.dumps(metrics, sort_keys=True)}")
+
+        if options['update_baseline']:
+            benchmarks.save_baseline(
+                results, options['baseline'],
+                users=options['users'], tasks=options['tasks'], entries=options['entries'], seed=options['seed'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}."))
+            return
+
+        regressions = benchmarks.compare(results, benchmarks.load_baseline(options['baseline']), options['tolerance'])
+        if regressions:
+            raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+
+        self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,103 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import time
+import zoneinfo
+
+# Third-party imports: Django natives.
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+# Local imports.
+from main_app import importer
+from user_auth.timezones import get_time_zone
+
+###############################################################################
+# COMMAND
+###############################################################################
+
+class Command(BaseCommand):
+    """
+    Import a user's historical entries from a CSV, JSON or NDJSON file.
+
+    The file is streamed and imported in chunks; see main_app/importer.py
+    for the expected columns.
+    """
+
+    help = "Bulk import entries for a user from a CSV, JSON or NDJSON file."
+
+    def add_arguments(self, parser):
+        """
+        Add the command line arguments.
+
+        Parameters
+        ----------
+        parser : CommandParser
+            The argument parser of the command.
+
+        Returns
+        -------
+        None
+        """
+        parser.add_argument('path', help="The file to import.")
+        parser.add_argument('--user', required=True, help="Username of the owner of the entries.")
+        parser.add_argument(
+            '--format', choices=importer.FORMATS,
+            help="File format (default: from the file extension).",
+        )
+        parser.add_argument(
+            '--time-zone', type=zoneinfo.ZoneInfo,
+            help="Time zone of times without an offset, e.g. Europe/Paris (default: the user's time zone).",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=importer.CHUNK_SIZE,
+            help=f"Number of rows imported together (default: {importer.CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run the import.
+
+        Parameters
+        ----------
+        args : tuple
+            Positional arguments.
+        options : dict
+            Parsed command line options.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        started = time.perf_counter()
+
+        def progress(summary):
+            self.stdout.write(
+                f"{summary['rows']} rows read, {summary['imported']} imported "
+                f"({time.perf_counter() - started:.1f}s)."
+            )
+
+        try:
+            file_format = options['format'] or importer.detect_format(options['path'])
+            with open(options['path'], 'rb') as stream:
+                summary = importer.import_entries(
+                    user, importer.parse_rows(stream, file_format), tzinfo=options['time_zone'] or get_time_zone(user),
+                    chunk_size=options['chunk_size'], progress=progress,
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for error in summary['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['imported']} entries, created {summary['tasks_created']} tasks, skipped "
+            f"{summary['skipped']} duplicates and {summary['invalid']} invalid rows in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,107 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+from datetime import date, datetime
+
+# Third-party imports: Django natives.
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+# Local imports.
+from main_app import partitions
+
+###############################################################################
+# COMMAND
+###############################################################################
+
+class Command(BaseCommand):
+    """
+    Maintain the range partitions of the entries table on PostgreSQL.
+
+    Pre-creates partitions for the coming periods so that new entries never
+    land in the DEFAULT partition, and detaches (optionally drops) partitions
+    that only hold entries older than a cutoff. Intended to run from a daily
+    scheduler.
+    """
+
+    help = "Create future partitions of the entries table and detach old ones."
+
+    def add_arguments(self, parser):
+        """
+        Add the command line arguments.
+
+        Parameters
+        ----------
+        parser : CommandParser
+            The argument parser of the command.
+
+        Returns
+        -------
+        None
+        """
+        parser.add_argument(
+            '--ahead', type=int, default=3,
+            help="Number of future partitions to keep created (default: 3).",
+        )
+        parser.add_argument(
+            '--detach-before', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+            help="Detach partitions that end on or before this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            '--drop', action='store_true',
+            help="Drop detached partitions instead of keeping them as tables.",
+        )
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="Convert the entries table if it is not partitioned yet.",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run the partition maintenance.
+
+        Parameters
+        ----------
+        args : tuple
+            Positional arguments.
+        options : dict
+            Parsed command line options.
+
+        Returns
+        -------
+        None
+        """
+        interval = partitions.get_interval()
+
+        if not partitions.is_supported(connection):
+            raise CommandError("Entry partitioning requires PostgreSQL.")
+        if interval not in partitions.INTERVALS:
+            raise CommandError("Set ENTRY_PARTITION_INTERVAL to 'month' or 'year'.")
+
+        with transaction.atomic():
+            if not partitions.is_partitioned(connection):
+                if not options['convert']:
+                    raise CommandError(
+                        "The entries table is not partitioned. Run with --convert to convert it."
+                    )
+                partitions.convert_entry_table(connection, interval, ahead=options['ahead'])
+                self.stdout.write("Converted main_app_entry to a partitioned table.")
+
+            # Create every partition from the current period up to the last
+            # period requested.
+            today = date.today()
+            last_day = partitions.partition_bounds(today, interval)[0]
+            for _ in range(options['ahead']):
+                last_day = partitions.partition_bounds(last_day, interval)[1]
+
+            for name in partitions.create_partitions(connection, interval, today, last_day):
+                self.stdout.write(f"Created partition {name}.")
+
+            if options['detach_before']:
+                detached = partitions.detach_partitions(
+                    connection, options['detach_before'], drop=options['drop'],
+                )
+                for name in detached:
+                    self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} partition {name}.")
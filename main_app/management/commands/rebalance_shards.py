@@ -0,0 +1,91 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count
+
+# Local imports.
+from main_app.models import UserShard
+from main_app.sharding import BATCH_SIZE, move_user
+
+###############################################################################
+# COMMAND
+###############################################################################
+
+class Command(BaseCommand):
+    """
+    Move the data of users between shards, or list the users of each shard.
+
+    Rows are copied and deleted in batches, and the users' writes are refused
+    while their data is copied. See main_app/sharding.py.
+    """
+
+    help = "Move the tasks and entries of users to another shard."
+
+    def add_arguments(self, parser):
+        """
+        Add the command line arguments.
+
+        Parameters
+        ----------
+        parser : CommandParser
+            The argument parser of the command.
+
+        Returns
+        -------
+        None
+        """
+        parser.add_argument(
+            '--user', action='append', default=[],
+            help="Username of a user to move. Repeat for several users.",
+        )
+        parser.add_argument(
+            '--to', choices=settings.DATABASE_SHARDS,
+            help="Database alias of the destination shard.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f"Number of rows copied or deleted per statement (default: {BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Move the users, or list the number of users per shard.
+
+        Parameters
+        ----------
+        args : tuple
+            Positional arguments.
+        options : dict
+            Parsed command line options.
+
+        Returns
+        -------
+        None
+        """
+        if not options['user']:
+            counts = dict(UserShard.objects.values_list('database').annotate(count=Count('user')).order_by())
+            counts[DEFAULT_DB_ALIAS] = counts.get(DEFAULT_DB_ALIAS, 0) + User.objects.filter(shard__isnull=True).count()
+            for database in settings.DATABASE_SHARDS:
+                self.stdout.write(f"{database}: {counts.get(database, 0)} users.")
+            return
+
+        if not options['to']:
+            raise CommandError("--to is required to move users.")
+
+        def progress(model, count):
+            self.stdout.write(f"{model._meta.db_table}: {count} rows.")
+
+        for username in options['user']:
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"User '{username}' does not exist.")
+
+            count = move_user(user, options['to'], batch_size=options['batch_size'], progress=progress)
+            self.stdout.write(self.style.SUCCESS(f"Moved {count} rows of {username} to {options['to']}."))
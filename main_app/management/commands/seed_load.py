@@ -0,0 +1,87 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import time
+
+# Third-party imports: Django natives.
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+# Local imports.
+from main_app import loadgen
+
+###############################################################################
+# COMMAND
+###############################################################################
+
+class Command(BaseCommand):
+    """
+    Populate the database with a realistic synthetic dataset.
+
+    Users, tagged tasks and entries are generated deterministically from a
+    seed and bulk inserted, for load testing. See main_app/loadgen.py.
+    """
+
+    help = "Generate users, tagged tasks and entries for load testing."
+
+    def add_arguments(self, parser):
+        """
+        Add the command line arguments.
+
+        Parameters
+        ----------
+        parser : CommandParser
+            The argument parser of the command.
+
+        Returns
+        -------
+        None
+        """
+        parser.add_argument('--users', type=int, default=1000, help="Number of users (default: 1000).")
+        parser.add_argument('--tasks', type=int, default=8, help="Average tasks per user (default: 8).")
+        parser.add_argument('--entries', type=int, default=1000, help="Average entries per user (default: 1000).")
+        parser.add_argument('--days', type=int, default=365, help="Days of history to spread entries over (default: 365).")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random generator (default: 0).")
+        parser.add_argument('--prefix', default='load', help="Username prefix (default: 'load').")
+        parser.add_argument('--password', help="Password of the generated users (default: unusable).")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows per INSERT or COPY (default: 10000).")
+        parser.add_argument('--copy', action='store_true', help="Insert entries with COPY (PostgreSQL with psycopg2 only).")
+
+    def handle(self, *args, **options):
+        """
+        Generate the dataset.
+
+        Parameters
+        ----------
+        args : tuple
+            Positional arguments.
+        options : dict
+            Parsed command line options.
+
+        Returns
+        -------
+        None
+        """
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f"Users with the prefix '{options['prefix']}' already exist. Use another --prefix.")
+
+        def progress(users, entries):
+            self.stdout.write(f"{users} users, {entries} entries...")
+
+        started = time.perf_counter()
+        try:
+            counts = loadgen.generate(
+                users=options['users'], tasks=options['tasks'], entries=options['entries'],
+                days=options['days'], seed=options['seed'], prefix=options['prefix'],
+                password=options['password'], batch_size=options['batch_size'],
+                use_copy=options['copy'], progress=progress,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['users']} users, {counts['tasks']} tasks, {counts['tags']} tags "
+            f"and {counts['entries']} entries in {time.perf_counter() - started:.1f}s."
+        ))
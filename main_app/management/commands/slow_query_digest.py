@@ -0,0 +1,93 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Local imports.
+from thintimer import querylog
+
+###############################################################################
+# COMMAND
+###############################################################################
+
+class Command(BaseCommand):
+    """
+    Summarize a day of the slow-query log by query fingerprint.
+
+    Meant to run daily, e.g. from a scheduler, with --output to keep the
+    digests. See thintimer/querylog.py.
+    """
+
+    help = "Summarize the slow-query log of a day by normalized query fingerprint."
+
+    def add_arguments(self, parser):
+        """
+        Add the command line arguments.
+
+        Parameters
+        ----------
+        parser : CommandParser
+            The argument parser of the command.
+
+        Returns
+        -------
+        None
+        """
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG_FILE,
+            help="Slow-query log file; its rotated backups are read too (default: SLOW_QUERY_LOG_FILE).",
+        )
+        parser.add_argument(
+            '--date', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+            help="UTC day to summarize, YYYY-MM-DD (default: yesterday).",
+        )
+        parser.add_argument('--limit', type=int, default=20, help="Number of fingerprints shown (default: 20).")
+        parser.add_argument('--output', help="Also write the full digest to this JSON file.")
+
+    def handle(self, *args, **options):
+        """
+        Read the log and print the digest.
+
+        Parameters
+        ----------
+        args : tuple
+            Positional arguments.
+        options : dict
+            Parsed command line options.
+
+        Returns
+        -------
+        None
+        """
+        if not options['log']:
+            raise CommandError("No log file: pass --log or set SLOW_QUERY_LOG_FILE.")
+
+        log = Path(options['log'])
+        paths = [path for path in [log, *log.parent.glob(f'{log.name}.*')] if path.is_file()]
+        if not paths:
+            raise CommandError(f"Log file {log} does not exist.")
+
+        day = options['date'] or timezone.now().date() - timedelta(days=1)
+        summaries = querylog.digest(querylog.read_log(paths, day))
+
+        self.stdout.write(f"Slow queries on {day}: {sum(summary['count'] for summary in summaries)}")
+        for summary in summaries[:options['limit']]:
+            self.stdout.write(
+                f"{summary['fingerprint']}  count={summary['count']}  total={summary['total_ms']:.0f}ms  "
+                f"median={summary['median_ms']:.0f}ms  max={summary['max_ms']:.0f}ms  views={','.join(summary['views'])}"
+            )
+            self.stdout.write(f"    {summary['sql'][:300]}")
+
+        if options['output']:
+            document = {'date': day.isoformat(), 'queries': summaries}
+            Path(options['output']).write_text(json.dumps(document, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Digest written to {options['output']}."))
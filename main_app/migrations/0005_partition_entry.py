@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from main_app import partitions
+
+
+def partition_entry_table(apps, schema_editor):
+    interval = partitions.get_interval()
+    if not interval or not partitions.is_supported(schema_editor.connection):
+        return
+    partitions.convert_entry_table(schema_editor.connection, interval)
+
+
+def unpartition_entry_table(apps, schema_editor):
+    if partitions.is_partitioned(schema_editor.connection):
+        partitions.revert_entry_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_entry_table, unpartition_entry_table),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.1 on 2026-10-19 06:19
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_partition_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_time', models.DurationField(default=datetime.timedelta(0))),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.task')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EntryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('entry_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.task')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='entryrollup',
+            constraint=models.UniqueConstraint(fields=('task', 'day'), name='entryrollup_task_day_unique'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_tags(value):
+    # Tag names are limited to 64 characters: longer legacy tags are cut.
+    names = (name.strip()[:64].strip() for name in (value or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def copy_tags_forward(apps, schema_editor):
+    Task = apps.get_model('main_app', 'Task')
+    Tag = apps.get_model('main_app', 'Tag')
+    TaskTags = Task.tags.through
+    db_alias = schema_editor.connection.alias
+
+    tasks = Task.objects.using(db_alias).exclude(legacy_tags__isnull=True).exclude(legacy_tags='')
+    tag_ids = {}
+    links = []
+
+    for task_id, user_id, legacy_tags in tasks.values_list('id', 'user_id', 'legacy_tags').iterator():
+        for name in split_tags(legacy_tags):
+            if (user_id, name) not in tag_ids:
+                tag_ids[(user_id, name)] = Tag.objects.using(db_alias).create(user_id=user_id, name=name).id
+            links.append(TaskTags(task_id=task_id, tag_id=tag_ids[(user_id, name)]))
+
+    TaskTags.objects.using(db_alias).bulk_create(links, batch_size=1000)
+
+
+def copy_tags_backward(apps, schema_editor):
+    Task = apps.get_model('main_app', 'Task')
+    db_alias = schema_editor.connection.alias
+
+    for task in Task.objects.using(db_alias).prefetch_related('tags').iterator(chunk_size=1000):
+        names = sorted(tag.name for tag in task.tags.all())
+        if names:
+            Task.objects.using(db_alias).filter(pk=task.pk).update(legacy_tags=','.join(names)[:255])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main_app', '0006_entry_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='tag_user_name_unique'),
+        ),
+        migrations.RenameField(
+            model_name='task',
+            old_name='tags',
+            new_name='legacy_tags',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='tasks', to='main_app.tag'),
+        ),
+        migrations.RunPython(copy_tags_forward, copy_tags_backward),
+    ]
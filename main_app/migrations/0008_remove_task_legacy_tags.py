@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_tag'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='task',
+            name='legacy_tags',
+        ),
+    ]
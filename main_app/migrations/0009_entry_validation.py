@@ -0,0 +1,48 @@
+# Generated by Django 4.1 on 2026-10-19 06:38
+
+from django.db import migrations, models
+from django.db.models import F
+
+from main_app import overlaps
+
+
+def swap_negative_entries(apps, schema_editor):
+    # Entries ending before they start were most likely typed in reverse:
+    # swap their times so the check constraint can be added. Their tasks
+    # counted the negative duration, and now count the positive one.
+    Entry = apps.get_model('main_app', 'Entry')
+    Task = apps.get_model('main_app', 'Task')
+    db_alias = schema_editor.connection.alias
+    for entry in Entry.objects.using(db_alias).filter(end_time__lt=F('start_time')).iterator():
+        duration = entry.start_time - entry.end_time
+        Entry.objects.using(db_alias).filter(pk=entry.pk).update(start_time=entry.end_time, end_time=entry.start_time)
+        Task.objects.using(db_alias).filter(pk=entry.task_id).update(total_time_spent=F('total_time_spent') + 2 * duration)
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    if overlaps.prevents_overlaps():
+        overlaps.add_exclusion_constraint(schema_editor.connection)
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    overlaps.drop_exclusion_constraint(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_remove_task_legacy_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(swap_negative_entries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['task', 'start_time'], name='entry_task_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='entry',
+            constraint=models.CheckConstraint(check=models.Q(('end_time__gte', models.F('start_time'))), name='entry_end_after_start'),
+        ),
+        migrations.RunPython(add_exclusion_constraint, drop_exclusion_constraint),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-19 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_entry_validation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['start_time', 'id'], name='entry_start_idx'),
+        ),
+    ]
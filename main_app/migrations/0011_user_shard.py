@@ -0,0 +1,44 @@
+# Generated by Django 4.1 on 2026-10-19 07:03
+
+import copy
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+import django.db.models.deletion
+
+
+def drop_user_constraints(apps, schema_editor):
+    # Users live on the default database only, so the shards cannot check
+    # the user of their tasks and tags: the foreign key constraints are
+    # dropped there and kept on the default database. Rolling back leaves
+    # them dropped, since the users are still missing from the shards.
+    if schema_editor.connection.alias == DEFAULT_DB_ALIAS:
+        return
+
+    for model_name in ('Tag', 'Task'):
+        model = apps.get_model('main_app', model_name)
+        old_field = model._meta.get_field('user')
+        new_field = copy.copy(old_field)
+        new_field.db_constraint = False
+        schema_editor.alter_field(model, old_field, new_field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_app', '0010_entry_start_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('database', models.CharField(max_length=64)),
+                ('moving', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(drop_user_constraints, migrations.RunPython.noop),
+    ]
@@ -1,36 +1,196 @@
-from django.db import models
-from django.db.models import F
+from django.db import models, router, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from datetime import timedelta
 
 # Create your models here.
 
+TAG_NAME_MAX_LENGTH = 64
+
+def parse_tag_names(value):
+    """
+    Normalize tag names given as a list or as a comma-separated string.
+
+    Parameters
+    ----------
+    value : str or list of str
+        The tag names.
+
+    Returns
+    -------
+    list of str
+        The stripped, non-empty names, without duplicates, in input order.
+
+    Raises
+    ------
+    ValueError
+        If a name is longer than TAG_NAME_MAX_LENGTH characters.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+
+    names = list(dict.fromkeys(name for name in (name.strip() for name in value or []) if name))
+    for name in names:
+        if len(name) > TAG_NAME_MAX_LENGTH:
+            raise ValueError(f"Tag names are limited to {TAG_NAME_MAX_LENGTH} characters: '{name[:20]}...'.")
+
+    return names
+
+class Tag(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=TAG_NAME_MAX_LENGTH)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='tag_user_name_unique'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class TaskQuerySet(models.QuerySet):
+    def rebuild_totals(self):
+        """
+        Recompute `total_time_spent` of the tasks from their entries.
+
+        Runs as a single UPDATE with correlated aggregate subqueries over the
+        live entries and the rollups of archived entries, for use after bulk
+        inserts that bypass `Entry.save()`.
+
+        Returns
+        -------
+        int
+            The number of updated tasks.
+        """
+        zero = timedelta(seconds=0)
+        entries = (
+            Entry.objects.filter(task=OuterRef('pk')).order_by().values('task')
+            .annotate(total=Sum(F('end_time') - F('start_time'))).values('total')
+        )
+        rollups = (
+            EntryRollup.objects.filter(task=OuterRef('pk')).order_by().values('task')
+            .annotate(total=Sum('total_time')).values('total')
+        )
+
+        return self.update(
+            total_time_spent=(
+                Coalesce(Subquery(entries, output_field=models.DurationField()), zero)
+                + Coalesce(Subquery(rollups, output_field=models.DurationField()), zero)
+            )
+        )
+
 class Task(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     description = models.TextField(null=True)
     total_time_spent = models.DurationField(default=timedelta(seconds=0))
-    tags = models.CharField(max_length=255, null=True, blank=True) 
+    tags = models.ManyToManyField('Tag', related_name='tasks', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    def set_tag_names(self, names):
+        """
+        Replace the tags of the task, creating the user's missing tags.
+
+        Parameters
+        ----------
+        names : str or list of str
+            The tag names, as a list or a comma-separated string.
+
+        Returns
+        -------
+        None
+        """
+        names = parse_tag_names(names)
+        # The tags live on the database of the task, e.g. its user's shard.
+        tags = Tag.objects.db_manager(self._state.db)
+        existing = tags.filter(user_id=self.user_id, name__in=names)
+        missing = set(names) - set(existing.values_list('name', flat=True))
+
+        # Tags created concurrently are skipped by the unique constraint.
+        tags.bulk_create(
+            [Tag(user_id=self.user_id, name=name) for name in missing], ignore_conflicts=True,
+        )
+
+        self.tags.set(tags.filter(user_id=self.user_id, name__in=names))
+
 class Entry(models.Model):
     task = models.ForeignKey('Task', on_delete=models.CASCADE)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.task.total_time_spent = F('total_time_spent') + self.total_time()
-        self.task.save(update_fields=['total_time_spent'])
+        # The entry and the task total are written in one short transaction.
+        with transaction.atomic(using=self._write_db(kwargs)):
+            super().save(*args, **kwargs)
+            self.task.total_time_spent = F('total_time_spent') + self.total_time()
+            self.task.save(update_fields=['total_time_spent'])
 
     def delete(self, *args, **kwargs):
-        self.task.total_time_spent = F('total_time_spent') - self.total_time()
-        self.task.save(update_fields=['total_time_spent'])
-        super().delete(*args, **kwargs)
+        with transaction.atomic(using=self._write_db(kwargs)):
+            self.task.total_time_spent = F('total_time_spent') - self.total_time()
+            self.task.save(update_fields=['total_time_spent'])
+            return super().delete(*args, **kwargs)
+
+    def _write_db(self, kwargs):
+        return kwargs.get('using') or router.db_for_write(type(self), instance=self)
 
     def total_time(self):
-        return self.end_time - self.start_time
\ No newline at end of file
+        return self.end_time - self.start_time
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(end_time__gte=F('start_time')), name='entry_end_after_start'),
+        ]
+        indexes = [
+            models.Index(fields=['task', 'start_time'], name='entry_task_start_idx'),
+            models.Index(fields=['start_time', 'id'], name='entry_start_idx'),
+        ]
+
+class EntryRollup(models.Model):
+    """
+    Per task and per day totals of entries moved to the archive.
+
+    Reports add these totals to the live entries so that archiving does not
+    change their results. Days are UTC days of the entries' start times.
+    """
+    task = models.ForeignKey('Task', on_delete=models.CASCADE)
+    day = models.DateField()
+    total_time = models.DurationField(default=timedelta(seconds=0))
+    entry_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'day'], name='entryrollup_task_day_unique'),
+        ]
+
+class EntryArchive(models.Model):
+    """
+    A compressed batch of archived entries belonging to one task.
+
+    The entries are stored as packed (id, start, end) integers, compressed
+    with zlib. See main_app/archive.py.
+    """
+    task = models.ForeignKey('Task', on_delete=models.CASCADE)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    entry_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class UserShard(models.Model):
+    """
+    The database holding a user's tags, tasks and entries.
+
+    Kept on the default database. Users without one are on the default
+    database. See main_app/sharding.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    database = models.CharField(max_length=64)
+    moving = models.BooleanField(default=False)
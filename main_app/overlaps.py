@@ -0,0 +1,246 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+from bisect import bisect
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+# Local imports.
+from . import partitions
+from .models import Entry
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on overlapping entries.
+
+* Entries are half-open ranges [start_time, end_time): an entry may start
+exactly when the previous one ends, and an empty entry (a timer that was just
+started) overlaps nothing.
+
+* With the `ENTRY_PREVENT_OVERLAPS` setting, `EntrySerializer` rejects an
+entry overlapping another entry of the same user, and the importer rejects
+such rows. `find_overlap()` runs two bounded queries over the entries of all
+the user's tasks, whatever the size of the history: the first entry starting
+inside the new range, and the last entry starting before it.
+
+* That is only exact if the user's stored entries do not overlap each other:
+an overlapping pair stored earlier can hide a later overlap with its first
+entry. Entries are checked on every write path of the application (the API
+and the importer), but not those written before the setting was turned on, by
+`loadgen` (synthetic load data) or directly in the database.
+
+* On PostgreSQL, with the setting on, the migrations also add an exclusion
+constraint over `tstzrange(start_time, end_time)` with a GiST index, which
+enforces the rule per task (not per user) in the database, including for
+concurrent writes and bulk inserts. It needs the btree_gist extension. It is skipped on
+partitioned tables, where an exclusion constraint would have to include the
+partition key, and if the existing entries already overlap; the query check
+still applies. To add or drop it after changing the setting, migrate
+main_app back to 0008 and forward again.
+"""
+
+EXCLUSION_CONSTRAINT = 'entry_no_overlap'
+
+###############################################################################
+# QUERY CHECK
+###############################################################################
+
+def prevents_overlaps():
+    """
+    Return whether overlapping entries are rejected.
+
+    Returns
+    -------
+    bool
+        The `ENTRY_PREVENT_OVERLAPS` setting.
+    """
+    return getattr(settings, 'ENTRY_PREVENT_OVERLAPS', False)
+
+def find_overlap(user, start_time, end_time, exclude=None):
+    """
+    Return an entry of a user that overlaps a time range.
+
+    Parameters
+    ----------
+    user : User or int
+        The user, or their id.
+    start_time : datetime.datetime
+        The start of the range.
+    end_time : datetime.datetime
+        The end of the range, excluded.
+    exclude : int, optional
+        Id of an entry to ignore, i.e. the entry being updated.
+
+    Returns
+    -------
+    Entry or None
+        An overlapping entry, if any.
+    """
+    if end_time <= start_time:
+        return None
+
+    # Empty entries overlap nothing.
+    entries = Entry.objects.filter(task__user=user).exclude(end_time=F('start_time'))
+    if exclude is not None:
+        entries = entries.exclude(pk=exclude)
+
+    # Entries starting inside the range.
+    inside = entries.filter(start_time__gte=start_time, start_time__lt=end_time).order_by('start_time').first()
+    if inside is not None:
+        return inside
+
+    # The last entry starting before the range, if it is still running then.
+    before = entries.filter(start_time__lt=start_time).order_by('-start_time').first()
+    if before is not None and before.end_time > start_time:
+        return before
+
+    return None
+
+def find_overlaps(user, ranges, using=None):
+    """
+    Return the new time ranges of a user overlapping one of their entries or
+    an earlier range of the list.
+
+    The stored entries are read with two queries, as in `find_overlap()`.
+
+    Parameters
+    ----------
+    user : User or int
+        The user, or their id.
+    ranges : list of tuple
+        The (start_time, end_time) of each new entry.
+    using : str, optional
+        The database alias of the user's entries; routed by default.
+
+    Returns
+    -------
+    set of int
+        The indexes of the overlapping ranges in `ranges`.
+    """
+    indexes = [index for index, (start_time, end_time) in enumerate(ranges) if end_time > start_time]
+    if not indexes:
+        return set()
+
+    low = min(ranges[index][0] for index in indexes)
+    high = max(ranges[index][1] for index in indexes)
+    entries = Entry.objects.using(using).filter(task__user=user).exclude(end_time=F('start_time'))
+    stored = list(entries.filter(start_time__gte=low, start_time__lt=high).values_list('start_time', 'end_time'))
+    stored.extend(entries.filter(start_time__lt=low).order_by('-start_time').values_list('start_time', 'end_time')[:1])
+
+    # Sorted, non-overlapping ranges accepted so far: a new range overlaps
+    # one of them if and only if it overlaps one of its two neighbours.
+    starts, ends = [], []
+
+    def insert(start_time, end_time):
+        position = bisect(starts, start_time)
+        starts.insert(position, start_time)
+        ends.insert(position, end_time)
+
+    def overlaps_accepted(start_time, end_time):
+        position = bisect(starts, start_time)
+        return (
+            (position > 0 and ends[position - 1] > start_time)
+            or (position < len(starts) and starts[position] < end_time)
+        )
+
+    for start_time, end_time in sorted(stored):
+        insert(start_time, end_time)
+
+    overlapping = set()
+    for index in indexes:
+        if overlaps_accepted(*ranges[index]):
+            overlapping.add(index)
+        else:
+            insert(*ranges[index])
+
+    return overlapping
+
+###############################################################################
+# EXCLUSION CONSTRAINT (POSTGRESQL ONLY)
+###############################################################################
+
+def has_exclusion_constraint(connection):
+    """
+    Return whether the entries table has the exclusion constraint.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+
+    Returns
+    -------
+    bool
+        True if the constraint exists.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s",
+            [partitions.TABLE, EXCLUSION_CONSTRAINT],
+        )
+        return cursor.fetchone() is not None
+
+def add_exclusion_constraint(connection):
+    """
+    Add the exclusion constraint on overlapping entries of a task.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+
+    Returns
+    -------
+    bool
+        True if the constraint was added; False on other databases, on a
+        partitioned table, or if existing entries overlap.
+    """
+    if connection.vendor != 'postgresql' or partitions.is_partitioned(connection):
+        return False
+    if has_exclusion_constraint(connection):
+        return True
+
+    qn = connection.ops.quote_name
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cursor.execute(
+                f"ALTER TABLE {qn(partitions.TABLE)} ADD CONSTRAINT {qn(EXCLUSION_CONSTRAINT)} "
+                f"EXCLUDE USING gist (task_id WITH =, tstzrange(start_time, end_time) WITH &&)"
+            )
+    except DatabaseError:
+        # Overlapping rows, or no permission to create the extension.
+        return False
+
+    return True
+
+def drop_exclusion_constraint(connection):
+    """
+    Drop the exclusion constraint, if it exists.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+
+    Returns
+    -------
+    None
+    """
+    if has_exclusion_constraint(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {connection.ops.quote_name(partitions.TABLE)} "
+                f"DROP CONSTRAINT {connection.ops.quote_name(EXCLUSION_CONSTRAINT)}"
+            )
@@ -0,0 +1,428 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import re
+from datetime import date
+
+# Third-party imports: Django natives.
+from django.conf import settings
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on native range partitioning of the entries table.
+
+* On PostgreSQL the `main_app_entry` table can be converted into a table
+partitioned by RANGE on `start_time`, with one child table per month or per
+year (the `ENTRY_PARTITION_INTERVAL` setting).
+
+* Queries that filter `start_time` with plain range comparisons (`__gte`,
+`__lt`) are pruned by the planner to the matching partitions. Filters such as
+`start_time__date` wrap the column in a cast and defeat pruning, so the views
+avoid them.
+
+* Old partitions can be detached (and dropped) in constant time instead of
+running a DELETE over millions of rows.
+
+* A DEFAULT partition catches rows outside of the pre-created ranges so that
+inserts never fail. Keep partitions created ahead of time with the
+`manage_entry_partitions` command, since a range cannot be created while the
+DEFAULT partition holds rows that belong to it.
+
+* PostgreSQL requires the primary key of a partitioned table to include the
+partition key, so the converted table uses (id, start_time). Django keeps
+treating `id` as the primary key.
+"""
+
+TABLE = 'main_app_entry'
+LEGACY_TABLE = 'main_app_entry_legacy'
+DEFAULT_PARTITION = 'main_app_entry_default'
+INTERVALS = ('month', 'year')
+
+###############################################################################
+# PARTITION RANGES
+###############################################################################
+
+def get_interval():
+    """
+    Return the configured partition interval.
+
+    Returns
+    -------
+    str
+        'month', 'year' or an empty string when partitioning is disabled.
+    """
+    return getattr(settings, 'ENTRY_PARTITION_INTERVAL', '') or ''
+
+def partition_bounds(day, interval):
+    """
+    Return the range of the partition that contains a given day.
+
+    Parameters
+    ----------
+    day : datetime.date
+        Any day inside the partition.
+    interval : str
+        Either 'month' or 'year'.
+
+    Returns
+    -------
+    tuple of datetime.date
+        The inclusive lower bound and exclusive upper bound.
+    """
+    if interval == 'month':
+        start = date(day.year, day.month, 1)
+        end = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    elif interval == 'year':
+        start = date(day.year, 1, 1)
+        end = date(day.year + 1, 1, 1)
+    else:
+        raise ValueError(f"Unsupported partition interval: {interval!r}")
+
+    return start, end
+
+def partition_name(start, interval):
+    """
+    Return the table name of the partition starting on a given day.
+
+    Parameters
+    ----------
+    start : datetime.date
+        The lower bound of the partition.
+    interval : str
+        Either 'month' or 'year'.
+
+    Returns
+    -------
+    str
+        For example 'main_app_entry_p2024_01' or 'main_app_entry_p2024'.
+    """
+    if interval == 'month':
+        return f'{TABLE}_p{start.year:04d}_{start.month:02d}'
+    return f'{TABLE}_p{start.year:04d}'
+
+def parse_partition_name(name):
+    """
+    Return the range covered by a partition from its table name.
+
+    Parameters
+    ----------
+    name : str
+        A name produced by `partition_name()`.
+
+    Returns
+    -------
+    tuple or None
+        The (start, end, interval) of the partition, or None if the name does
+        not belong to a range partition (for example the DEFAULT partition).
+    """
+    match = re.fullmatch(rf'{TABLE}_p(\d{{4}})(?:_(\d{{2}}))?', name)
+    if not match:
+        return None
+
+    year, month = match.groups()
+    interval = 'month' if month else 'year'
+    start, end = partition_bounds(date(int(year), int(month or 1), 1), interval)
+
+    return start, end, interval
+
+def partition_ranges(first_day, last_day, interval):
+    """
+    Return the consecutive partition ranges covering a span of days.
+
+    Parameters
+    ----------
+    first_day : datetime.date
+        The first day that must be covered.
+    last_day : datetime.date
+        The last day that must be covered.
+    interval : str
+        Either 'month' or 'year'.
+
+    Returns
+    -------
+    list of tuple
+        The (start, end) bounds of each partition, in order.
+    """
+    ranges = []
+    start, end = partition_bounds(first_day, interval)
+
+    while start <= last_day:
+        ranges.append((start, end))
+        start, end = partition_bounds(end, interval)
+
+    return ranges
+
+###############################################################################
+# DATABASE OPERATIONS (POSTGRESQL ONLY)
+###############################################################################
+
+def is_supported(connection):
+    """
+    Return whether the database supports native range partitioning.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+
+    Returns
+    -------
+    bool
+        True on PostgreSQL.
+    """
+    return connection.vendor == 'postgresql'
+
+def is_partitioned(connection):
+    """
+    Return whether the entries table is already partitioned.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+
+    Returns
+    -------
+    bool
+        True if `main_app_entry` is a partitioned table.
+    """
+    if not is_supported(connection):
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+def list_partitions(connection):
+    """
+    Return the names of the partitions attached to the entries table.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+
+    Returns
+    -------
+    list of str
+        The partition table names, sorted.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+            [TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def create_partitions(connection, interval, first_day, last_day):
+    """
+    Create any missing partitions covering a span of days.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+    interval : str
+        Either 'month' or 'year'.
+    first_day : datetime.date
+        The first day that must be covered.
+    last_day : datetime.date
+        The last day that must be covered.
+
+    Returns
+    -------
+    list of str
+        The names of the partitions that were created.
+    """
+    existing = set(list_partitions(connection))
+    created = []
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        for start, end in partition_ranges(first_day, last_day, interval):
+            name = partition_name(start, interval)
+            if name in existing:
+                continue
+            cursor.execute(
+                f"CREATE TABLE {qn(name)} PARTITION OF {qn(TABLE)} "
+                f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') "
+                f"TO ('{end.isoformat()} 00:00:00+00')"
+            )
+            created.append(name)
+
+    return created
+
+def detach_partitions(connection, before, drop=False):
+    """
+    Detach every range partition that ends on or before a given day.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+    before : datetime.date
+        Partitions whose upper bound is on or before this day are detached.
+    drop : bool, optional
+        Drop the detached tables instead of keeping them around.
+
+    Returns
+    -------
+    list of str
+        The names of the partitions that were detached.
+    """
+    detached = []
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        for name in list_partitions(connection):
+            bounds = parse_partition_name(name)
+            if bounds is None or bounds[1] > before:
+                continue
+            cursor.execute(f"ALTER TABLE {qn(TABLE)} DETACH PARTITION {qn(name)}")
+            if drop:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+            detached.append(name)
+
+    return detached
+
+def _table_definitions(cursor):
+    """
+    Return the secondary indexes and constraints of the entries table.
+
+    Parameters
+    ----------
+    cursor : CursorWrapper
+        An open database cursor.
+
+    Returns
+    -------
+    tuple of list
+        The CREATE INDEX statements of the non-unique indexes, and the
+        (name, definition) pairs of the foreign key and check constraints.
+    """
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'x'))",
+        [TABLE, TABLE],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('f', 'c')",
+        [TABLE],
+    )
+    return indexes, cursor.fetchall()
+
+def convert_entry_table(connection, interval, ahead=3):
+    """
+    Convert the plain entries table into a range partitioned table.
+
+    The existing rows are copied into partitions covering their time span,
+    secondary indexes and foreign keys are recreated on the partitioned
+    parent, and the identity sequence continues from the current maximum id.
+    Must be called inside a transaction.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+    interval : str
+        Either 'month' or 'year'.
+    ahead : int, optional
+        Number of future partitions to create after the current one.
+
+    Returns
+    -------
+    None
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unsupported partition interval: {interval!r}")
+
+    qn = connection.ops.quote_name
+    table, legacy = qn(TABLE), qn(LEGACY_TABLE)
+
+    with connection.cursor() as cursor:
+        # Keep the definitions of the secondary indexes and constraints so
+        # they can be recreated on the partitioned parent.
+        indexes, constraints = _table_definitions(cursor)
+
+        cursor.execute(f"SELECT MIN(start_time)::date FROM {table}")
+        first_day = cursor.fetchone()[0] or date.today()
+
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        cursor.execute(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY RANGE (start_time)"
+        )
+
+    # Pre-create the partitions for the historical span plus the future ones.
+    last_day = partition_bounds(date.today(), interval)[0]
+    for _ in range(ahead):
+        last_day = partition_bounds(last_day, interval)[1]
+    create_partitions(connection, interval, first_day, last_day)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {qn(DEFAULT_PARTITION)} PARTITION OF {table} DEFAULT")
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)",
+            [TABLE],
+        )
+        cursor.execute(f"DROP TABLE {legacy}")
+
+        # Index and constraint names are free again once the legacy table is
+        # gone, so recreate them with their original names.
+        cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, start_time)")
+        for indexdef in indexes:
+            cursor.execute(re.sub(rf' ON (\S+\.)?{TABLE} ', f' ON {table} ', indexdef))
+        for name, definition in constraints:
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {qn(name)} {definition}")
+
+def revert_entry_table(connection):
+    """
+    Convert the partitioned entries table back into a plain table.
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        The database connection.
+
+    Returns
+    -------
+    None
+    """
+    qn = connection.ops.quote_name
+    table, legacy = qn(TABLE), qn(LEGACY_TABLE)
+
+    with connection.cursor() as cursor:
+        indexes, constraints = _table_definitions(cursor)
+
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        cursor.execute(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING IDENTITY)")
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)",
+            [TABLE],
+        )
+        cursor.execute(f"DROP TABLE {legacy} CASCADE")
+
+        cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        for indexdef in indexes:
+            cursor.execute(re.sub(rf' ON (ONLY )?(\S+\.)?{TABLE} ', f' ON {table} ', indexdef))
+        for name, definition in constraints:
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {qn(name)} {definition}")
@@ -0,0 +1,354 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+from datetime import date, timedelta
+
+# Third-party imports: Django natives.
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncQuarter, TruncWeek
+
+# Local imports.
+from .models import Task
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on grouped reports.
+
+* A report groups the time of a user's entries by any combination of the
+dimensions in `GROUPINGS`, for example `task,day` or `tag,month`. The whole
+aggregation runs as one GROUP BY query over the entries, plus one over the
+rollups of archived entries, and the two are merged by group key.
+
+* Periods (day, week, month, quarter) are truncated in the database in the given time
+zone. Weeks start on Monday. Rollups of archived entries are kept per UTC
+day, so their periods are approximated by that day.
+
+* Grouping by tag counts an entry once for each tag of its task. Entries of
+untagged tasks are grouped under a null tag.
+
+* The result is columnar: one list per column, all of the same length, which
+is much smaller than a list of objects for large reports.
+
+* Tabular exports lay periods out as a dense index of columns covering the
+whole span, which may cross years. The database truncates every entry to the
+start of its period, and the column of a period is computed arithmetically
+from its start (`period_position()`), without per-entry datetime math.
+"""
+
+GROUPINGS = ('task', 'tag', 'day', 'week', 'month', 'quarter')
+PERIODS = {'day': TruncDate, 'week': TruncWeek, 'month': TruncMonth, 'quarter': TruncQuarter}
+
+###############################################################################
+# GROUPING
+###############################################################################
+
+def parse_group_by(value):
+    """
+    Parse the `group_by` query parameter.
+
+    Parameters
+    ----------
+    value : str or None
+        Comma-separated dimension names. Defaults to 'task' when empty.
+
+    Returns
+    -------
+    list of str
+        The dimension names, without duplicates, in order.
+
+    Raises
+    ------
+    ValueError
+        If a dimension is not one of `GROUPINGS`.
+    """
+    names = [name.strip() for name in (value or 'task').split(',') if name.strip()]
+    unknown = [name for name in names if name not in GROUPINGS]
+
+    if unknown:
+        raise ValueError(f"Unknown grouping(s): {', '.join(unknown)}. Use any of: {', '.join(GROUPINGS)}.")
+
+    return list(dict.fromkeys(names)) or ['task']
+
+def _dimensions(group_by, time_field, tzinfo):
+    """
+    Return how to compute each report column.
+
+    Parameters
+    ----------
+    group_by : list of str
+        The dimension names.
+    time_field : str
+        'start_time' for entries, 'day' for rollups of archived entries.
+    tzinfo : tzinfo or None
+        The time zone in which periods are truncated. Only used for entries.
+
+    Returns
+    -------
+    list of tuple
+        The (column name, lookup) of each column, where the lookup is either
+        a field path or an expression.
+    """
+    columns = []
+
+    for name in group_by:
+        if name == 'task':
+            columns.extend([('task_id', 'task'), ('task_name', 'task__name')])
+        elif name == 'tag':
+            columns.append(('tag', 'task__tags__name'))
+        elif time_field == 'day' and name == 'day':
+            columns.append(('day', 'day'))
+        elif time_field == 'day':
+            columns.append((name, PERIODS[name]('day', output_field=DateField())))
+        else:
+            columns.append((name, PERIODS[name](time_field, output_field=DateField(), tzinfo=tzinfo)))
+
+    return columns
+
+def _grouped_values(queryset, columns, **aggregates):
+    """
+    Return the rows of a GROUP BY query over the report columns.
+
+    Parameters
+    ----------
+    queryset : QuerySet
+        The rows to aggregate.
+    columns : list of tuple
+        The (column name, lookup) pairs returned by `_dimensions()`.
+    aggregates : dict
+        The `total_time` and `entry_count` aggregates.
+
+    Returns
+    -------
+    QuerySet
+        Tuples of the column values followed by the aggregates.
+    """
+    fields = [lookup if isinstance(lookup, str) else f'_{name}' for name, lookup in columns]
+    expressions = {f'_{name}': lookup for name, lookup in columns if not isinstance(lookup, str)}
+
+    return (
+        queryset.order_by().values(*fields, **expressions)
+        .annotate(**aggregates).values_list(*fields, *aggregates)
+    )
+
+def grouped_report(entries, rollups, group_by, tzinfo=None):
+    """
+    Aggregate entries and archived rollups into a columnar report.
+
+    Parameters
+    ----------
+    entries : QuerySet
+        The Entry objects to aggregate, already filtered.
+    rollups : QuerySet
+        The EntryRollup objects to aggregate, already filtered.
+    group_by : list of str
+        The dimension names, see `parse_group_by()`.
+    tzinfo : tzinfo, optional
+        The time zone in which periods are truncated.
+
+    Returns
+    -------
+    dict
+        The `group_by` names and the `columns`: one list per dimension column,
+        plus `total_time` (seconds) and `entry_count`. With the task
+        dimension, `task_description` and `task_tags` are included as well.
+    """
+    names, totals = aggregate(entries, rollups, group_by, tzinfo)
+
+    # Sort groups by key, with null values (e.g. untagged) first.
+    keys = sorted(totals, key=lambda key: [(value is not None, value) for value in key])
+    columns = {name: [key[i] for key in keys] for i, name in enumerate(names)}
+
+    for name in PERIODS:
+        if name in columns:
+            columns[name] = [day.isoformat() for day in columns[name]]
+
+    columns['total_time'] = [totals[key][0] for key in keys]
+    columns['entry_count'] = [totals[key][1] for key in keys]
+
+    if 'task' in group_by:
+        _add_task_details(columns)
+
+    return {'group_by': group_by, 'columns': columns}
+
+def aggregate(entries, rollups, group_by, tzinfo=None):
+    """
+    Aggregate entries and archived rollups by group key.
+
+    Parameters
+    ----------
+    entries : QuerySet
+        The Entry objects to aggregate, already filtered.
+    rollups : QuerySet
+        The EntryRollup objects to aggregate, already filtered.
+    group_by : list of str
+        The dimension names, see `parse_group_by()`.
+    tzinfo : tzinfo, optional
+        The time zone in which periods are truncated.
+
+    Returns
+    -------
+    tuple
+        The column names of the group keys, and a dict mapping each group key
+        (a tuple of column values) to its [total seconds, entry count].
+    """
+    entry_columns = _dimensions(group_by, 'start_time', tzinfo)
+    names = [name for name, lookup in entry_columns]
+
+    totals = {}
+    queries = (
+        _grouped_values(
+            entries, entry_columns,
+            total_time=Sum(F('end_time') - F('start_time')), entry_count=Count('id'),
+        ),
+        _grouped_values(
+            rollups, _dimensions(group_by, 'day', tzinfo),
+            total_time=Sum('total_time'), entry_count=Sum('entry_count'),
+        ),
+    )
+
+    for query in queries:
+        for row in query:
+            key = row[:-2]
+            total = totals.setdefault(key, [0.0, 0])
+            total[0] += row[-2].total_seconds()
+            total[1] += row[-1]
+
+    return names, totals
+
+def _add_task_details(columns):
+    """
+    Add the description and tags of each task to a columnar report.
+
+    Parameters
+    ----------
+    columns : dict
+        The report columns, including `task_id`. Updated in place.
+
+    Returns
+    -------
+    None
+    """
+    task_ids = set(columns['task_id'])
+    descriptions = dict(Task.objects.filter(id__in=task_ids).values_list('id', 'description'))
+    tags = {}
+
+    for task_id, name in Task.tags.through.objects.filter(task_id__in=task_ids).values_list('task_id', 'tag__name'):
+        tags.setdefault(task_id, []).append(name)
+
+    columns['task_description'] = [descriptions.get(task_id) for task_id in columns['task_id']]
+    columns['task_tags'] = [sorted(tags.get(task_id, [])) for task_id in columns['task_id']]
+
+###############################################################################
+# PERIOD INDEX
+###############################################################################
+
+def period_start(day, period):
+    """
+    Return the first day of the period containing a day.
+
+    Parameters
+    ----------
+    day : datetime.date
+        Any day.
+    period : str
+        One of 'day', 'week', 'month' or 'quarter'. Weeks start on Monday.
+
+    Returns
+    -------
+    datetime.date
+        The first day of the period.
+    """
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return date(day.year, day.month, 1)
+    if period == 'quarter':
+        return date(day.year, day.month - (day.month - 1) % 3, 1)
+    raise ValueError(f"Unknown period: {period!r}")
+
+def period_position(start, origin, period):
+    """
+    Return the offset of a period from the first period of an index.
+
+    Parameters
+    ----------
+    start : datetime.date
+        The first day of the period, as returned by the database truncation.
+    origin : datetime.date
+        The first day of the first period of the index.
+    period : str
+        One of 'day', 'week', 'month' or 'quarter'.
+
+    Returns
+    -------
+    int
+        The number of whole periods between `origin` and `start`.
+    """
+    if period == 'day':
+        return (start - origin).days
+    if period == 'week':
+        return (start - origin).days // 7
+
+    months = (start.year - origin.year) * 12 + start.month - origin.month
+    return months if period == 'month' else months // 3
+
+def period_index(start_date, end_date, period):
+    """
+    Return the first day of every period overlapping a span of days.
+
+    Parameters
+    ----------
+    start_date : datetime.date
+        The first day of the span.
+    end_date : datetime.date
+        The last day of the span (inclusive).
+    period : str
+        One of 'day', 'week', 'month' or 'quarter'.
+
+    Returns
+    -------
+    list of datetime.date
+        The dense, ordered index of periods, possibly spanning several years.
+    """
+    origin = period_start(start_date, period)
+    count = period_position(period_start(end_date, period), origin, period) + 1
+
+    if period in ('day', 'week'):
+        step = 1 if period == 'day' else 7
+        return [origin + timedelta(days=i * step) for i in range(count)]
+
+    months = 1 if period == 'month' else 3
+    first = origin.year * 12 + origin.month - 1
+    return [date((first + i * months) // 12, (first + i * months) % 12 + 1, 1) for i in range(count)]
+
+def period_label(start, period):
+    """
+    Return the column header of a period.
+
+    Parameters
+    ----------
+    start : datetime.date
+        The first day of the period.
+    period : str
+        One of 'day', 'week', 'month' or 'quarter'.
+
+    Returns
+    -------
+    str
+        For example '2024-03-15', '2024-W11', '2024-03' or '2024-Q1'.
+    """
+    if period == 'week':
+        year, week, _ = start.isocalendar()
+        return f'{year}-W{week:02d}'
+    if period == 'month':
+        return start.strftime('%Y-%m')
+    if period == 'quarter':
+        return f'{start.year}-Q{(start.month - 1) // 3 + 1}'
+    return start.isoformat()
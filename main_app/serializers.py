@@ -1,16 +1,202 @@
-from rest_framework import serializers
+from django.conf import settings
+from django.db import IntegrityError, models, router, transaction
+from rest_framework import permissions, serializers
 
+from . import overlaps
 from .models import Task
 from .models import Entry
+from .models import parse_tag_names
 
-class TaskSerializer(serializers.ModelSerializer):
-    user = serializers.ReadOnlyField(source='user.username')
+# Database constraints on entries reported as validation errors.
+ENTRY_CONSTRAINTS = ('entry_end_after_start', overlaps.EXCLUSION_CONSTRAINT)
+
+def durations_as_seconds(context):
+    """
+    Return whether durations are emitted as integer seconds.
+
+    Parameters
+    ----------
+    context : dict
+        The serializer context, with the request if any.
+
+    Returns
+    -------
+    bool
+        The `durations` query parameter ('seconds' or 'string') if given,
+        else the `API_DURATIONS_AS_SECONDS` setting.
+    """
+    request = context.get('request')
+    choice = request.query_params.get('durations') if request is not None else None
+    if choice in ('seconds', 'string'):
+        return choice == 'seconds'
+
+    return settings.API_DURATIONS_AS_SECONDS
+
+class DurationField(serializers.DurationField):
+    """
+    Duration, as a string or as integer seconds (see `durations_as_seconds`).
+    """
+
+    def to_representation(self, value):
+        if durations_as_seconds(self.context):
+            return round(value.total_seconds())
+        return super().to_representation(value)
+
+class SparseFieldsMixin:
+    """
+    Serializer returning only the fields a GET request asks for.
+
+    `?fields=id,name` keeps only the listed fields and `?omit=description`
+    drops fields; unknown names are rejected. `optimize_queryset()` then
+    narrows the SQL to the columns those fields read, with `.only()`, and
+    joins or prefetches the relations they need.
+
+    Attributes
+    ----------
+    field_lookups : dict
+        Fields that do not read the model column of the same name, mapped to
+        the lookups they read, e.g. {'task_name': ['task__name']}.
+    prefetch_fields : dict
+        Fields mapped to the relation they prefetch, e.g. {'tags': 'tags'}.
+    """
+
+    field_lookups = {}
+    prefetch_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = self.selected_fields(self.context.get('request'))
+        if names is not None:
+            for name in set(self.fields) - set(names):
+                self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, request):
+        """
+        Return the fields requested by the `fields` and `omit` parameters.
+
+        Parameters
+        ----------
+        request : Request or None
+            The request; only GET and HEAD requests can select fields.
+
+        Returns
+        -------
+        list of str or None
+            The selected field names, or None for every field.
+        """
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return None
+
+        fields = [name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()]
+        omit = [name.strip() for name in request.query_params.get('omit', '').split(',') if name.strip()]
+        if not fields and not omit:
+            return None
+
+        unknown = sorted(set(fields + omit) - set(cls.Meta.fields))
+        if unknown:
+            raise serializers.ValidationError({'fields': [f"Unknown fields: {', '.join(unknown)}."]})
+
+        return [name for name in cls.Meta.fields if (not fields or name in fields) and name not in omit]
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request, required=()):
+        """
+        Narrow a queryset to what the selected fields read.
+
+        Parameters
+        ----------
+        queryset : QuerySet
+            The queryset of the serialized objects.
+        request : Request or None
+            The request selecting the fields.
+        required : iterable of str, optional
+            Columns the view itself reads, always loaded.
+
+        Returns
+        -------
+        QuerySet
+            The queryset with the needed joins and prefetches, restricted
+            with `.only()` when the request selects fields.
+        """
+        names = cls.selected_fields(request)
+        columns, related, prefetch = set(required), set(), set()
+
+        for name in cls.Meta.fields if names is None else names:
+            if name in cls.prefetch_fields:
+                prefetch.add(cls.prefetch_fields[name])
+                continue
+            for lookup in cls.field_lookups.get(name, [name]):
+                columns.add(lookup)
+                if '__' in lookup:
+                    relation = lookup.rsplit('__', 1)[0]
+                    related.add(relation)
+                    columns.add(relation)
+
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        if names is not None:
+            queryset = queryset.only(*sorted(columns))
+
+        return queryset
+
+class TagListField(serializers.Field):
+    """
+    Tags of a task as a list of names.
+
+    Accepts either a list of names or a comma-separated string, and always
+    returns a sorted list of names.
+    """
+
+    def to_representation(self, value):
+        return sorted(tag.name for tag in value.all())
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (str, list)) or not all(isinstance(name, str) for name in data):
+            raise serializers.ValidationError('Expected a list of names or a comma-separated string.')
+        try:
+            return parse_tag_names(data)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_field_mapping = {**serializers.ModelSerializer.serializer_field_mapping, models.DurationField: DurationField}
+
+    user = serializers.SerializerMethodField()
+    tags = TagListField(required=False)
 
     class Meta:
         model = Task
         fields = ('id', 'name', 'description', 'total_time_spent', 'tags', 'user', 'created_at', 'updated_at')
 
-class EntrySerializer(serializers.ModelSerializer):
+    field_lookups = {'user': ['user']}
+    prefetch_fields = {'tags': 'tags'}
+
+    def get_user(self, task):
+        # Tasks are listed by their owner: take the name from the request
+        # rather than join the users, who may live on another database.
+        request = self.context.get('request')
+        if request is not None and request.user.pk == task.user_id:
+            return request.user.username
+        return task.user.username
+
+    def create(self, validated_data):
+        tags = validated_data.pop('tags', None)
+        task = super().create(validated_data)
+        if tags is not None:
+            task.set_tag_names(tags)
+        return task
+
+    def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
+        task = super().update(instance, validated_data)
+        if tags is not None:
+            task.set_tag_names(tags)
+        return task
+
+class EntrySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     task_name = serializers.ReadOnlyField(source='task.name')
     total_time = serializers.SerializerMethodField()
 
@@ -18,5 +204,40 @@ class EntrySerializer(serializers.ModelSerializer):
         model = Entry
         fields = ['id', 'task', 'task_name', 'start_time', 'end_time', 'total_time']
 
+    field_lookups = {'task_name': ['task__name'], 'total_time': ['start_time', 'end_time']}
+
     def get_total_time(self, obj):
-        return str(obj.end_time - obj.start_time)
\ No newline at end of file
+        if durations_as_seconds(self.context):
+            return round((obj.end_time - obj.start_time).total_seconds())
+        return str(obj.end_time - obj.start_time)
+
+    def validate(self, attrs):
+        """
+        Reject entries ending before they start and, if enabled, entries
+        overlapping another entry of the user. See main_app/overlaps.py.
+        """
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        task = attrs.get('task', getattr(self.instance, 'task', None))
+
+        if start_time and end_time and end_time < start_time:
+            raise serializers.ValidationError({'end_time': 'End time must not be before start time.'})
+
+        if task and start_time and end_time and overlaps.prevents_overlaps():
+            overlap = overlaps.find_overlap(task.user_id, start_time, end_time, exclude=getattr(self.instance, 'pk', None))
+            if overlap is not None:
+                raise serializers.ValidationError(
+                    {'non_field_errors': [f'Entry overlaps entry {overlap.pk} ({overlap.start_time} to {overlap.end_time}).']}
+                )
+
+        return attrs
+
+    def save(self, **kwargs):
+        # Concurrent writes can still be caught by the database constraints.
+        try:
+            with transaction.atomic(using=router.db_for_write(Entry, instance=self.instance)):
+                return super().save(**kwargs)
+        except IntegrityError as error:
+            if not any(name in str(error) for name in ENTRY_CONSTRAINTS):
+                raise
+            raise serializers.ValidationError({'non_field_errors': ['Entry overlaps another entry or ends before it starts.']})
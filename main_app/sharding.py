@@ -0,0 +1,269 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+# Local imports.
+from .models import Entry, EntryArchive, EntryRollup, Tag, Task, UserShard
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the sharding of user data.
+
+* Every row of main_app belongs to one user: tags and tasks directly, the
+tags of tasks, entries, rollups and archives through their task. Each URL of
+the `DATABASE_SHARD_URLS` setting adds a shard ('shard1', 'shard2' and so
+on) holding the data of some users, next to the default database, which
+keeps the users, sessions, profiles and the shard map (`UserShard`).
+
+* New users are placed on a shard by their id, round robin over
+`DATABASE_SHARDS`; users without a `UserShard`, such as those created before
+sharding, are on the default database. The `ShardRouter` of
+thintimer/routers.py sends the queries of a request to the shard of its
+user. Code running outside a request uses the default database unless it
+names a shard with `.using()`: the 'import_entries' command imports on the
+user's shard and 'archive_entries' archives every shard in turn.
+
+* The user rows live on the default database, so on the other shards tasks
+and tags reference their user without a foreign key constraint: migration
+0011 drops it there and keeps it on the default database. Nothing stops a
+shard row from naming a missing user; deleting a user deletes their data on
+their shard. Later migrations altering these tables must drop the
+constraint on the shards again.
+
+* Primary keys are unique across shards: each shard allocates ids from its
+own range of SHARD_ID_SPAN ids (set after `migrate --database <shard>`),
+so rows keep their ids when moved. On SQLite a shard continues after the
+highest id it ever held, so moving users to a shard with a lower range can
+make two shards allocate the same ids: a later move hitting such an id fails
+and leaves the user where they were.
+
+* `move_user()` (the 'rebalance_shards' command) copies a user's rows to
+another shard in batches, switches their `UserShard` and deletes the old
+rows, in batches too. While the copy runs, the user's writes are refused
+with a 503 response and their reads go to the old shard.
+"""
+
+BATCH_SIZE = 5000
+
+# Ids allocated by each shard, from its index in DATABASE_SHARDS * SPAN.
+SHARD_ID_SPAN = 2 ** 40
+
+# Sharded tables, parents first, with the lookup of their user id.
+SHARDED_TABLES = [
+    (Tag, 'user_id'),
+    (Task, 'user_id'),
+    (Task.tags.through, 'task__user_id'),
+    (Entry, 'task__user_id'),
+    (EntryRollup, 'task__user_id'),
+    (EntryArchive, 'task__user_id'),
+]
+
+###############################################################################
+# SHARD MAP
+###############################################################################
+
+def is_enabled():
+    """
+    Return whether the user data is sharded.
+
+    Returns
+    -------
+    bool
+        True if DATABASE_SHARDS lists other databases than the default one.
+    """
+    return len(settings.DATABASE_SHARDS) > 1
+
+def is_sharded(model):
+    """
+    Return whether a model's rows are spread over the shards.
+
+    Parameters
+    ----------
+    model : type
+        The model.
+
+    Returns
+    -------
+    bool
+        True for the main_app models but the shard map, when sharding is on.
+    """
+    return is_enabled() and model._meta.app_label == 'main_app' and model is not UserShard
+
+def shard_of(user_id):
+    """
+    Return the shard of a user.
+
+    Parameters
+    ----------
+    user_id : int
+        The id of the user.
+
+    Returns
+    -------
+    tuple
+        The database alias of the shard, and whether the user is being moved.
+    """
+    shard = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).values_list('database', 'moving').first()
+
+    return shard or (DEFAULT_DB_ALIAS, False)
+
+def place(user_id):
+    """
+    Return the shard of a new user.
+
+    Parameters
+    ----------
+    user_id : int
+        The id of the user.
+
+    Returns
+    -------
+    str
+        The database alias of the shard.
+    """
+    return settings.DATABASE_SHARDS[user_id % len(settings.DATABASE_SHARDS)]
+
+@receiver(post_save, sender=User)
+def place_new_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and is_enabled():
+        UserShard.objects.using(DEFAULT_DB_ALIAS).create(user=instance, database=place(instance.pk))
+
+@receiver(pre_delete, sender=User)
+def delete_user_data(sender, instance, **kwargs):
+    # The default database is cleaned up by the cascade of the deletion.
+    if not is_enabled():
+        return
+
+    database, _ = shard_of(instance.pk)
+    if database != DEFAULT_DB_ALIAS:
+        _delete_rows(database, instance.pk, BATCH_SIZE)
+
+###############################################################################
+# ID RANGES
+###############################################################################
+
+def prepare_shard(database):
+    """
+    Make a shard allocate ids from its own range, see the notes above.
+
+    Sequences already past the start of the range are left alone.
+
+    Parameters
+    ----------
+    database : str
+        The database alias of the shard.
+
+    Returns
+    -------
+    None
+    """
+    start = settings.DATABASE_SHARDS.index(database) * SHARD_ID_SPAN
+    if not start:
+        return
+
+    connection = connections[database]
+    with connection.cursor() as cursor:
+        for model, _ in SHARDED_TABLES:
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(nextval(pg_get_serial_sequence(%s, 'id')), %s))",
+                    [table, table, start],
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT %s, 0 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                    [table, table],
+                )
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s", [start, table, start])
+
+@receiver(post_migrate)
+def prepare_migrated_shard(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender.label == 'main_app' and using in settings.DATABASE_SHARDS:
+        prepare_shard(using)
+
+###############################################################################
+# REBALANCING
+###############################################################################
+
+def _delete_rows(database, user_id, batch_size):
+    """
+    Delete the rows of a user from a shard, children first, in batches.
+    """
+    for model, lookup in reversed(SHARDED_TABLES):
+        rows = model._base_manager.using(database).filter(**{lookup: user_id})
+        while True:
+            ids = list(rows.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            model._base_manager.using(database).filter(pk__in=ids).delete()
+
+def move_user(user, database, batch_size=BATCH_SIZE, progress=None):
+    """
+    Move the data of a user to another shard.
+
+    Parameters
+    ----------
+    user : User
+        The user.
+    database : str
+        The database alias of the destination shard.
+    batch_size : int, optional
+        Number of rows copied or deleted per statement.
+    progress : callable, optional
+        Called with (model, count) after each copied batch.
+
+    Returns
+    -------
+    int
+        The number of copied rows.
+    """
+    if database not in settings.DATABASE_SHARDS:
+        raise ValueError(f"Unknown shard: {database!r}")
+
+    source, _ = shard_of(user.pk)
+    if source == database:
+        return 0
+
+    prepare_shard(database)
+    UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(user=user, defaults={'database': source, 'moving': True})
+
+    copied = 0
+    try:
+        # Rows left over by an interrupted move.
+        _delete_rows(database, user.pk, batch_size)
+
+        for model, lookup in SHARDED_TABLES:
+            rows = model._base_manager.using(source).filter(**{lookup: user.pk}).order_by('pk')
+            last = None
+            while True:
+                batch = list((rows if last is None else rows.filter(pk__gt=last))[:batch_size])
+                if not batch:
+                    break
+                with transaction.atomic(using=database):
+                    model._base_manager.using(database).bulk_create(batch)
+
+                last = batch[-1].pk
+                copied += len(batch)
+                if progress:
+                    progress(model, len(batch))
+    except Exception:
+        _delete_rows(database, user.pk, batch_size)
+        UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user=user).update(moving=False)
+        raise
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user=user).update(database=database, moving=False)
+    _delete_rows(source, user.pk, batch_size)
+
+    return copied
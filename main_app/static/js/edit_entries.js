@@ -5,59 +5,96 @@ function convertUTCToLocal(utcDateString) {
     return date.toLocaleTimeString('en-US', options);
 }
 
+// Entries of the days already fetched, by YYYY-MM-DD date.
+let entriesByDay = {};
+
+// Number of days fetched on each side of a missing day.
+const PREFETCH_DAYS = 3;
+
+// Format a date to YYYY-MM-DD for the API.
+function formatDate(date) {
+    return date.toISOString().split('T')[0];
+}
+
 // 
-function fetchEntriesForDate(date) {
+function fetchEntriesForDate(date, refresh = false) {
+    const day = formatDate(date);
+
+    if (refresh) {
+        entriesByDay = {};
+    }
+
+    // Days around the selected one are already fetched when moving day by day.
+    if (day in entriesByDay) {
+        renderEntries(entriesByDay[day]);
+        return;
+    }
+
     // Clear existing rows, otherwise, rows will append/duplicate.
     document.getElementById('entryTableBody').innerHTML = '';
 
-    // 
-    fetch(`/api/entries/${date.toISOString().split('T')[0]}`)
+    // Fetch the week around the day in one request.
+    const start = new Date(date);
+    start.setDate(start.getDate() - PREFETCH_DAYS);
+    const end = new Date(date);
+    end.setDate(end.getDate() + PREFETCH_DAYS);
+
+    fetch(`/api/entries/range/?start=${formatDate(start)}&end=${formatDate(end)}`)
     .then(response => response.json())
     .then(data => {
-        // Your existing code to populate the table goes here
-        if (data.length > 0) {
-            const entryTableBody = document.getElementById('entryTableBody');
-            data.forEach(entry => {
-                const row = document.createElement('tr');
-                
-                // Create and append the checkbox cell
-                const checkboxCell = document.createElement('td');
-                checkboxCell.innerHTML = `<input type="checkbox" class="entryCheckbox" data-entry-id="${entry.id}">`;
-                row.appendChild(checkboxCell);
-
-                const nameCell = document.createElement('td');
-                nameCell.textContent = entry.task_name;
-                row.appendChild(nameCell);
-                
-                const startTimeCell = document.createElement('td');
-                startTimeCell.textContent = convertUTCToLocal(entry.start_time);
-                row.appendChild(startTimeCell);
-                
-                const endTimeCell = document.createElement('td');
-                endTimeCell.textContent = convertUTCToLocal(entry.end_time);
-                row.appendChild(endTimeCell);
-
-                const totalTimeCell = document.createElement('td');
-                totalTimeCell.textContent = entry.total_time;
-                row.appendChild(totalTimeCell);
-                
-                entryTableBody.appendChild(row);
-            });
-        } else {
-            const entryTableBody = document.getElementById('entryTableBody');
-            const row = document.createElement('tr');
-            const cell = document.createElement('td');
-            cell.textContent = 'No entries for this day';
-            cell.setAttribute('colspan', '4');  // Assuming you have 4 columns
-            row.appendChild(cell);
-            entryTableBody.appendChild(row);
-        }
+        data.days.forEach(rangeDay => {
+            entriesByDay[rangeDay.date] = rangeDay.entries;
+        });
+        renderEntries(entriesByDay[day] || []);
     })
     .catch(error => {
         console.error('Error fetching entries:', error);
     });
 }
 
+// 
+function renderEntries(entries) {
+    // Clear existing rows, otherwise, rows will append/duplicate.
+    const entryTableBody = document.getElementById('entryTableBody');
+    entryTableBody.innerHTML = '';
+
+    if (entries.length > 0) {
+        entries.forEach(entry => {
+            const row = document.createElement('tr');
+            
+            // Create and append the checkbox cell
+            const checkboxCell = document.createElement('td');
+            checkboxCell.innerHTML = `<input type="checkbox" class="entryCheckbox" data-entry-id="${entry.id}">`;
+            row.appendChild(checkboxCell);
+
+            const nameCell = document.createElement('td');
+            nameCell.textContent = entry.task_name;
+            row.appendChild(nameCell);
+            
+            const startTimeCell = document.createElement('td');
+            startTimeCell.textContent = convertUTCToLocal(entry.start_time);
+            row.appendChild(startTimeCell);
+            
+            const endTimeCell = document.createElement('td');
+            endTimeCell.textContent = convertUTCToLocal(entry.end_time);
+            row.appendChild(endTimeCell);
+
+            const totalTimeCell = document.createElement('td');
+            totalTimeCell.textContent = entry.total_time;
+            row.appendChild(totalTimeCell);
+            
+            entryTableBody.appendChild(row);
+        });
+    } else {
+        const row = document.createElement('tr');
+        const cell = document.createElement('td');
+        cell.textContent = 'No entries for this day';
+        cell.setAttribute('colspan', '4');  // Assuming you have 4 columns
+        row.appendChild(cell);
+        entryTableBody.appendChild(row);
+    }
+}
+
 // 
 function deleteTasks() {
     const selectedTasks = Array.from(document.querySelectorAll('input[type="checkbox"]:checked')).map(checkbox => checkbox.getAttribute('data-entry-id'));
@@ -80,7 +117,7 @@ function deleteTasks() {
     .then(() => {
         // Refresh the task list for the day after all deletions are complete.
         const selectedDate = document.getElementById('datePicker').value;
-        fetchEntriesForDate(new Date(selectedDate));
+        fetchEntriesForDate(new Date(selectedDate), true);
     })
     .catch(error => {
         console.error('Error deleting tasks:', error);
@@ -172,7 +209,7 @@ entryForm.addEventListener('submit', function(event) {
     .then(response => response.json())
     .then(data => {
         // Refresh the entries table
-        fetchEntriesForDate(new Date(selectedDate));
+        fetchEntriesForDate(new Date(selectedDate), true);
     })
     .catch(error => {
         console.error('Error creating entry:', error);
@@ -192,7 +229,7 @@ document.getElementById('showCreateEntryForm').addEventListener('click', functio
         taskDropdown.innerHTML = '';
 
         // Fetch tasks and populate dropdown
-        fetch('/api/tasks/')
+        fetch('/api/tasks/?fields=id,name')
         .then(response => response.json())
         .then(data => {
             data.forEach(task => {
@@ -2,20 +2,25 @@
 function fetchAndPopulateReport() {
     const startDate = document.getElementById('startDate').value;
     const endDate = document.getElementById('endDate').value;
-    const frequency = document.getElementById('frequency').value;
 
     // Fetch data from your API based on the selected parameters
     // Replace the URL with your actual API endpoint
-    fetch(`/api/report?startDate=${startDate}&endDate=${endDate}&frequency=${frequency}`)
+    fetch(`/api/report?startDate=${startDate}&endDate=${endDate}&group_by=task`)
     .then(response => response.json())
     .then(data => {
         const reportTableBody = document.getElementById('reportTable').querySelector('tbody');
         reportTableBody.innerHTML = '';  // Clear existing rows
         console.log(data);  // Add this line to inspect the data
 
-        // Loop through object keys
-        Object.keys(data).forEach(taskId => {
-            const row = data[taskId];
+        // The report is columnar: one array per column, one index per row.
+        const columns = data.columns;
+        columns.task_id.forEach((taskId, i) => {
+            const row = {
+                name: columns.task_name[i],
+                description: columns.task_description[i],
+                tags: columns.task_tags[i],
+                total_time: columns.total_time[i]
+            };
             const tableRow = document.createElement('tr');
             
             // Populate the Task column
@@ -7,7 +7,7 @@ let isTimerRunning = false;
 
 // Function to fetch tasks and populate the task list
 function fetchTasks() {
-    fetch('/api/tasks/')
+    fetch('/api/tasks/?fields=id,name,total_time_spent')
     .then(response => response.json())
     .then(data => {
         const taskList = document.getElementById('taskList');
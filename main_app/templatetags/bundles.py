@@ -0,0 +1,38 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Third-party imports: Django natives.
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+###############################################################################
+# TEMPLATE TAGS
+###############################################################################
+
+register = template.Library()
+
+@register.simple_tag
+def static_bundle(name):
+    """
+    Render the script tags of a bundle of the `STATIC_BUNDLES` setting.
+
+    With `STATIC_BUNDLES_ENABLED`, a single tag loads the minified bundle
+    built by `collectstatic` (see thintimer/storage.py); otherwise each
+    source script is loaded on its own, e.g. in development.
+
+    Parameters
+    ----------
+    name : str
+        The path of the bundle, e.g. 'js/timer.bundle.js'.
+
+    Returns
+    -------
+    SafeString
+        The script tags.
+    """
+    sources = [name] if settings.STATIC_BUNDLES_ENABLED else settings.STATIC_BUNDLES[name]
+
+    return format_html_join('\n', '<script src="{}"></script>', ((static(source),) for source in sources))
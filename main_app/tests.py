@@ -3,19 +3,51 @@
 ###############################################################################
 
 # Standard library imports.
-from datetime import timedelta
+import gzip
+import json
+import sqlite3
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
 # Third-party imports: Django natives.
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template import engines
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+
+# Third-party imports: Other.
+import brotli
+import msgpack
+import zstandard
+from openpyxl import load_workbook
+from prometheus_client import REGISTRY
 
 # Third-party imports: Django DRF.
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
 # Local imports.
-from main_app.models import Task
+from thintimer import compression, pool, querylog, routers
+from thintimer.sqlite_tuned import base as sqlite_tuned
+from user_auth.timezones import get_time_zone, set_time_zone
+from main_app import admin as main_admin, archive, benchmarks, export, importer, loadgen, partitions, reports, sharding
+from main_app.models import Entry, EntryArchive, EntryRollup, Tag, Task, UserShard
 
 ###############################################################################
 # DRF API TEST CASES
@@ -41,6 +73,102 @@ class TaskTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Task.objects.count(), 3)
 
+class RendererTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.task = Task.objects.create(name='Task', user=self.user)
+        start = timezone.make_aware(datetime(2024, 1, 31, 9, 0))
+        Entry.objects.create(task=self.task, start_time=start, end_time=start + timedelta(hours=1, minutes=30))
+
+    def test_json_matches_stdlib_renderer(self):
+        response = self.client.get(reverse('entry-list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_msgpack_negotiation(self):
+        response = self.client.get(reverse('task-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)[0]['name'], 'Task')
+
+        body = msgpack.packb({'name': 'Packed', 'description': 'Sent as MessagePack'})
+        response = self.client.post(reverse('task-list'), body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Task.objects.filter(user=self.user, name='Packed').exists())
+
+    def test_malformed_bodies_are_rejected(self):
+        for content_type in ('application/json', 'application/msgpack'):
+            response = self.client.post(reverse('task-list'), b'\xc1{', content_type=content_type)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # A map with an array as key.
+        response = self.client.post(reverse('task-list'), b'\x81\x92\x01\x02\x01', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with mock.patch('thintimer.renderers.msgpack.unpackb', side_effect=TypeError("unhashable type: 'list'")):
+            response = self.client.post(reverse('task-list'), b'\x80', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_durations_as_seconds(self):
+        response = self.client.get(reverse('entry-list'))
+        self.assertEqual(response.data[0]['total_time'], '1:30:00')
+        response = self.client.get(reverse('entry-list'), {'durations': 'seconds'})
+        self.assertEqual(response.data[0]['total_time'], 5400)
+        with override_settings(API_DURATIONS_AS_SECONDS=True):
+            response = self.client.get(reverse('task-list'))
+            self.assertEqual(response.data[0]['total_time_spent'], 5400)
+            response = self.client.get(reverse('task-list'), {'durations': 'string'})
+            self.assertEqual(response.data[0]['total_time_spent'], '01:30:00')
+
+    def test_renderer_benchmark(self):
+        results = benchmarks.benchmark_renderers(size=50, repeat=1)
+        self.assertEqual(results['render_json']['bytes'], results['render_orjson']['bytes'])
+        self.assertLess(results['render_msgpack']['bytes'], results['render_json']['bytes'])
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.addCleanup(cache.clear)
+        get_time_zone(self.user)
+        start = timezone.make_aware(datetime(2024, 1, 31, 9, 0))
+        for name in ('One', 'Two', 'Three'):
+            task = Task.objects.create(name=name, description='Long text', user=self.user)
+            task.set_tag_names('alpha')
+            Entry.objects.create(task=task, start_time=start, end_time=start + timedelta(hours=1))
+
+    def test_fields_narrow_response_and_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task-list'), {'fields': 'id,name'})
+        self.assertEqual([set(task) for task in response.data], [{'id', 'name'}] * 3)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('description', queries[0]['sql'])
+
+        response = self.client.get(reverse('task-list'), {'omit': 'description,tags'})
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'total_time_spent', 'user', 'created_at', 'updated_at'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('task-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_lists_join_their_relations(self):
+        # One query for the tasks with their users, one for their tags.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.data[0]['user'], 'testuser')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('entry-list'), {'fields': 'id,task_name,total_time'})
+        self.assertEqual(set(response.data[0]), {'id', 'task_name', 'total_time'})
+        self.assertEqual(response.data[0]['total_time'], '1:00:00')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('entry-get-entries-for-range'), {'start': '2024-01-31', 'end': '2024-01-31', 'fields': 'id', 'totals': 'true'})
+        self.assertEqual(response.data['days'][0]['total_time'], 3 * 3600)
+
+    def test_writes_ignore_field_selection(self):
+        response = self.client.post(
+            reverse('task-list') + '?fields=id', {'name': 'New', 'description': 'Kept'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['description'], 'Kept')
+
 class TaskUpdateTestCase(APITestCase):
     def setUp(self):
         # Create a user
@@ -52,9 +180,9 @@ class TaskUpdateTestCase(APITestCase):
             name='Test Task',
             description='This is a test task',
             total_time_spent=timedelta(hours=0, minutes=0, seconds=0),
-            tags='test, sample',
             user=self.user
         )
+        self.task.set_tag_names('test, sample')
 
     def test_successful_task_update(self):
         url = reverse('task-detail', kwargs={'pk': self.task.id})
@@ -62,8 +190,1011 @@ class TaskUpdateTestCase(APITestCase):
         response = self.client.patch(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_tags_update(self):
+        url = reverse('task-detail', kwargs={'pk': self.task.id})
+        response = self.client.patch(url, {'tags': 'sample, new '}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['tags'], ['new', 'sample'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_long_tag_is_rejected(self):
+        url = reverse('task-detail', kwargs={'pk': self.task.id})
+        response = self.client.patch(url, {'tags': ['x' * 65]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', response.data)
+
+    def test_filter_by_tag(self):
+        Task.objects.create(name='Untagged', user=self.user)
+        response = self.client.get(reverse('task-list'), {'tag': 'sample'})
+        self.assertEqual([task['name'] for task in response.data], ['Test Task'])
+
     def test_unsuccessful_task_update(self):
         url = reverse('task-detail', kwargs={'pk': self.task.id})
         data = {'name': ''}  # Name should not be empty
         response = self.client.patch(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ReportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='otheruser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.task = Task.objects.create(name='Mine', user=self.user)
+        other_task = Task.objects.create(name='Theirs', user=self.other)
+        start = timezone.make_aware(datetime(2024, 1, 31, 22, 0))
+        Entry.objects.create(task=self.task, start_time=start, end_time=start + timedelta(hours=1))
+        Entry.objects.create(task=other_task, start_time=start, end_time=start + timedelta(hours=1))
+
+    def test_report_includes_last_day_and_only_own_tasks(self):
+        response = self.client.get(reverse('generate_report'), {'startDate': '2024-01-01', 'endDate': '2024-01-31'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['columns']['task_id'], [self.task.id])
+        self.assertEqual(response.data['columns']['total_time'], [3600])
+
+    def test_report_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('generate_report'), {'startDate': '2024-01-01', 'endDate': '2024-01-02'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_report_by_tag(self):
+        self.task.set_tag_names('alpha, beta')
+        response = self.client.get(reverse('generate_report'), {'startDate': '2024-01-01', 'endDate': '2024-01-31', 'group_by': 'day,tag'})
+        self.assertEqual(response.data['columns']['day'], ['2024-01-31', '2024-01-31'])
+        self.assertEqual(response.data['columns']['tag'], ['alpha', 'beta'])
+        self.assertEqual(response.data['columns']['total_time'], [3600, 3600])
+
+    def test_report_by_task_and_month_with_archive(self):
+        start = timezone.make_aware(datetime(2024, 2, 1, 8, 0))
+        Entry.objects.create(task=self.task, start_time=start, end_time=start + timedelta(hours=2))
+        archive.archive_entries(timezone.make_aware(datetime(2024, 2, 1)))
+        response = self.client.get(reverse('generate_report'), {'startDate': '2024-01-01', 'endDate': '2024-02-29', 'group_by': 'task,month'})
+        columns = response.data['columns']
+        self.assertEqual(columns['month'], ['2024-01-01', '2024-02-01'])
+        self.assertEqual(columns['total_time'], [3600, 7200])
+        self.assertEqual(columns['entry_count'], [1, 1])
+
+    def test_report_and_day_use_user_time_zone(self):
+        # 2024-01-31 22:00 UTC is already February 1st in Tokyo.
+        set_time_zone(self.user, 'Asia/Tokyo')
+        self.addCleanup(cache.clear)
+        response = self.client.get(reverse('generate_report'), {'startDate': '2024-02-01', 'endDate': '2024-02-01', 'group_by': 'day'})
+        self.assertEqual(response.data['columns']['day'], ['2024-02-01'])
+        self.assertEqual(response.data['columns']['total_time'], [3600])
+        response = self.client.get(reverse('entry-get-entries-for-date', kwargs={'date': '2024-01-31'}))
+        self.assertEqual(response.data, [])
+        response = self.client.get(reverse('entry-get-entries-for-date', kwargs={'date': '2024-02-01'}))
+        self.assertEqual(len(response.data), 1)
+
+    def test_report_rejects_unknown_grouping(self):
+        response = self.client.get(reverse('generate_report'), {'startDate': '2024-01-01', 'endDate': '2024-01-31', 'group_by': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_xlsx_report_spans_years(self):
+        start = timezone.make_aware(datetime(2023, 12, 20, 8, 0))
+        Entry.objects.create(task=self.task, start_time=start, end_time=start + timedelta(hours=2))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('generate_xlsx_report'), {'startDate': '2023-11-01', 'endDate': '2024-02-15', 'frequency': 'monthly'})
+        rows = list(load_workbook(BytesIO(response.content)).active.values)
+        self.assertEqual(rows[0][3:], ('2023-11', '2023-12', '2024-01', '2024-02'))
+        self.assertEqual(rows[1][3:], (0, 2, 1, 0))
+
+    def test_entries_for_date(self):
+        response = self.client.get('/api/entries/2024-01-31/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    def test_entries_for_range(self):
+        start = timezone.make_aware(datetime(2024, 2, 2, 9, 0))
+        Entry.objects.create(task=self.task, start_time=start, end_time=start + timedelta(minutes=30))
+        self.addCleanup(cache.clear)
+        get_time_zone(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('entry-get-entries-for-range'), {'start': '2024-01-31', 'end': '2024-02-02', 'totals': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        days = response.data['days']
+        self.assertEqual([day['date'] for day in days], ['2024-01-31', '2024-02-01', '2024-02-02'])
+        self.assertEqual([len(day['entries']) for day in days], [1, 0, 1])
+        self.assertEqual(days[0]['entries'][0]['task_name'], 'Mine')
+        self.assertEqual([day['total_time'] for day in days], [3600, 0, 1800])
+
+        # Days are those of the user's time zone.
+        set_time_zone(self.user, 'Asia/Tokyo')
+        response = self.client.get(reverse('entry-get-entries-for-range'), {'start': '2024-01-31', 'end': '2024-02-01'})
+        self.assertEqual([len(day['entries']) for day in response.data['days']], [0, 1])
+        self.assertNotIn('total_time', response.data['days'][0])
+
+    def test_entries_for_range_rejects_bad_ranges(self):
+        for params in ({}, {'start': '2024-02-01', 'end': '2024-01-01'}, {'start': '2020-01-01', 'end': '2024-01-01'}):
+            response = self.client.get(reverse('entry-get-entries-for-range'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ImportTests(APITestCase):
+    CSV = (
+        'task,start_time,end_time,description,tags\r\n'
+        'Writing,2023-01-02T09:00:00,2023-01-02T10:30:00,Long form,"docs, drafts"\r\n'
+        'Writing,2023-01-03T09:00:00+01:00,2023-01-03T09:30:00+01:00,,\r\n'
+        'Existing,2023-01-04T09:00:00Z,2023-01-04T09:15:00Z,,\r\n'
+        ',2023-01-05T09:00:00,2023-01-05T10:00:00,,\r\n'
+        'Writing,2023-01-06T10:00:00,2023-01-06T09:00:00,,\r\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.existing = Task.objects.create(user=self.user, name='Existing')
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, content, name='history.csv'):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(reverse('entry-import-entries'), {'file': upload}, format='multipart')
+
+    def test_csv_import(self):
+        response = self.upload(self.CSV)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['imported'], 3)
+        self.assertEqual(response.data['tasks_created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5])
+
+        writing = Task.objects.get(user=self.user, name='Writing')
+        self.assertEqual(writing.description, 'Long form')
+        self.assertEqual(sorted(writing.tags.values_list('name', flat=True)), ['docs', 'drafts'])
+        self.assertEqual(writing.total_time_spent, timedelta(hours=2))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.total_time_spent, timedelta(minutes=15))
+
+        # Importing again skips the rows already imported.
+        response = self.upload(self.CSV)
+        self.assertEqual((response.data['imported'], response.data['skipped']), (0, 3))
+        self.assertEqual(Entry.objects.filter(task__user=self.user).count(), 3)
+
+    def test_long_tag_is_reported(self):
+        rows = [{'task': 'Tagged', 'start_time': '2023-02-01T08:00:00Z', 'end_time': '2023-02-01T09:00:00Z', 'tags': ['x' * 65]}]
+        response = self.upload(json.dumps(rows), name='history.json')
+        self.assertEqual(response.data['imported'], 0)
+        self.assertEqual(response.data['errors'][0]['error'], 'tag name is too long')
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+
+    def test_unknown_format_and_malformed_json(self):
+        self.assertEqual(self.upload('x', name='history.txt').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.upload('[{"task": "A"', name='history.json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command_imports_ndjson(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'history.ndjson'
+        path.write_text(
+            '{"task": "Reading", "start_time": "2023-02-01T08:00:00Z", "end_time": "2023-02-01T09:00:00Z"}\n\n'
+            '{"task": "Reading", "start_time": "2023-02-02T08:00:00Z", "end_time": "2023-02-02T08:30:00Z"}\n'
+        )
+        call_command('import_entries', str(path), user='testuser', chunk_size=1, stdout=StringIO())
+        self.assertEqual(Task.objects.get(name='Reading').total_time_spent, timedelta(minutes=90))
+
+class EntryValidationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.task = Task.objects.create(user=self.user, name='Task')
+        self.other_task = Task.objects.create(user=self.user, name='Other task')
+        self.start = datetime(2023, 3, 1, 9, tzinfo=dt_timezone.utc)
+        self.entry = Entry.objects.create(task=self.task, start_time=self.start, end_time=self.start + timedelta(hours=2))
+        self.client.force_authenticate(user=self.user)
+
+    def post(self, task, start, end):
+        data = {'task': task.id, 'start_time': (self.start + start).isoformat(), 'end_time': (self.start + end).isoformat()}
+        return self.client.post(reverse('entry-list'), data, format='json')
+
+    def test_negative_duration_is_rejected(self):
+        response = self.post(self.task, timedelta(hours=5), timedelta(hours=4))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('end_time', response.data)
+        response = self.client.patch(
+            reverse('entry-detail', kwargs={'pk': self.entry.pk}), {'end_time': (self.start - timedelta(hours=1)).isoformat()}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_overlaps_allowed_by_default(self):
+        self.assertEqual(self.post(self.other_task, timedelta(hours=1), timedelta(hours=3)).status_code, status.HTTP_201_CREATED)
+
+    @override_settings(ENTRY_PREVENT_OVERLAPS=True)
+    def test_overlaps_rejected_for_same_user(self):
+        for start, end in [(timedelta(hours=1), timedelta(hours=3)), (-timedelta(hours=1), timedelta(hours=1)), (timedelta(minutes=30), timedelta(hours=1))]:
+            response = self.post(self.other_task, start, end)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (start, end))
+        # Adjacent and empty entries do not overlap, nor do other users' entries.
+        self.assertEqual(self.post(self.other_task, timedelta(hours=2), timedelta(hours=3)).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.post(self.task, timedelta(hours=1), timedelta(hours=1)).status_code, status.HTTP_201_CREATED)
+        other = Task.objects.create(user=User.objects.create_user(username='other'), name='Task')
+        Entry.objects.create(task=other, start_time=self.start + timedelta(hours=4), end_time=self.start + timedelta(hours=6))
+        self.assertEqual(self.post(self.task, timedelta(hours=4), timedelta(hours=5)).status_code, status.HTTP_201_CREATED)
+        # An entry may be updated without overlapping itself.
+        response = self.client.patch(
+            reverse('entry-detail', kwargs={'pk': self.entry.pk}), {'end_time': (self.start + timedelta(hours=1)).isoformat()}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(ENTRY_PREVENT_OVERLAPS=True)
+    def test_import_rejects_overlaps(self):
+        rows = [
+            {'task': 'Imported', 'start_time': (self.start + start).isoformat(), 'end_time': (self.start + end).isoformat()}
+            for start, end in [
+                (timedelta(hours=1), timedelta(hours=3)),  # Overlaps the stored entry.
+                (timedelta(hours=3), timedelta(hours=4)),
+                (timedelta(hours=3, minutes=30), timedelta(hours=5)),  # Overlaps the previous row.
+                (timedelta(hours=5), timedelta(hours=5)),
+            ]
+        ]
+        summary = importer.import_entries(self.user, rows)
+        self.assertEqual((summary['imported'], summary['invalid']), (2, 2))
+        self.assertEqual([error['row'] for error in summary['errors']], [1, 3])
+
+    def test_only_entry_constraints_are_validation_errors(self):
+        create = 'rest_framework.serializers.ModelSerializer.create'
+        with mock.patch(create, side_effect=IntegrityError('CHECK constraint failed: entry_end_after_start')):
+            self.assertEqual(self.post(self.task, timedelta(hours=3), timedelta(hours=4)).status_code, status.HTTP_400_BAD_REQUEST)
+        with mock.patch(create, side_effect=IntegrityError('FOREIGN KEY constraint failed')), self.assertRaises(IntegrityError):
+            self.post(self.task, timedelta(hours=3), timedelta(hours=4))
+
+    def test_check_constraint(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Entry.objects.bulk_create([Entry(task=self.task, start_time=self.start, end_time=self.start - timedelta(seconds=1))])
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.task = Task.objects.create(user=self.user, name='Task, "quoted"')
+        self.task.set_tag_names('b, a')
+        start = datetime(2020, 1, 6, 9, tzinfo=dt_timezone.utc)
+        for day in range(3):
+            Entry.objects.create(task=self.task, start_time=start + timedelta(days=day), end_time=start + timedelta(days=day, hours=1))
+        archive.archive_entries(start + timedelta(days=1))
+        other = User.objects.create_user(username='other', password='password')
+        Task.objects.create(user=other, name='Other')
+        self.client.force_authenticate(user=self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_account'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_ndjson_export(self):
+        with self.export() as archive_file:
+            tasks = [json.loads(line) for line in archive_file.read('tasks.ndjson').splitlines()]
+            entries = [json.loads(line) for line in archive_file.read('entries.ndjson').splitlines()]
+        self.assertEqual([(task['name'], task['tags'], task['total_time_spent']) for task in tasks], [(self.task.name, ['a', 'b'], 10800.0)])
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(sum(entry['archived'] for entry in entries), 1)
+        self.assertEqual({entry['task'] for entry in entries}, {self.task.name})
+
+    def test_csv_export_can_be_imported(self):
+        with self.export(file_format='csv') as archive_file:
+            entries = archive_file.read('entries.csv')
+        other = User.objects.create_user(username='importer', password='password')
+        summary = importer.import_entries(other, importer.parse_rows(BytesIO(entries), 'csv'))
+        self.assertEqual((summary['imported'], summary['invalid']), (3, 0))
+        self.assertEqual(Task.objects.get(user=other).name, self.task.name)
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('export_account'), {'file_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rows_are_read_in_keyset_batches(self):
+        for index in range(4):
+            Task.objects.create(user=self.user, name=f'Task {index}')
+        tasks = Task.objects.filter(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            ids = [task.id for task in export._batches(tasks, size=2)]
+        self.assertEqual(ids, sorted(tasks.values_list('id', flat=True)))
+        # Five tasks: two full batches and a partial one.
+        self.assertEqual(len(queries), 3)
+        values = list(export._batches(tasks.values_list('id', 'name'), size=3))
+        self.assertEqual(values, list(tasks.order_by('id').values_list('id', 'name')))
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        task = Task.objects.create(user=self.user, name='Task')
+        start = timezone.make_aware(datetime(2024, 1, 1, 9, 0))
+        for day in range(20):
+            Entry.objects.create(task=task, start_time=start + timedelta(days=day), end_time=start + timedelta(days=day, hours=1))
+
+    def test_negotiation(self):
+        self.assertEqual(compression.negotiate('gzip, br', compression.ENCODINGS), 'br')
+        self.assertEqual(compression.negotiate('br;q=0, zstd;q=0.5, gzip', compression.ENCODINGS), 'zstd')
+        self.assertEqual(compression.negotiate('*', ['gzip']), 'gzip')
+        self.assertIsNone(compression.negotiate('identity', compression.ENCODINGS))
+
+    DECOMPRESS = {
+        'br': brotli.decompress,
+        'zstd': lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+        'gzip': gzip.decompress,
+    }
+
+    def test_large_responses_are_compressed(self):
+        plain = self.client.get(reverse('entry-list')).content
+        for encoding, function in self.DECOMPRESS.items():
+            response = self.client.get(reverse('entry-list'), HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertLess(len(response.content), len(plain))
+            self.assertEqual(function(response.content), plain)
+
+    def test_small_and_compressed_responses_are_not_compressed(self):
+        response = self.client.get(reverse('task-list'), HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        with override_settings(COMPRESSION_MIN_SIZE=0):
+            response = self.client.get(reverse('export_account'), HTTP_ACCEPT_ENCODING='br')
+            self.assertFalse(response.has_header('Content-Encoding'))
+            response = self.client.get(
+                reverse('generate_xlsx_report'), {'startDate': '2024-01-01', 'endDate': '2024-01-31', 'frequency': 'daily'},
+                HTTP_ACCEPT_ENCODING='br',
+            )
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=0, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_pages_with_csrf_token_are_not_compressed(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('settings'), HTTP_ACCEPT_ENCODING='br')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streams_are_compressed_chunk_by_chunk(self):
+        chunks = [f'{index},'.encode() * 100 for index in range(5)]
+        for encoding in compression.ENCODINGS:
+            compressed = list(compression.compress_stream(iter(chunks), encoding))
+            # One flushed block per chunk, then the end of the stream.
+            self.assertEqual(len(compressed), len(chunks) + 1)
+            self.assertEqual(self.DECOMPRESS[encoding](b''.join(compressed)), b''.join(chunks))
+
+@override_settings(DATABASE_REPLICAS=['default'], MIDDLEWARE=settings.MIDDLEWARE + ['thintimer.routers.ReplicaPinningMiddleware'])
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        self.task = Task.objects.create(user=self.user, name='Task')
+        self.router = routers.ReplicaRouter()
+
+    def replica_reads(self, method, *args, **kwargs):
+        # The only replica is the test database itself: count the choices.
+        with mock.patch('thintimer.routers.random.choice', side_effect=lambda replicas: replicas[0]) as choice:
+            response = method(*args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return choice.call_count
+
+    def test_router(self):
+        self.assertIsNone(self.router.db_for_read(Task))
+        with routers.replica_reads(mock.Mock(COOKIES={})):
+            self.assertEqual(self.router.db_for_read(Task), 'default')
+            self.assertIsNone(self.router.db_for_read(User))
+            with override_settings(DATABASE_REPLICAS=['replica0']):
+                self.assertEqual(self.router.db_for_read(Entry), 'replica0')
+                self.assertFalse(self.router.allow_migrate('replica0', 'main_app'))
+                self.assertIsNone(self.router.allow_migrate('default', 'main_app'))
+        self.assertIsNone(self.router.db_for_write(Task))
+        read = Task(pk=self.task.pk)
+        read._state.db = 'replica0'
+        with override_settings(DATABASE_REPLICAS=['replica0']):
+            self.assertEqual(self.router.db_for_write(Task, instance=read), 'default')
+
+    def test_reports_and_lists_read_from_replicas(self):
+        params = {'startDate': '2024-01-01', 'endDate': '2024-01-31'}
+        self.assertGreater(self.replica_reads(self.client.get, reverse('generate_report'), params), 0)
+        self.assertGreater(self.replica_reads(self.client.get, reverse('entry-list')), 0)
+        self.assertGreater(self.replica_reads(self.client.get, reverse('task-list')), 0)
+        self.assertGreater(
+            self.replica_reads(self.client.get, reverse('entry-get-entries-for-range'), {'start': '2024-01-01', 'end': '2024-01-07'}), 0,
+        )
+        self.assertEqual(self.replica_reads(self.client.get, reverse('task-detail', args=[self.task.id])), 0)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        start = timezone.make_aware(datetime(2024, 1, 1, 9, 0))
+        response = self.client.post(reverse('entry-list'), {
+            'task': self.task.id, 'start_time': start.isoformat(), 'end_time': (start + timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE_NAME]['max-age'], settings.REPLICA_STICKY_SECONDS)
+        self.assertEqual(self.replica_reads(self.client.get, reverse('entry-list')), 0)
+
+        del self.client.cookies[routers.PIN_COOKIE_NAME]
+        self.assertGreater(self.replica_reads(self.client.get, reverse('entry-list')), 0)
+
+@override_settings(DATABASE_SHARDS=['default', 'shard1'])
+class ShardRouterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        UserShard.objects.filter(user=self.user).update(database='shard1')
+        self.router = routers.ShardRouter()
+
+    def in_request(self, function):
+        # Call a function while the middleware serves a request of the user.
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return routers.ShardMiddleware(lambda request: HttpResponse(function()))(request).content.decode()
+
+    def test_new_users_are_placed_round_robin(self):
+        for index in range(4):
+            user = User.objects.create_user(username=f'user{index}')
+            self.assertEqual(sharding.shard_of(user.pk), (['default', 'shard1'][user.pk % 2], False))
+        with override_settings(DATABASE_SHARDS=['default']):
+            user = User.objects.create_user(username='unsharded')
+            self.assertFalse(UserShard.objects.filter(user=user).exists())
+            self.assertIsNone(self.router.db_for_write(Task, instance=user))
+
+    def test_routing(self):
+        task = Task(user_id=self.user.pk)
+        task._state.db = 'shard1'
+        self.assertEqual(self.router.db_for_write(Task, instance=self.user), 'shard1')
+        self.assertEqual(self.router.db_for_read(Entry, instance=task), 'shard1')
+        self.assertEqual(self.router.db_for_read(User, instance=task), 'default')
+        self.assertIsNone(self.router.db_for_read(UserShard, instance=self.user))
+        self.assertIsNone(self.router.db_for_read(Task))
+        self.assertEqual(self.in_request(lambda: self.router.db_for_read(Task)), 'shard1')
+
+    def test_writes_are_refused_while_moving(self):
+        UserShard.objects.filter(user=self.user).update(moving=True)
+        with self.assertRaises(routers.ShardMoving):
+            self.in_request(lambda: self.router.db_for_write(Entry))
+        self.assertEqual(self.in_request(lambda: self.router.db_for_read(Entry)), 'shard1')
+
+# Needs a second database, e.g.:
+# DATABASE_SHARD_URLS=sqlite:////tmp/shard1.db python manage.py test main_app.tests.ShardingTests
+@skipUnless('shard1' in settings.DATABASES, "Set DATABASE_SHARD_URLS to test sharding.")
+class ShardingTests(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        UserShard.objects.update_or_create(user=self.user, defaults={'database': 'shard1'})
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('task-list'), {'name': 'Work', 'tags': ['alpha']}, format='json')
+        self.task_id = response.data['id']
+        start = timezone.make_aware(datetime(2024, 1, 1, 9, 0))
+        for hour in range(3):
+            self.client.post(reverse('entry-list'), {
+                'task': self.task_id,
+                'start_time': (start + timedelta(hours=hour)).isoformat(),
+                'end_time': (start + timedelta(hours=hour, minutes=30)).isoformat(),
+            })
+
+    def counts(self, database):
+        return (
+            Task.objects.using(database).filter(user=self.user).count(),
+            Entry.objects.using(database).filter(task__user=self.user).count(),
+            Tag.objects.using(database).filter(user=self.user).count(),
+        )
+
+    def test_requests_use_the_users_shard(self):
+        self.assertEqual(self.counts('shard1'), (1, 3, 1))
+        self.assertEqual(self.counts('default'), (0, 0, 0))
+        self.assertGreaterEqual(self.task_id, sharding.SHARD_ID_SPAN)
+
+        response = self.client.get(reverse('task-list'))
+        self.assertEqual([(task['name'], task['user'], task['tags']) for task in response.data], [('Work', 'testuser', ['alpha'])])
+        self.assertEqual(len(self.client.get(reverse('entry-list')).data), 3)
+        response = self.client.get(reverse('export_account'))
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.read('entries.ndjson').splitlines()), 3)
+
+    def test_rebalance_moves_rows_in_batches(self):
+        call_command('rebalance_shards', user=['testuser'], to='default', batch_size=2, stdout=StringIO())
+        self.assertEqual(sharding.shard_of(self.user.pk), ('default', False))
+        self.assertEqual(self.counts('default'), (1, 3, 1))
+        self.assertEqual(self.counts('shard1'), (0, 0, 0))
+
+        # Rows keep their ids.
+        response = self.client.get(reverse('task-detail', args=[self.task_id]))
+        self.assertEqual(response.data['total_time_spent'], '01:30:00')
+
+        UserShard.objects.filter(user=self.user).update(moving=True)
+        response = self.client.post(reverse('task-list'), {'name': 'Other'})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_deleting_a_user_deletes_their_data(self):
+        self.user.delete()
+        self.assertEqual(Task.objects.using('shard1').count(), 0)
+        self.assertEqual(Entry.objects.using('shard1').count(), 0)
+
+    def test_user_constraints_are_dropped_on_shards_only(self):
+        def user_foreign_keys(database, table):
+            with connections[database].cursor() as cursor:
+                constraints = connections[database].introspection.get_constraints(cursor, table)
+            return [name for name, constraint in constraints.items() if constraint['foreign_key'] and constraint['columns'] == ['user_id']]
+
+        for table in (Task._meta.db_table, Tag._meta.db_table):
+            self.assertTrue(user_foreign_keys('default', table))
+            self.assertFalse(user_foreign_keys('shard1', table))
+
+    def test_import_command_uses_the_users_shard(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'history.ndjson'
+        path.write_text(
+            '{"task": "Work", "start_time": "2024-01-01T09:00:00Z", "end_time": "2024-01-01T09:15:00Z"}\n'
+            '{"task": "Reading", "start_time": "2023-02-01T08:00:00Z", "end_time": "2023-02-01T09:00:00Z", "tags": "beta"}\n'
+        )
+        call_command('import_entries', str(path), user='testuser', stdout=StringIO())
+        self.assertEqual(self.counts('shard1'), (2, 4, 2))
+        self.assertEqual(self.counts('default'), (0, 0, 0))
+        self.assertEqual(Task.objects.using('shard1').get(name='Reading').total_time_spent, timedelta(hours=1))
+
+        UserShard.objects.filter(user=self.user).update(moving=True)
+        with self.assertRaises(CommandError):
+            call_command('import_entries', str(path), user='testuser', stdout=StringIO())
+
+    def test_archive_command_uses_every_shard(self):
+        call_command('archive_entries', older_than=0, stdout=StringIO())
+        self.assertEqual(Entry.objects.using('shard1').count(), 0)
+        self.assertEqual(EntryArchive.objects.using('shard1').count(), 1)
+        self.assertEqual(EntryRollup.objects.using('shard1').get().total_time, timedelta(minutes=90))
+
+        call_command('archive_entries', restore=True, user='testuser', stdout=StringIO())
+        self.assertEqual(self.counts('shard1'), (1, 3, 1))
+        self.assertEqual(EntryArchive.objects.using('shard1').count(), 0)
+
+class ConnectionPoolTests(TestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.opened.append(connection)
+        return connection
+
+    def usable(self, connection):
+        try:
+            connection.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    def sample(self, state):
+        return REGISTRY.get_sample_value('thintimer_db_pool_connections', {'database': 'test', 'state': state})
+
+    def test_connections_are_bounded_and_reused(self):
+        connections_pool = pool.ConnectionPool(self.connect, max_size=2, timeout=0.01, name='test')
+        first, second = connections_pool.getconn(), connections_pool.getconn()
+        self.assertEqual((self.sample('used'), self.sample('idle')), (2, 0))
+        with self.assertRaises(pool.PoolTimeout):
+            connections_pool.getconn()
+
+        connections_pool.putconn(first)
+        self.assertEqual((self.sample('used'), self.sample('idle')), (1, 1))
+        self.assertIs(connections_pool.getconn(), first)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_broken_and_idle_connections_are_replaced(self):
+        connections_pool = pool.ConnectionPool(self.connect, max_size=2, check=self.usable, max_idle=60, name='test')
+        connection = connections_pool.getconn()
+        connection.close()
+        connections_pool.putconn(connection)
+        replacement = connections_pool.getconn()
+        self.assertIsNot(replacement, connection)
+
+        # Returned an hour ago.
+        with mock.patch('thintimer.pool.time.monotonic', return_value=time.monotonic() - 3600):
+            connections_pool.putconn(replacement)
+        self.assertIsNot(connections_pool.getconn(), replacement)
+        self.assertEqual(len(self.opened), 3)
+
+    def test_returned_connections_are_reset(self):
+        connections_pool = pool.ConnectionPool(self.connect, max_size=1, reset=lambda connection: connection.rollback(), name='test')
+        connection = connections_pool.getconn()
+        connection.execute('CREATE TABLE item (id INTEGER)')
+        connection.execute('INSERT INTO item VALUES (1)')
+        connections_pool.putconn(connection)
+        self.assertEqual(connections_pool.getconn().execute('SELECT COUNT(*) FROM item').fetchone(), (0,))
+
+class SQLiteTuningTests(TestCase):
+    def test_connections_are_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / 'db.sqlite3')
+            tuned = sqlite_tuned.DatabaseWrapper(
+                {**connection.settings_dict, 'NAME': path, 'PRAGMAS': settings.SQLITE_PRAGMAS}, alias='tuned',
+            )
+            with tuned.cursor() as cursor:
+                for pragma, expected in (('journal_mode', 'wal'), ('synchronous', 1), ('busy_timeout', settings.SQLITE_BUSY_TIMEOUT)):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+            # Transactions hold the write lock from their start.
+            tuned._start_transaction_under_autocommit()
+            other = sqlite3.connect(path, timeout=0)
+            try:
+                with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                    other.execute('BEGIN IMMEDIATE')
+            finally:
+                other.close()
+                tuned.close()
+
+    def test_write_benchmark(self):
+        results = benchmarks.benchmark_sqlite_writes(threads=2, entries=3)
+        self.assertEqual(results['default']['journal_mode'], 'delete')
+        self.assertEqual(results['tuned']['journal_mode'], 'wal')
+        for metrics in results.values():
+            self.assertEqual(metrics['created'] + metrics['locked'], 6)
+
+class LoadGeneratorTests(TestCase):
+    def test_generation_is_deterministic(self):
+        loadgen.generate(users=2, tasks=3, entries=10, seed=1, prefix='a')
+        loadgen.generate(users=2, tasks=3, entries=10, seed=1, prefix='b')
+        durations = [
+            sorted((entry.start_time, entry.total_time()) for entry in Entry.objects.filter(task__user__username__startswith=prefix))
+            for prefix in ('a', 'b')
+        ]
+        self.assertEqual(durations[0], durations[1])
+        self.assertTrue(Tag.objects.exists())
+
+    def test_task_totals_are_rebuilt(self):
+        loadgen.generate(users=1, tasks=2, entries=10)
+        for task in Task.objects.all():
+            expected = sum((entry.total_time() for entry in task.entry_set.all()), timedelta(0))
+            self.assertEqual(task.total_time_spent, expected)
+
+class QueryCountRegressionTests(TransactionTestCase):
+    def test_every_url_is_benchmarked(self):
+        user = benchmarks.seed_data(users=1, tasks=1, entries=5)
+        covered = set(benchmarks.benchmark_cases(user)) | set(benchmarks.EXCLUDED_URLS)
+        self.assertEqual(benchmarks.url_names() - covered, set())
+
+    def test_partial_baseline_update_is_refused(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', update_baseline=True, endpoint=['task-list'], stdout=StringIO())
+
+    def test_query_counts_within_baseline(self):
+        user = benchmarks.seed_data(users=3, tasks=2, entries=6)
+        results = benchmarks.run_benchmarks(user, repeat=0, measure_memory=False)
+        regressions = benchmarks.compare(results, benchmarks.load_baseline(), metrics=('queries',))
+        self.assertEqual(regressions, [])
+        self.assertEqual(results['metrics']['status'], status.HTTP_200_OK)
+
+@override_settings(
+    MIDDLEWARE=['thintimer.profiling.ProfilingMiddleware', *settings.MIDDLEWARE], PROFILING_SAMPLE_RATE=0.0,
+    PROFILING_TOKEN='secret',
+)
+class ProfilingMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff', password='password', is_staff=True)
+        task = Task.objects.create(user=self.user, name='Task')
+        start = timezone.now() - timedelta(hours=2)
+        for hours in (0, 1):
+            Entry.objects.create(task=task, start_time=start + timedelta(hours=hours), end_time=start + timedelta(hours=hours, minutes=30))
+        self.client.force_login(self.user)
+
+    def test_unsampled_requests_are_not_profiled(self):
+        response = self.client.get(reverse('entry-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_header_profiles_request(self):
+        with self.assertLogs('thintimer.profiling') as logs:
+            response = self.client.get(reverse('entry-list'), HTTP_X_PROFILE='1', HTTP_X_PROFILE_TOKEN='secret')
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual(summary['view'], 'entry-list')
+        self.assertGreater(summary['queries'], 0)
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn(f'desc="{summary["queries"]} queries"', response['Server-Timing'])
+
+    def test_cprofile_output_is_logged(self):
+        with self.assertLogs('thintimer.profiling') as logs:
+            self.client.get(reverse('task-list'), HTTP_X_PROFILE='cprofile', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertIn('cumulative', json.loads(logs.records[0].getMessage())['profile'])
+
+    def test_header_requires_token(self):
+        for token in ({}, {'HTTP_X_PROFILE_TOKEN': 'wrong'}):
+            with mock.patch('thintimer.profiling.logger') as logger:
+                response = self.client.get(reverse('task-list'), HTTP_X_PROFILE='cprofile', **token)
+            logger.info.assert_not_called()
+            self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_hidden_from_non_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        with self.assertLogs('thintimer.profiling'):
+            response = self.client.get(reverse('task-list'), HTTP_X_PROFILE='1', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertNotIn('Server-Timing', response)
+
+@override_settings(METRICS_ENABLED=True, MIDDLEWARE=['thintimer.metrics.MetricsMiddleware', *settings.MIDDLEWARE])
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.task = Task.objects.create(user=self.user, name='Task')
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_and_queries_are_counted(self):
+        self.client.force_login(self.user)
+        before = self.sample('thintimer_requests_total', view='task-list', method='GET', status='200')
+        queries = self.sample('thintimer_db_queries_total', view='task-list')
+        self.client.get(reverse('task-list'))
+        self.assertEqual(self.sample('thintimer_requests_total', view='task-list', method='GET', status='200'), before + 1)
+        self.assertGreater(self.sample('thintimer_db_queries_total', view='task-list'), queries)
+
+    def test_report_rows_and_bytes(self):
+        self.client.force_login(self.user)
+        now = timezone.now()
+        Entry.objects.create(task=self.task, start_time=now - timedelta(hours=1), end_time=now)
+        rows, size = self.sample('thintimer_report_rows_total', format='json'), self.sample('thintimer_report_bytes_total', format='json')
+        today = timezone.localdate().isoformat()
+        response = self.client.get(reverse('generate_report'), {'startDate': today, 'endDate': today})
+        self.assertEqual(self.sample('thintimer_report_rows_total', format='json'), rows + 1)
+        self.assertEqual(self.sample('thintimer_report_bytes_total', format='json'), size + len(response.content))
+
+    def test_login_attempts(self):
+        failures = self.sample('thintimer_login_attempts_total', result='failure')
+        self.client.post(reverse('user_login'), {'username': 'staff', 'password': 'wrong'})
+        self.assertEqual(self.sample('thintimer_login_attempts_total', result='failure'), failures + 1)
+
+    def test_cache_hits_and_misses(self):
+        misses = self.sample('thintimer_cache_requests_total', result='miss')
+        hits = self.sample('thintimer_cache_requests_total', result='hit')
+        self.assertIsNone(cache.get('metrics-test'))
+        cache.set('metrics-test', 1)
+        self.assertEqual(cache.get('metrics-test'), 1)
+        self.assertEqual(self.sample('thintimer_cache_requests_total', result='miss'), misses + 1)
+        self.assertEqual(self.sample('thintimer_cache_requests_total', result='hit'), hits + 1)
+
+    def test_metrics_endpoint(self):
+        start = timezone.now() - timedelta(minutes=5)
+        Entry.objects.create(task=self.task, start_time=start, end_time=start)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'thintimer_active_timers 1.0', response.content)
+        self.assertIn(b'thintimer_request_duration_seconds_bucket', response.content)
+
+# A threshold of 0 logs every query once the middleware is installed.
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0.0, MIDDLEWARE=[*settings.MIDDLEWARE, 'thintimer.querylog.SlowQueryMiddleware'])
+class SlowQueryLogTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client.force_login(self.user)
+
+    def test_slow_queries_are_logged_with_view(self):
+        date = timezone.localdate().isoformat()
+        with self.assertLogs('thintimer.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('entry-get-entries-for-date', kwargs={'date': date}))
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertIn('entry-get-entries-for-date', {record['view'] for record in records})
+        self.assertIn('main_app.views.EntryViewSet', {record['function'] for record in records})
+        self.assertTrue(all('explain' not in record for record in records))
+
+    def test_sampled_queries_are_explained_after_the_view(self):
+        sampled = mock.patch('thintimer.querylog._explainable', side_effect=lambda connection, sql, many: 'main_app_task' in sql)
+        with sampled, mock.patch('thintimer.querylog.explain', return_value='plan') as explain, \
+                self.assertLogs('thintimer.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('task-list'))
+
+        explain.assert_called_once()
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        # Logged last, once the view has returned.
+        self.assertEqual(records[-1]['explain'], 'plan')
+        self.assertTrue(all('explain' not in record for record in records[:-1]))
+
+    def test_digest_groups_by_fingerprint(self):
+        with self.assertLogs('thintimer.slow_queries', 'WARNING') as logs:
+            for name in ('a', 'b'):
+                Task.objects.create(user=self.user, name=name)
+                self.client.get(reverse('task-list'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'slow.log'
+        path.write_text(''.join(f'{record.getMessage()}\n' for record in logs.records) + 'not json\n')
+
+        out = StringIO()
+        call_command('slow_query_digest', log=str(path), date=timezone.now().date(), output=str(path.with_suffix('.json')), stdout=out)
+        digest = json.loads(path.with_suffix('.json').read_text())['queries']
+        self.assertEqual(len({summary['fingerprint'] for summary in digest}), len(digest))
+        self.assertTrue(any(summary['count'] == 2 and summary['views'] == ['task-list'] for summary in digest))
+
+###############################################################################
+# UNIT TEST CASES
+###############################################################################
+
+# The admin templates need their static files, which are not collected.
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.admin)
+        self.task = Task.objects.create(user=self.admin, name='Support')
+        self.other = Task.objects.create(user=self.admin, name='Other')
+        self.add_entries(self.task, datetime(2023, 11, 30, 9, 0), 3)
+
+    def add_entries(self, task, start, count):
+        start = timezone.make_aware(start)
+        for day in range(count):
+            Entry.objects.create(task=task, start_time=start + timedelta(days=day), end_time=start + timedelta(days=day, hours=1))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_entry_changelist_queries_do_not_grow(self):
+        url = reverse('admin:main_app_entry_changelist')
+        _, before = self.changelist_queries(url)
+        self.add_entries(self.other, datetime(2024, 3, 1, 9, 0), 20)
+        response, after = self.changelist_queries(url)
+        self.assertEqual(after, before)
+        self.assertContains(response, '23 entrys')
+
+    def test_date_hierarchy_lists_years_and_months_from_bounds(self):
+        # Entries of a single year list its months, from November to December.
+        response, _ = self.changelist_queries(reverse('admin:main_app_entry_changelist'))
+        self.assertContains(response, 'start_time__month=11')
+        self.assertContains(response, 'start_time__month=12')
+        self.add_entries(self.other, datetime(2025, 3, 1, 9, 0), 1)
+        response, _ = self.changelist_queries(reverse('admin:main_app_entry_changelist'))
+        for year in (2023, 2024, 2025):
+            self.assertContains(response, f'start_time__year={year}')
+
+    def test_task_entries_link_filters_entries(self):
+        self.add_entries(self.other, datetime(2024, 3, 1, 9, 0), 2)
+        response, _ = self.changelist_queries(reverse('admin:main_app_task_changelist'))
+        self.assertContains(response, f'?task__id__exact={self.other.pk}')
+        response, _ = self.changelist_queries(reverse('admin:main_app_entry_changelist') + f'?task__id__exact={self.other.pk}')
+        self.assertContains(response, '2 entrys')
+
+    def test_paginator_caps_filtered_counts(self):
+        with mock.patch.object(main_admin, 'COUNT_LIMIT', 2):
+            paginator = main_admin.EstimatedCountPaginator(Entry.objects.filter(task=self.task).order_by('pk'), 1)
+            self.assertEqual(paginator.count, 2)
+        self.assertIsNone(main_admin.estimate_rows(Entry))
+
+    def test_task_change_form_uses_raw_id_widgets(self):
+        response = self.client.get(reverse('admin:main_app_task_change', args=[self.task.pk]))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        response = self.client.get(reverse('admin:main_app_entry_change', args=[Entry.objects.first().pk]))
+        self.assertContains(response, 'admin-autocomplete')
+
+class StaticPipelineTests(TestCase):
+    def collect(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(STATIC_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        return Path(directory.name)
+
+    def test_collectstatic_builds_minified_precompressed_bundles(self):
+        root = self.collect()
+        manifest = json.loads((root / 'staticfiles.json').read_text())['paths']
+        bundle = root / manifest['js/edit_entries.bundle.js']
+        sources = sum((root / manifest[name]).stat().st_size for name in settings.STATIC_BUNDLES['js/edit_entries.bundle.js'])
+        self.assertLess(bundle.stat().st_size, sources)
+        self.assertIn('function fetchEntriesForDate(', bundle.read_text())
+        self.assertTrue(bundle.with_name(bundle.name + '.gz').exists())
+        self.assertTrue(bundle.with_name(bundle.name + '.br').exists())
+
+        # Served precompressed and immutable, without touching the session.
+        response = self.client.get(f'/static/{manifest["js/edit_entries.bundle.js"]}', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_pages_load_bundles(self):
+        user = User.objects.create_user(username='testuser', password='password')
+        self.client.force_login(user)
+        with override_settings(STATIC_BUNDLES_ENABLED=True):
+            response = self.client.get(reverse('edit_entries'))
+        self.assertContains(response, '/static/js/edit_entries.bundle.js')
+        self.assertNotContains(response, '/static/js/main.js')
+        with override_settings(STATIC_BUNDLES_ENABLED=False):
+            response = self.client.get(reverse('edit_entries'))
+        self.assertContains(response, '<script src="/static/js/edit_entries.js"></script>\n<script src="/static/js/main.js"></script>')
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class TemplateCachingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client.force_login(self.user)
+        self.addCleanup(cache.clear)
+
+    def test_templates_use_cached_loader(self):
+        loaders = engines['django'].engine.loaders
+        self.assertEqual(loaders[0][0], 'django.template.loaders.cached.Loader')
+
+    def test_page_chrome_is_cached_per_user(self):
+        self.assertContains(self.client.get(reverse('home')), '<span id="usernameDisplay">testuser</span>')
+        key = make_template_fragment_key('page_chrome', [self.user.pk, 'testuser'])
+        self.assertIn('usernameDisplay', cache.get(key))
+        cache.set(key, 'cached chrome')
+        self.assertContains(self.client.get(reverse('edit_entries')), 'cached chrome')
+
+        # Another user, or a new username, renders a new fragment.
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertContains(self.client.get(reverse('home')), '<span id="usernameDisplay">renamed</span>')
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse('home')), 'renamed')
+
+    def test_render_benchmark_covers_pages(self):
+        results = benchmarks.render_pages(self.user, repeat=2)
+        self.assertEqual(set(results), set(benchmarks.PAGE_TEMPLATES))
+        self.assertTrue(all(result['p50_us'] > 0 for result in results.values()))
+
+class ImportParsingTests(TestCase):
+    def test_json_array_split_across_chunks(self):
+        document = json.dumps([{'task': f'T{i}', 'tags': ['a', 'b']} for i in range(20)], indent=1)
+        chunks = [document[i:i + 7] for i in range(0, len(document), 7)]
+        self.assertEqual([row['task'] for row in importer._iter_json_array(chunks)], [f'T{i}' for i in range(20)])
+
+    def test_lines_split_across_chunks(self):
+        self.assertEqual(list(importer._lines(['a,b\r', '\nc', ',d\r\n', 'e'])), ['a,b\r\n', 'c,d\r\n', 'e'])
+
+class QueryFingerprintTests(TestCase):
+    def test_values_do_not_change_fingerprint(self):
+        first = "SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x' AND n > %s"
+        second = "SELECT *  FROM t WHERE id IN (4) AND name = 'it''s'  AND n > %s"
+        self.assertEqual(querylog.normalize(first), "SELECT * FROM t WHERE id IN (...) AND name = ? AND n > ?")
+        self.assertEqual(querylog.fingerprint(first), querylog.fingerprint(second.replace('(4)', '(4, 5)')))
+        self.assertNotEqual(querylog.fingerprint(first), querylog.fingerprint('SELECT * FROM main_app_entry_p2024_01'))
+
+class PeriodIndexTests(TestCase):
+    def test_period_index_crosses_years(self):
+        periods = reports.period_index(date(2023, 11, 15), date(2024, 4, 2), 'quarter')
+        self.assertEqual(periods, [date(2023, 10, 1), date(2024, 1, 1), date(2024, 4, 1)])
+        self.assertEqual([reports.period_label(start, 'quarter') for start in periods], ['2023-Q4', '2024-Q1', '2024-Q2'])
+
+    def test_period_position(self):
+        origin = reports.period_start(date(2023, 12, 31), 'week')
+        self.assertEqual(origin, date(2023, 12, 25))
+        self.assertEqual(reports.period_position(date(2024, 1, 8), origin, 'week'), 2)
+        self.assertEqual(reports.period_position(date(2025, 1, 1), date(2023, 11, 1), 'month'), 14)
+
+class PartitionTests(TestCase):
+    def test_partition_bounds(self):
+        self.assertEqual(partitions.partition_bounds(date(2024, 12, 15), 'month'), (date(2024, 12, 1), date(2025, 1, 1)))
+        self.assertEqual(partitions.partition_bounds(date(2024, 6, 15), 'year'), (date(2024, 1, 1), date(2025, 1, 1)))
+
+    def test_partition_names_round_trip(self):
+        name = partitions.partition_name(date(2024, 2, 1), 'month')
+        self.assertEqual(name, 'main_app_entry_p2024_02')
+        self.assertEqual(partitions.parse_partition_name(name), (date(2024, 2, 1), date(2024, 3, 1), 'month'))
+        self.assertIsNone(partitions.parse_partition_name(partitions.DEFAULT_PARTITION))
+
+    def test_partition_ranges_span_years(self):
+        ranges = partitions.partition_ranges(date(2023, 11, 20), date(2024, 2, 1), 'month')
+        self.assertEqual([start.month for start, end in ranges], [11, 12, 1, 2])
+
+    def test_command_requires_postgres(self):
+        with self.assertRaises(CommandError):
+            call_command('manage_entry_partitions')
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.task = Task.objects.create(name='Old Task', user=self.user)
+        start = timezone.make_aware(datetime(2020, 3, 1, 9, 0))
+        for day in range(3):
+            Entry.objects.create(task=self.task, start_time=start + timedelta(days=day), end_time=start + timedelta(days=day, minutes=30))
+        self.task.refresh_from_db()
+
+    def test_pack_round_trip(self):
+        rows = list(Entry.objects.values_list('id', 'start_time', 'end_time'))
+        self.assertEqual(archive.unpack_entries(archive.pack_entries(rows)), rows)
+
+    def test_archive_and_restore(self):
+        before = timezone.make_aware(datetime(2021, 1, 1))
+        self.assertEqual(archive.archive_entries(before, batch_size=2), 3)
+        self.assertEqual(Entry.objects.count(), 0)
+        self.assertEqual(EntryArchive.objects.count(), 2)
+        rollups = archive.rollups_for_range(self.user, date(2020, 3, 1), date(2020, 3, 31))
+        self.assertEqual(sum((rollup.total_time for rollup in rollups), timedelta(0)), timedelta(minutes=90))
+
+        # Task totals are left untouched by archiving and restoring.
+        self.assertEqual(Task.objects.get().total_time_spent, self.task.total_time_spent)
+        self.assertEqual(archive.restore_entries(EntryArchive.objects.all()), 3)
+        self.assertEqual(Entry.objects.count(), 3)
+        self.assertFalse(EntryRollup.objects.exists())
+        self.assertEqual(Task.objects.get().total_time_spent, timedelta(minutes=90))
+
+    def test_restore_without_rollups(self):
+        archive.archive_entries(timezone.make_aware(datetime(2021, 1, 1)))
+        EntryRollup.objects.all().delete()
+        self.assertEqual(archive.restore_entries(EntryArchive.objects.all()), 3)
+        self.assertFalse(EntryRollup.objects.exists())
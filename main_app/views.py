@@ -8,26 +8,44 @@ from datetime import datetime, timedelta
 
 # Third-party imports: Django natives.
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
 
 # Third-party imports: Django DRF.
 from rest_framework import permissions, status, viewsets
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
 # Third-party imports: Other.
 from openpyxl import Workbook
 
 # Local imports.
+from thintimer import metrics
+from thintimer.routers import ReplicaReadsMixin, use_replicas
+from user_auth.timezones import day_range, get_time_zone, user_day_range
+from . import export, importer
+from .archive import rollups_for_range
 from .models import Entry, Task
+from .reports import aggregate, grouped_report, parse_group_by, period_index, period_label, period_position
 from .serializers import EntrySerializer, TaskSerializer
 
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+# Report frequencies of the XLSX export mapped to their period.
+XLSX_FREQUENCIES = {'daily': 'day', 'weekly': 'week', 'monthly': 'month', 'quarterly': 'quarter'}
+
+# Longest window, in days, served by the entries range endpoint.
+MAX_RANGE_DAYS = 366
+
 ###############################################################################
 # MODEL VIEWSETS
 ###############################################################################
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     A ViewSet for handling tasks.
     
@@ -61,12 +79,23 @@ class TaskViewSet(viewsets.ModelViewSet):
         """
         Returns a queryset for tasks that belong to the authenticated user.
 
+        The optional `tag` query parameter restricts the tasks to those
+        carrying a tag, resolved through the (user, name) index of tags.
+        Only the columns of the fields selected with `fields` or `omit` are
+        read, see `SparseFieldsMixin`.
+
         Returns
         -------
         QuerySet
             A QuerySet of Task objects.
         """
-        return Task.objects.filter(user=self.request.user).order_by('name')
+        queryset = Task.objects.filter(user=self.request.user)
+
+        tag = self.request.query_params.get('tag')
+        if tag:
+            queryset = queryset.filter(tags__user=self.request.user, tags__name=tag)
+
+        return TaskSerializer.optimize_queryset(queryset, self.request).order_by('name')
 
     def perform_create(self, serializer):
         """
@@ -110,7 +139,7 @@ class TaskViewSet(viewsets.ModelViewSet):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class EntryViewSet(viewsets.ModelViewSet):
+class EntryViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     A ViewSet for handling entries.
     
@@ -129,6 +158,10 @@ class EntryViewSet(viewsets.ModelViewSet):
         Saves a new entry.
     get_entries_for_date(request, date=None, **kwargs)
         Filters entries based on a given date.
+    get_entries_for_range(request)
+        Returns the entries of a range of days, grouped by day.
+    import_entries(request)
+        Imports entries from an uploaded CSV, JSON or NDJSON file.
         
     Returns
     -------
@@ -138,17 +171,24 @@ class EntryViewSet(viewsets.ModelViewSet):
 
     serializer_class = EntrySerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('list', 'get_entries_for_date', 'get_entries_for_range')
 
     def get_queryset(self):
         """
         Returns a queryset for entries that belong to the authenticated user.
+
+        Their tasks are joined for the task names, and only the columns of
+        the fields selected with `fields` or `omit` are read, see
+        `SparseFieldsMixin`.
         
         Returns
         -------
         QuerySet
             A QuerySet of Entry objects.
         """
-        return Entry.objects.filter(task__user=self.request.user).order_by('-start_time')
+        queryset = Entry.objects.filter(task__user=self.request.user).order_by('-start_time')
+
+        return EntrySerializer.optimize_queryset(queryset, self.request)
 
     def perform_create(self, serializer):
         """
@@ -188,72 +228,220 @@ class EntryViewSet(viewsets.ModelViewSet):
         # Convert the date string to a datetime object
         date_obj = datetime.strptime(date, '%Y-%m-%d').date()
         
-        # Filter entries by the given date
-        entries = Entry.objects.filter(task__user=request.user, start_time__date=date_obj).order_by('start_time')
+        # Filter entries by the given date, a day in the user's time zone.
+        day_start, day_end = user_day_range(request.user, date_obj, date_obj)
+        entries = EntrySerializer.optimize_queryset(Entry.objects.filter(
+            task__user=request.user, start_time__gte=day_start, start_time__lt=day_end,
+        ), request).order_by('start_time')
         
         # Serialize the entries
-        serializer = EntrySerializer(entries, many=True)
+        serializer = self.get_serializer(entries, many=True)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['GET'], url_path='range')
+    def get_entries_for_range(self, request, **kwargs):
+        """
+        Returns the entries of a range of days, grouped by day.
+
+        The days are those of the user's time zone, from the `start` to the
+        `end` query parameter (YYYY-MM-DD, both included, at most
+        MAX_RANGE_DAYS days). All entries are read in one query on the
+        (task, start_time) index; every day of the range is listed, with
+        its entries in start order. With `totals=true`, each day also has
+        its `total_time` (seconds) and `entry_count`. Clients can fetch a
+        week or a month at once instead of one request per day.
+
+        Parameters
+        ----------
+        request : Request
+            HTTP request containing the range in its query parameters.
+        kwargs : dict
+            Keyword arguments.
+
+        Returns
+        -------
+        Response
+            A DRF Response object containing the days of the range.
+        """
+        try:
+            start_date = datetime.strptime(request.query_params.get('start', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.query_params.get('end', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {"error": "start and end must be dates in YYYY-MM-DD format"}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        span = (end_date - start_date).days + 1
+        if span < 1:
+            return Response({"error": "end must not be before start"}, status=status.HTTP_400_BAD_REQUEST)
+        if span > MAX_RANGE_DAYS:
+            return Response(
+                {"error": f"The range must not exceed {MAX_RANGE_DAYS} days"}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        totals = request.query_params.get('totals', '').lower() in ('1', 'true', 'yes')
+
+        # One query for the whole range, bounded by the user's local midnights.
+        tz = get_time_zone(request.user)
+        range_start, range_end = day_range(start_date, end_date, tz)
+        entries = list(EntrySerializer.optimize_queryset(Entry.objects.filter(
+            task__user=request.user, start_time__gte=range_start, start_time__lt=range_end,
+        ), request, required=('start_time', 'end_time')).order_by('start_time'))
+
+        days = {}
+        for offset in range(span):
+            day = start_date + timedelta(days=offset)
+            days[day] = {'date': day.isoformat(), 'entries': []}
+            if totals:
+                days[day].update(total_time=0.0, entry_count=0)
+
+        for entry, data in zip(entries, self.get_serializer(entries, many=True).data):
+            day = days[timezone.localtime(entry.start_time, tz).date()]
+            day['entries'].append(data)
+            if totals:
+                day['total_time'] += (entry.end_time - entry.start_time).total_seconds()
+                day['entry_count'] += 1
+
+        return Response(
+            {'start': start_date.isoformat(), 'end': end_date.isoformat(), 'days': list(days.values())},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=['POST'], url_path='import', parser_classes=[MultiPartParser])
+    def import_entries(self, request, **kwargs):
+        """
+        Import entries from an uploaded file.
+
+        The file is sent as the multipart field `file`. Its format is taken
+        from the `file_format` field ('csv', 'json' or 'ndjson') or from the
+        file extension. Times without an offset are in the user's time zone.
+        See main_app/importer.py.
+
+        Parameters
+        ----------
+        request : Request
+            HTTP request containing the uploaded file.
+        kwargs : dict
+            Keyword arguments.
+
+        Returns
+        -------
+        Response
+            A DRF Response object containing the import summary or errors.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "A file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            file_format = request.data.get('file_format') or importer.detect_format(upload.name)
+            if file_format not in importer.FORMATS:
+                raise ValueError(f"Format must be one of: {', '.join(importer.FORMATS)}.")
+            summary = importer.import_entries(
+                request.user, importer.parse_rows(upload, file_format), tzinfo=get_time_zone(request.user),
+            )
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(summary, status=status.HTTP_200_OK)
+
 ###############################################################################
 # DJANGO REST API FRAMEWORK (DRF) VIEWS
 ###############################################################################
 
 @api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@use_replicas
 def generate_report(request):
     """
     Generate a report based on task entries within a specified date range.
 
+    Time is aggregated in the database by the dimensions listed in the
+    `group_by` query parameter: any combination of 'task' (the default),
+    'tag', 'day', 'week', 'month' and 'quarter'. See main_app/reports.py.
+
     Parameters
     ----------
     request : Request
-        HTTP request containing query parameters for date range.
+        HTTP request containing query parameters for date range and grouping.
 
     Returns
     -------
     Response
-        A DRF Response object containing aggregated task data or errors.
+        A DRF Response object containing the columnar report or errors.
     """
     
     start_date_str = request.GET.get('startDate', None)
     end_date_str = request.GET.get('endDate', None)
-    frequency = request.GET.get('frequency', 'daily')
 
     # Validate date inputs
     if not start_date_str or not end_date_str:
         return Response({"error": "Start and end dates are required"}, status=status.HTTP_400_BAD_REQUEST)
 
+    # Validate the grouping.
+    try:
+        group_by = parse_group_by(request.GET.get('group_by'))
+    except ValueError as error:
+        return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
     # Convert string dates to datetime objects
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
-    # Fetch entries within the date range.
-    entries = Entry.objects.filter(start_time__date__range=(start_date, end_date))
+    # Fetch the user's entries within the date range, in their time zone.
+    tzinfo = get_time_zone(request.user)
+    range_start, range_end = day_range(start_date, end_date, tzinfo)
+    entries = Entry.objects.filter(
+        task__user=request.user, start_time__gte=range_start, start_time__lt=range_end,
+    )
 
-    # Initialize the result dictionary for data aggregation.
-    result = {}
-    
-    # Aggregate entry data
-    for entry in entries:
-        task = entry.task
-        task_id = task.id
-        if task_id not in result:
-            result[task_id] = {
-                'name': task.name,
-                'description': task.description,
-                'tags': task.tags.split(',') if task.tags else [],
-                'total_time': 0
-            }
-        # Update the total time for the task.
-        result[task_id]['total_time'] += entry.total_time().total_seconds()
+    # Aggregate the live entries and the daily totals of archived entries
+    # with one grouped query each.
+    rollups = rollups_for_range(request.user, start_date, end_date)
+    result = grouped_report(entries, rollups, group_by, tzinfo=tzinfo)
+
+    metrics.REPORT_ROWS.labels('json').inc(len(result['columns']['total_time']))
 
     return Response(result, status=status.HTTP_200_OK)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_account(request):
+    """
+    Stream a zip archive of the user's tasks and entries.
+
+    The `file_format` query parameter selects NDJSON ('ndjson', the default)
+    or CSV files. The archive is written while it is sent, see
+    main_app/export.py.
+
+    Parameters
+    ----------
+    request : Request
+        HTTP request of the exported user.
+
+    Returns
+    -------
+    StreamingHttpResponse
+        The zip archive, as an attachment.
+    """
+    file_format = request.GET.get('file_format', 'ndjson')
+    if file_format not in export.FORMATS:
+        return Response(
+            {"error": f"Format must be one of: {', '.join(export.FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    filename = f'thintimer-export-{timezone.localdate(timezone=get_time_zone(request.user)).isoformat()}.zip'
+    response = StreamingHttpResponse(export.stream_export(request.user, file_format), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+
+    return response
+
 ###############################################################################
 # DJANGO NATIVE API VIEWS
 ###############################################################################
 
+@use_replicas
 def generate_xlsx_report(request):
     """
     Generate an Excel report based on time tracking data for tasks and entries.
@@ -270,7 +458,8 @@ def generate_xlsx_report(request):
     end_date_str : str
         The end date in string format as passed in the query parameters.
     frequency : str
-        The frequency for the report, can be 'daily' or 'monthly'.
+        The frequency for the report, can be 'daily', 'weekly', 'monthly' or
+        'quarterly'.
     start_date : datetime.date
         The start date in datetime format.
     end_date : datetime.date
@@ -286,59 +475,54 @@ def generate_xlsx_report(request):
     start_date_str = request.GET.get('startDate')
     end_date_str = request.GET.get('endDate')
     frequency = request.GET.get('frequency')
+
+    # Reports are per user.
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden("Authentication required")
+
+    # Validate the query parameters.
+    if not start_date_str or not end_date_str:
+        return HttpResponseBadRequest("Start and end dates are required")
+    if frequency not in XLSX_FREQUENCIES:
+        return HttpResponseBadRequest(f"Frequency must be one of: {', '.join(XLSX_FREQUENCIES)}")
     
     # Convert string dates to datetime objects.
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
     
-    # Initialize a new Excel workbook and worksheet.
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Report"
+    # Initialize a new Excel workbook and worksheet. The write-only mode
+    # streams rows to the file instead of keeping every cell in memory.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Report")
     
-    # Define the headers for the worksheet
-    headers = ['Task Name', 'Task Description', 'Tags']
-    
-    # Initialize an empty list to store date range
-    date_range = []
+    # Build the dense index of periods covering the whole span, which may
+    # cross years.
+    period = XLSX_FREQUENCIES[frequency]
+    periods = period_index(start_date, end_date, period)
     
-    # Populate date range based on frequency
-    if frequency == 'daily':
-        delta = end_date - start_date
-        for i in range(delta.days + 1):
-            day = start_date + timedelta(days=i)
-            date_range.append(day.strftime('%Y-%m-%d'))
-    elif frequency == 'monthly':
-        # Assumes start and end date are in the same year.
-        for month in range(start_date.month, end_date.month + 1):
-            date_range.append(datetime(start_date.year, month, 1).strftime('%Y-%m'))
-    
-    # Extend headers with the populated date range.
-    headers.extend(date_range)
+    # Define the headers for the worksheet, one column per period.
+    headers = ['Task Name', 'Task Description', 'Tags']
+    headers.extend(period_label(start, period) for start in periods)
     ws.append(headers)
     
-    # Fetch tasks data.
-    tasks = Task.objects.all()
+    # Aggregate the user's entries and archived rollups per task and period
+    # in the database, then place each total in its column arithmetically.
+    tzinfo = get_time_zone(request.user)
+    range_start, range_end = day_range(start_date, end_date, tzinfo)
+    entries = Entry.objects.filter(task__user=request.user, start_time__gte=range_start, start_time__lt=range_end)
+    rollups = rollups_for_range(request.user, start_date, end_date)
+    _, totals = aggregate(entries, rollups, ['task', period], tzinfo=tzinfo)
+    
+    time_data = {}
+    for (task_id, _, start), (seconds, _) in totals.items():
+        index = period_position(start, periods[0], period)
+        time_data.setdefault(task_id, [0] * len(periods))[index] += seconds / 3600  # Convert to hours.
     
     # Iterate through tasks to populate worksheet.
+    tasks = Task.objects.filter(user=request.user).prefetch_related('tags').order_by('name')
     for task in tasks:
-        row = [task.name, task.description, task.tags]
-        time_data = [0] * len(date_range)  # Initialize time data.
-        
-        # Fetch entries related to the task and within the specified date range.
-        entries = Entry.objects.filter(task=task, start_time__gte=start_date, end_time__lte=end_date)
-        
-        # Calculate total time for entries
-        for entry in entries:
-            total_time = entry.total_time().total_seconds() / 3600  # Convert to hours.
-            if frequency == 'daily':
-                index = (entry.start_time.date() - start_date).days
-            elif frequency == 'monthly':
-                index = entry.start_time.month - start_date.month
-            time_data[index] += total_time
-        
-        # Extend row with the calculated time data.
-        row.extend(time_data)
+        row = [task.name, task.description, ', '.join(sorted(tag.name for tag in task.tags.all()))]
+        row.extend(time_data.get(task.id, [0] * len(periods)))
         ws.append(row)
     
     # Prepare HTTP response to return Excel file.
@@ -347,6 +531,7 @@ def generate_xlsx_report(request):
     
     # Save workbook to response.
     wb.save(response)
+    metrics.REPORT_ROWS.labels('xlsx').inc(len(tasks))
     
     return response
 
@@ -0,0 +1,245 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import zlib
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+# Third-party imports: Other.
+import brotli
+import zstandard
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on response compression.
+
+* `CompressionMiddleware` compresses responses with the first encoding of
+`COMPRESSION_ENCODINGS` (brotli, zstd and gzip by default) that the client
+accepts, by its Accept-Encoding header. Levels favour speed, since every
+response is compressed on the fly: static files are precompressed at a
+higher level by collectstatic instead (see thintimer/storage.py).
+
+* Responses smaller than `COMPRESSION_MIN_SIZE` bytes are sent as they are,
+since compressing them saves less than it costs. So are responses that are
+already compressed: those with a Content-Encoding, XLSX reports, zip
+exports, images, audio and video.
+
+* Streaming responses (the account export) are compressed chunk by chunk,
+each chunk flushed as soon as it is compressed, so they keep streaming
+without being buffered.
+
+* BREACH: an attacker who can inject text into a compressed response and
+observe its size can guess a secret in the same response, one byte at a
+time. Django masks the CSRF token differently in every response, and on
+top of that, responses that embed the CSRF token (the pages with forms)
+are never compressed. API responses carry no token.
+"""
+
+# Compression levels, tuned for on-the-fly compression.
+BROTLI_QUALITY = 4
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+ENCODINGS = ('br', 'zstd', 'gzip')
+
+# Content types that are already compressed, except SVG images.
+COMPRESSED_TYPES = (
+    'application/zip',
+    'application/gzip',
+    'application/x-gzip',
+    'application/zstd',
+    'application/vnd.openxmlformats-officedocument.',
+    'image/',
+    'audio/',
+    'video/',
+    'font/woff',
+)
+
+###############################################################################
+# COMPRESSION
+###############################################################################
+
+def _compressor(encoding):
+    """
+    Return the functions of an incremental compressor.
+
+    Parameters
+    ----------
+    encoding : str
+        One of ENCODINGS.
+
+    Returns
+    -------
+    tuple of callable
+        `compress(data)`, `flush()` and `finish()`, each returning the
+        compressed bytes available so far.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    raise ValueError(f"Unsupported encoding: {encoding!r}")
+
+def compress(data, encoding):
+    """
+    Compress bytes.
+
+    Parameters
+    ----------
+    data : bytes
+        The data.
+    encoding : str
+        One of ENCODINGS.
+
+    Returns
+    -------
+    bytes
+        The compressed data.
+    """
+    process, _, finish = _compressor(encoding)
+
+    return process(data) + finish()
+
+def compress_stream(chunks, encoding):
+    """
+    Compress a stream of chunks, flushing after each one.
+
+    Parameters
+    ----------
+    chunks : iterable of bytes
+        The data.
+    encoding : str
+        One of ENCODINGS.
+
+    Yields
+    ------
+    bytes
+        The compressed chunks.
+    """
+    process, flush, finish = _compressor(encoding)
+
+    for chunk in chunks:
+        compressed = process(chunk) + flush()
+        if compressed:
+            yield compressed
+
+    yield finish()
+
+def negotiate(accept_encoding, encodings):
+    """
+    Return the encoding to use for a request.
+
+    Parameters
+    ----------
+    accept_encoding : str
+        The Accept-Encoding header, e.g. 'gzip, br;q=0.8'.
+    encodings : iterable of str
+        The encodings the server offers, by preference.
+
+    Returns
+    -------
+    str or None
+        The first offered encoding the client accepts, or None.
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+
+    return None
+
+###############################################################################
+# MIDDLEWARE
+###############################################################################
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli, zstd or gzip. See the notes above.
+
+    Methods
+    -------
+    __call__(request)
+        Serve the request and compress its response if worthwhile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """
+        Serve a request and compress its response if worthwhile.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming request.
+
+        Returns
+        -------
+        HttpResponse
+            The response, compressed or not.
+        """
+        response = self.get_response(request)
+
+        content_type = response.get('Content-Type', '')
+        if response.has_header('Content-Encoding'):
+            return response
+        if content_type.startswith(COMPRESSED_TYPES) and not content_type.startswith('image/svg'):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        # BREACH: keep responses embedding the CSRF token uncompressed. Using
+        # the token makes CsrfViewMiddleware (re)send its cookie.
+        if settings.CSRF_COOKIE_NAME in response.cookies:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), getattr(settings, 'COMPRESSION_ENCODINGS', ENCODINGS))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag would now be wrong, see Django's GZipMiddleware.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+
+        return response
@@ -0,0 +1,208 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import hmac
+import os
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.models import F
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+
+# Third-party imports: Other.
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the application metrics.
+
+* Metrics are collected with prometheus_client and exposed in the Prometheus
+text format at `/metrics`, to staff users and to scrapers sending the
+`METRICS_TOKEN` setting as a bearer token.
+
+* `MetricsMiddleware` records the latency and the number of ORM queries of
+every request, labelled by URL name rather than path to keep the number of
+series bounded, and the size of generated reports. Views record the number
+of report rows, signal receivers count login attempts, the metered cache
+backends count cache hits and misses and the connection pools their
+connections (see thintimer/pool.py).
+
+* Active timers are counted at scrape time: a running timer is an entry
+created by the timer page whose end time still equals its start time.
+
+* Under gunicorn, each worker process has its own counters. When the
+`PROMETHEUS_MULTIPROC_DIR` setting names a directory, workers write their
+values to files in it and `/metrics` aggregates them over all workers. See
+gunicorn.conf.py, which clears the directory on start.
+"""
+
+# Views whose response sizes are recorded as report bytes, by report format.
+REPORT_VIEWS = {'generate_report': 'json', 'generate_xlsx_report': 'xlsx'}
+
+# Timers running for longer than this are considered abandoned.
+ACTIVE_TIMER_WINDOW = timedelta(days=1)
+
+_MISSING = object()
+
+###############################################################################
+# METRICS
+###############################################################################
+
+REQUEST_LATENCY = Histogram(
+    'thintimer_request_duration_seconds', "Request latency, by URL name.", ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter('thintimer_requests', "Requests, by URL name and status code.", ['view', 'method', 'status'])
+DB_QUERIES = Counter('thintimer_db_queries', "ORM queries, by URL name.", ['view'])
+REPORT_ROWS = Counter('thintimer_report_rows', "Rows of generated reports, by format.", ['format'])
+REPORT_BYTES = Counter('thintimer_report_bytes', "Bytes of generated reports, by format.", ['format'])
+LOGIN_ATTEMPTS = Counter('thintimer_login_attempts', "Login attempts, by result.", ['result'])
+CACHE_REQUESTS = Counter('thintimer_cache_requests', "Cache lookups, by result.", ['result'])
+DB_POOL_CONNECTIONS = Gauge(
+    'thintimer_db_pool_connections', "Pooled database connections, by database and state (idle or used).",
+    ['database', 'state'], multiprocess_mode='livesum',
+)
+DB_POOL_WAIT = Histogram(
+    'thintimer_db_pool_wait_seconds', "Time waited for a pooled database connection, by database.", ['database'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+DB_POOL_TIMEOUTS = Counter('thintimer_db_pool_timeouts', "Requests for a pooled connection that timed out, by database.", ['database'])
+
+###############################################################################
+# COLLECTION
+###############################################################################
+
+class MetricsMiddleware:
+    """
+    Record the latency, query count and report size of every request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view = getattr(getattr(request, 'resolver_match', None), 'view_name', None) or 'unresolved'
+        REQUEST_LATENCY.labels(view, request.method).observe(duration)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        if queries:
+            DB_QUERIES.labels(view).inc(len(queries))
+        if view in REPORT_VIEWS and not response.streaming:
+            REPORT_BYTES.labels(REPORT_VIEWS[view]).inc(len(response.content))
+
+        return response
+
+@receiver(user_logged_in)
+def _count_login(sender, **kwargs):
+    LOGIN_ATTEMPTS.labels('success').inc()
+
+@receiver(user_login_failed)
+def _count_failed_login(sender, **kwargs):
+    LOGIN_ATTEMPTS.labels('failure').inc()
+
+class MeteredCacheMixin:
+    """
+    Count the hits and misses of a cache backend.
+
+    Mix into any cache backend class, before it, as in `MeteredLocMemCache`.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        CACHE_REQUESTS.labels('miss' if value is _MISSING else 'hit').inc()
+
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        CACHE_REQUESTS.labels('hit').inc(len(values))
+        CACHE_REQUESTS.labels('miss').inc(len(keys) - len(values))
+
+        return values
+
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    pass
+
+class ActiveTimersCollector:
+    """
+    Count the running timers when metrics are scraped.
+    """
+
+    def collect(self):
+        # Imported here: this module is also loaded as a cache backend,
+        # which may happen before the app registry is ready.
+        from main_app.models import Entry
+
+        running = Entry.objects.filter(
+            start_time__gte=timezone.now() - ACTIVE_TIMER_WINDOW, end_time=F('start_time'),
+        ).count()
+
+        yield GaugeMetricFamily('thintimer_active_timers', "Timers currently running.", value=running)
+
+###############################################################################
+# VIEW
+###############################################################################
+
+def metrics_view(request):
+    """
+    Expose the metrics in the Prometheus text format.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The scrape request, from a staff user or with the metrics token.
+
+    Returns
+    -------
+    HttpResponse
+        The metrics of every worker process.
+    """
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404("Metrics are disabled")
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not (authorized or request.user.is_staff):
+        return HttpResponseForbidden("Not authorized")
+
+    # In multiprocess mode the values are aggregated from the files of
+    # every worker; otherwise this process's registry is complete.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    timers = CollectorRegistry()
+    timers.register(ActiveTimersCollector())
+
+    return HttpResponse(generate_latest(registry) + generate_latest(timers), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,206 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import threading
+import time
+
+# Third-party imports: Django natives.
+from django.db import OperationalError
+
+# Local imports.
+from .metrics import DB_POOL_CONNECTIONS, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on database connection pooling.
+
+* Without pooling, Django keeps one connection per worker thread open for
+`DATABASE_CONN_MAX_AGE` seconds, so the number of PostgreSQL connections
+grows with workers times threads, and restarting the workers opens them all
+again at once.
+
+* With `DATABASE_POOLING=pool`, the PostgreSQL backend of
+thintimer/postgresql_pool takes its connections from a `ConnectionPool` per
+database and process, holding at most `DATABASE_POOL_MAX_SIZE` connections.
+A thread checks a connection out on its first query of a request and
+returns it when the request finishes; when every connection is in use it
+waits up to `DATABASE_POOL_TIMEOUT` seconds, then fails. Any number of
+threads thus share a bounded number of connections, opened only as needed.
+
+* Connections idle for more than `DATABASE_POOL_MAX_IDLE` seconds are closed.
+With `DATABASE_CONN_HEALTH_CHECKS`, each connection is checked when it is
+checked out and replaced if the server dropped it. Open transactions are
+rolled back when a connection is returned.
+
+* With `DATABASE_POOLING=pgbouncer` the pooling is left to PgBouncer in
+transaction mode, where consecutive transactions may run on different
+server connections: server-side cursors are disabled, and the account
+export reads its rows in keyset-paginated batches instead (see
+main_app/export.py).
+
+* The used and idle connections of each pool, the time waited for one and
+the timeouts are exported to /metrics, see thintimer/metrics.py.
+"""
+
+###############################################################################
+# POOL
+###############################################################################
+
+class PoolTimeout(OperationalError):
+    """
+    No pooled connection was free in time.
+    """
+
+class ConnectionPool:
+    """
+    Thread-safe pool of at most `max_size` DB-API connections.
+
+    Parameters
+    ----------
+    connect : callable
+        Opens a new connection.
+    max_size : int
+        Maximum number of connections, used or idle.
+    timeout : float, optional
+        Seconds to wait for a free connection.
+    max_idle : float, optional
+        Idle connections older than this many seconds are closed.
+    check : callable, optional
+        Returns whether a connection is usable, called on checkout.
+    reset : callable, optional
+        Cleans up a returned connection, e.g. rolls its transaction back. If
+        it fails, the connection is closed.
+    name : str, optional
+        Name of the pool in the metrics, e.g. the database alias.
+    """
+
+    def __init__(self, connect, max_size, timeout=30.0, max_idle=300.0, check=None, reset=None, name='default'):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check = check
+        self.reset = reset
+        self.name = name
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # (connection, returned at) pairs, most recently returned last.
+        self._idle = []
+        self._used = 0
+
+    def getconn(self):
+        """
+        Check a connection out, waiting for one if all are in use.
+
+        Returns
+        -------
+        object
+            The connection.
+
+        Raises
+        ------
+        PoolTimeout
+            If no connection was free within `timeout` seconds.
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            DB_POOL_TIMEOUTS.labels(self.name).inc()
+            raise PoolTimeout(f"No connection of the '{self.name}' pool was free within {self.timeout} seconds.")
+        DB_POOL_WAIT.labels(self.name).observe(time.monotonic() - started)
+
+        try:
+            connection = self._take()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._used += 1
+            self._update_metrics()
+
+        return connection
+
+    def putconn(self, connection, discard=False):
+        """
+        Return a checked out connection.
+
+        Parameters
+        ----------
+        connection : object
+            The connection.
+        discard : bool, optional
+            Close the connection instead of keeping it, e.g. if it is broken.
+
+        Returns
+        -------
+        None
+        """
+        if not discard and self.reset is not None:
+            try:
+                self.reset(connection)
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        with self._lock:
+            self._used -= 1
+            if not discard:
+                self._idle.append((connection, now))
+            # The oldest connections are at the start.
+            expired = [conn for conn, returned in self._idle if now - returned > self.max_idle]
+            del self._idle[:len(expired)]
+            self._update_metrics()
+
+        for conn in expired + ([connection] if discard else []):
+            self._close(conn)
+        self._slots.release()
+
+    def close(self):
+        """
+        Close the idle connections.
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._update_metrics()
+
+        for connection, _ in idle:
+            self._close(connection)
+
+    def _take(self):
+        """
+        Return the most recently used healthy idle connection, or a new one.
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, returned = self._idle.pop()
+                self._update_metrics()
+
+            if time.monotonic() - returned > self.max_idle or (self.check is not None and not self.check(connection)):
+                self._close(connection)
+                continue
+
+            return connection
+
+        return self.connect()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _update_metrics(self):
+        DB_POOL_CONNECTIONS.labels(self.name, 'idle').set(len(self._idle))
+        DB_POOL_CONNECTIONS.labels(self.name, 'used').set(self._used)
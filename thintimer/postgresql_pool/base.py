@@ -0,0 +1,140 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import functools
+import threading
+
+# Third-party imports: Django natives.
+from django.db.backends.postgresql import base, creation
+
+# Third-party imports: Other.
+import psycopg2
+import psycopg2.extras
+
+# Local imports.
+from thintimer.pool import ConnectionPool
+
+###############################################################################
+# CONNECTIONS
+###############################################################################
+
+def _connect(conn_params, isolation_level=None):
+    """
+    Open a connection as Django's PostgreSQL backend does.
+    """
+    connection = psycopg2.connect(**conn_params)
+    if isolation_level is not None and isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+
+    # See DatabaseWrapper.get_new_connection() of Django's backend.
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+
+    return connection
+
+def _is_usable(connection):
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        # Without autocommit the query opened a transaction, before Django
+        # sets autocommit on the connection again.
+        if not connection.autocommit:
+            connection.rollback()
+    except psycopg2.Error:
+        return False
+
+    return True
+
+def _reset(connection):
+    # Roll back what a failed request left open; raises on broken connections.
+    connection.rollback()
+
+###############################################################################
+# BACKEND
+###############################################################################
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would prevent dropping the database.
+        self.connection.close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend taking its connections from a pool shared by the
+    threads of the process. See thintimer/pool.py.
+
+    The pool is configured by the `POOL` dictionary of the database settings:
+    `max_size`, `timeout` and `max_idle`. `CONN_MAX_AGE` should be 0, so that
+    connections go back to the pool at the end of each request.
+    """
+
+    creation_class = DatabaseCreation
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def get_pool(self, conn_params):
+        """
+        Return the pool of this database, creating it on first use.
+
+        Pools are keyed by the connection parameters too, which change when
+        the test runner switches to the test database.
+
+        Parameters
+        ----------
+        conn_params : dict
+            The connection parameters, see `get_connection_params()`.
+
+        Returns
+        -------
+        ConnectionPool
+            The pool.
+        """
+        key = (self.alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = ConnectionPool(
+                    functools.partial(_connect, conn_params, self.settings_dict['OPTIONS'].get('isolation_level')),
+                    check=_is_usable if self.settings_dict.get('CONN_HEALTH_CHECKS') else None,
+                    reset=_reset,
+                    name=self.alias,
+                    **{'max_size': 10, **self.settings_dict.get('POOL', {})},
+                )
+
+        return pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        # Closed inside an atomic block, the wrapper keeps its connection
+        # until the block exits: close it rather than let another thread
+        # check it out of the pool meanwhile.
+        discard = bool(self.connection.closed) or self.in_atomic_block
+        self.pool.putconn(self.connection, discard=discard)
+
+    def close_pools(self):
+        """
+        Close the idle connections of the pools of this database.
+
+        Returns
+        -------
+        None
+        """
+        with self._pools_lock:
+            pools = [pool for (alias, _), pool in self._pools.items() if alias == self.alias]
+
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,245 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import cProfile
+import hmac
+import io
+import json
+import logging
+import pstats
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.db import connections
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the profiling middleware.
+
+* `ProfilingMiddleware` is opt-in: it is only installed when the
+`PROFILING_ENABLED` setting is true. It then profiles a random sample of
+requests (`PROFILING_SAMPLE_RATE`, between 0 and 1) and any request carrying
+the `X-Profile` header together with an `X-Profile-Token` header matching the
+`PROFILING_TOKEN` setting (any request when DEBUG is on). Without the token
+the header is ignored, so clients cannot make the server profile on demand.
+The middleware runs before authentication, hence a shared secret rather than
+a staff check.
+
+* For a profiled request it records the wall time, the time spent in the
+database and the number of queries (through `connection.execute_wrapper`),
+queries executed more than once with the same SQL, and the CPU time of the
+thread serving the request.
+
+* With `X-Profile: cprofile`, or when `PROFILING_CPROFILE` is true, the view
+also runs under cProfile and the most expensive functions are logged.
+
+* Summaries are logged as JSON lines to the 'thintimer.profiling' logger,
+which writes to a rotating file when `PROFILING_LOG_FILE` is set. They are
+also returned in a `Server-Timing` header, readable in browser developer
+tools, but only to staff users or when DEBUG is on, since they reveal
+internals.
+
+* Timings stop when the view returns, so the body of a streaming response
+is not included.
+"""
+
+HEADER = 'HTTP_X_PROFILE'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+TOP_FUNCTIONS = 25
+
+logger = logging.getLogger('thintimer.profiling')
+
+###############################################################################
+# QUERY RECORDING
+###############################################################################
+
+class QueryRecorder:
+    """
+    Database execute wrapper that times every query.
+
+    Attributes
+    ----------
+    queries : list of tuple
+        The (sql, duration in seconds) of each executed query.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def duration(self):
+        """
+        Return the total time spent in the database, in seconds.
+        """
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """
+        Return the queries executed more than once with the same SQL.
+
+        Parameters are not part of the SQL, so a query repeated with
+        different values (the typical N+1 pattern) is reported too.
+
+        Returns
+        -------
+        dict
+            SQL statements mapped to how many times they were executed.
+        """
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+###############################################################################
+# MIDDLEWARE
+###############################################################################
+
+def _may_request_profiling(request):
+    """
+    Return whether a request may ask to be profiled with the `X-Profile`
+    header.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The incoming request.
+
+    Returns
+    -------
+    bool
+        True when DEBUG is on or the request carries the `PROFILING_TOKEN`.
+    """
+    if settings.DEBUG:
+        return True
+
+    token = getattr(settings, 'PROFILING_TOKEN', '')
+    return bool(token) and hmac.compare_digest(request.META.get(TOKEN_HEADER, '').encode(), token.encode())
+
+class ProfilingMiddleware:
+    """
+    Profile sampled requests and report where their time goes.
+
+    Methods
+    -------
+    __call__(request)
+        Serve the request, profiling it if it is sampled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """
+        Serve a request, profiling it if it is sampled.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming request.
+
+        Returns
+        -------
+        HttpResponse
+            The response, with a `Server-Timing` header if profiled.
+        """
+        mode = request.META.get(HEADER, '').lower()
+        if mode and not _may_request_profiling(request):
+            mode = ''
+        if not mode and random.random() >= getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0):
+            return self.get_response(request)
+
+        use_cprofile = mode == 'cprofile' or getattr(settings, 'PROFILING_CPROFILE', False)
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile() if use_cprofile else None
+
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            if profiler:
+                profiler.enable()
+                stack.callback(profiler.disable)
+            response = self.get_response(request)
+        wall, cpu = time.perf_counter() - started, time.thread_time() - cpu_started
+
+        duplicates = recorder.duplicates()
+        summary = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+            'status': response.status_code,
+            'wall_ms': round(wall * 1000, 3),
+            'db_ms': round(recorder.duration * 1000, 3),
+            'cpu_ms': round(cpu * 1000, 3),
+            'queries': len(recorder.queries),
+            'duplicate_queries': sum(duplicates.values()) - len(duplicates),
+            'duplicates': sorted(duplicates.items(), key=lambda item: -item[1])[:5],
+        }
+        if profiler:
+            summary['profile'] = _top_functions(profiler)
+
+        logger.info(json.dumps(summary))
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = _server_timing(summary)
+
+        return response
+
+###############################################################################
+# FORMATTING
+###############################################################################
+
+def _server_timing(summary):
+    """
+    Format a profiling summary as a `Server-Timing` header value.
+
+    Parameters
+    ----------
+    summary : dict
+        The profiling summary of a request.
+
+    Returns
+    -------
+    str
+        The header value.
+    """
+    return ', '.join([
+        f"total;dur={summary['wall_ms']}",
+        f"db;dur={summary['db_ms']};desc=\"{summary['queries']} queries\"",
+        f"cpu;dur={summary['cpu_ms']}",
+        f"dup;desc=\"{summary['duplicate_queries']} duplicate queries\"",
+    ])
+
+def _top_functions(profiler):
+    """
+    Return the most expensive functions of a cProfile run.
+
+    Parameters
+    ----------
+    profiler : cProfile.Profile
+        The stopped profiler.
+
+    Returns
+    -------
+    str
+        The pstats listing, sorted by cumulative time.
+    """
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+    return stream.getvalue()
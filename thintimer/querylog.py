@@ -0,0 +1,296 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import hashlib
+import json
+import logging
+import random
+import re
+import statistics
+import time
+from contextlib import ExitStack
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the slow-query log.
+
+* `SlowQueryMiddleware` times every query run while serving a request and
+logs those slower than `SLOW_QUERY_THRESHOLD_MS`, as JSON lines, to the
+'thintimer.slow_queries' logger (a rotating file when `SLOW_QUERY_LOG_FILE`
+is set). Each record names the view the query came from, e.g.
+'entry-get-entries-for-date' and 'main_app.views.EntryViewSet'.
+
+* Query parameters are not logged, as they may hold personal data. Queries
+are grouped by fingerprint: the SQL with literals and placeholders replaced
+by '?' and IN lists collapsed, so the same query with other values has the
+same fingerprint.
+
+* On PostgreSQL, a sample of the slow SELECT queries (`SLOW_QUERY_EXPLAIN_RATE`)
+is run again under EXPLAIN (ANALYZE, BUFFERS) and the plan is logged with
+it. Only SELECTs are explained: ANALYZE executes the statement. The plans are
+taken once the view has returned, outside the request's transactions, in a
+savepoint of their own limited by `SLOW_QUERY_EXPLAIN_TIMEOUT_MS`: a failed
+or cancelled EXPLAIN is rolled back without affecting the request.
+
+* The 'slow_query_digest' command summarizes the log of a day by fingerprint,
+slowest total time first, to find the queries that need an index.
+"""
+
+SQL_MAX_LENGTH = 4000
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%s|\$\d+')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+logger = logging.getLogger('thintimer.slow_queries')
+
+###############################################################################
+# FINGERPRINTS
+###############################################################################
+
+def normalize(sql):
+    """
+    Normalize a SQL statement so that queries differing only by their values
+    are identical.
+
+    Parameters
+    ----------
+    sql : str
+        The SQL statement.
+
+    Returns
+    -------
+    str
+        The statement with literals and placeholders replaced by '?', IN
+        lists collapsed to '(...)' and whitespace collapsed.
+    """
+    sql = _STRINGS.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+
+    return _SPACES.sub(' ', sql).strip()
+
+def fingerprint(sql):
+    """
+    Return a short, stable identifier of a normalized SQL statement.
+
+    Parameters
+    ----------
+    sql : str
+        The SQL statement.
+
+    Returns
+    -------
+    str
+        The first 16 hexadecimal digits of the SHA-1 of the normalized SQL.
+    """
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+###############################################################################
+# MIDDLEWARE
+###############################################################################
+
+class SlowQueryMiddleware:
+    """
+    Log the slow queries of every request with the view they came from.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Slow queries sampled for EXPLAIN, logged with their plan later.
+        sampled = []
+
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            result = execute(sql, params, many, context)
+            duration = (time.perf_counter() - started) * 1000
+
+            if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+                _log(request, context['connection'], sql, params, many, duration, sampled)
+
+            return result
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            response = self.get_response(request)
+
+        for connection, sql, params, entry in sampled:
+            entry['explain'] = explain(connection, sql, params)
+            logger.warning(json.dumps(entry))
+
+        return response
+
+def _explainable(connection, sql, many):
+    """
+    Return whether a slow query is sampled for EXPLAIN.
+    """
+    return (
+        connection.vendor == 'postgresql' and not many
+        and sql.lstrip().upper().startswith('SELECT')
+        and random.random() < getattr(settings, 'SLOW_QUERY_EXPLAIN_RATE', 0.0)
+    )
+
+def _log(request, connection, sql, params, many, duration, sampled):
+    """
+    Log one slow query, or keep it for later if it is sampled for EXPLAIN.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The request being served.
+    connection : DatabaseWrapper
+        The connection that ran the query.
+    sql : str
+        The SQL statement.
+    params : sequence or None
+        The query parameters, only used to explain the query.
+    many : bool
+        Whether the statement was run with executemany.
+    duration : float
+        The duration of the query, in milliseconds.
+    sampled : list
+        The queries to explain once the view has returned, as (connection,
+        sql, params, record) tuples.
+
+    Returns
+    -------
+    None
+    """
+    match = getattr(request, 'resolver_match', None)
+    record = {
+        'time': timezone.now().isoformat(),
+        'view': getattr(match, 'view_name', None),
+        'function': getattr(match, '_func_path', None),
+        'method': request.method,
+        'path': request.path,
+        'database': connection.alias,
+        'duration_ms': round(duration, 3),
+        'fingerprint': fingerprint(sql),
+        'sql': sql[:SQL_MAX_LENGTH],
+    }
+
+    if _explainable(connection, sql, many):
+        sampled.append((connection, sql, params, record))
+        return
+
+    logger.warning(json.dumps(record))
+
+def explain(connection, sql, params):
+    """
+    Return the EXPLAIN (ANALYZE, BUFFERS) plan of a query.
+
+    The statement runs again, in a savepoint (or transaction) of its own with
+    a statement timeout of `SLOW_QUERY_EXPLAIN_TIMEOUT_MS`.
+
+    Parameters
+    ----------
+    connection : DatabaseWrapper
+        A PostgreSQL connection.
+    sql : str
+        A SELECT statement.
+    params : sequence or None
+        The query parameters.
+
+    Returns
+    -------
+    str or None
+        The plan, or None if it could not be obtained.
+    """
+    timeout = int(getattr(settings, 'SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 5000))
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'SET LOCAL statement_timeout = {timeout}')
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+    except Exception:
+        logger.exception("Could not explain a slow query.")
+        return None
+
+###############################################################################
+# DIGEST
+###############################################################################
+
+def read_log(paths, day=None):
+    """
+    Read slow-query records from log files.
+
+    Parameters
+    ----------
+    paths : iterable of str or Path
+        The log files, e.g. the current log and its rotated backups.
+    day : datetime.date, optional
+        Only return the records of this (UTC) day.
+
+    Returns
+    -------
+    list of dict
+        The records. Lines that are not slow-query records are skipped.
+    """
+    prefix = day.isoformat() if day else ''
+    records = []
+
+    for path in paths:
+        with open(path) as log:
+            for line in log:
+                try:
+                    record = json.loads(line[line.index('{'):])
+                except ValueError:
+                    continue
+                if 'fingerprint' in record and record.get('time', '').startswith(prefix):
+                    records.append(record)
+
+    return records
+
+def digest(records):
+    """
+    Summarize slow-query records by fingerprint.
+
+    Parameters
+    ----------
+    records : list of dict
+        The slow-query records, see `read_log()`.
+
+    Returns
+    -------
+    list of dict
+        One summary per fingerprint, by decreasing total time: the `count`,
+        `total_ms`, `median_ms` and `max_ms` of its queries, the views they
+        came from, its normalized SQL and the plan of its slowest explained
+        query, if any.
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault(record['fingerprint'], []).append(record)
+
+    summaries = []
+    for key, group in groups.items():
+        durations = [record['duration_ms'] for record in group]
+        explained = [record for record in group if record.get('explain')]
+        summaries.append({
+            'fingerprint': key,
+            'count': len(group),
+            'total_ms': round(sum(durations), 3),
+            'median_ms': round(statistics.median(durations), 3),
+            'max_ms': max(durations),
+            'views': sorted({record['view'] or '-' for record in group}),
+            'sql': normalize(group[0]['sql']),
+            'explain': max(explained, key=lambda record: record['duration_ms'])['explain'] if explained else None,
+        })
+
+    return sorted(summaries, key=lambda summary: -summary['total_ms'])
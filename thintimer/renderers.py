@@ -0,0 +1,123 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Third-party imports: Django DRF.
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Third-party imports: Other.
+import msgpack
+import orjson
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the API renderers and parsers.
+
+* JSON is rendered and parsed with orjson, several times faster than the
+standard library `json` used by DRF's own classes, and rendered straight to
+bytes. The output is compact JSON, like DRF's; an `indent` parameter in the
+Accept header (`application/json; indent=2`) pretty-prints it.
+
+* Clients may ask for MessagePack with `Accept: application/msgpack` (or
+`?format=msgpack`) and send it with `Content-Type: application/msgpack`. It
+is smaller than JSON and faster to decode for non-browser clients.
+
+* Values neither format knows (Decimal, lazy translation strings, querysets,
+timedeltas and so on) are converted as DRF's JSON encoder does.
+"""
+
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+###############################################################################
+# JSON
+###############################################################################
+
+_encoder = JSONEncoder()
+
+def default(value):
+    """
+    Convert a value orjson or msgpack cannot serialize.
+
+    Parameters
+    ----------
+    value : object
+        The value.
+
+    Returns
+    -------
+    object
+        A serializable equivalent, see DRF's `JSONEncoder.default()`.
+    """
+    return _encoder.default(value)
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSON renderer based on orjson.
+    """
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        options = JSON_OPTIONS
+        if accepted_media_type and 'indent' in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+
+        return orjson.dumps(data, default=default, option=options)
+
+class ORJSONParser(BaseParser):
+    """
+    JSON parser based on orjson.
+    """
+
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError(f'JSON parse error - {error}')
+
+###############################################################################
+# MESSAGEPACK
+###############################################################################
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack renderer.
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return msgpack.packb(data, default=default, datetime=False)
+
+class MessagePackParser(BaseParser):
+    """
+    MessagePack parser.
+    """
+
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read())
+        except (ValueError, TypeError) as error:
+            # TypeError: unhashable map keys, e.g. an array used as a key.
+            raise ParseError(f'MessagePack parse error - {error}')
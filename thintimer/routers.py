@@ -0,0 +1,361 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Third-party imports: Django DRF.
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Local imports.
+from main_app import sharding
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the database routers.
+
+* `ShardRouter` sends the queries of a request on tasks and entries to the
+shard of the request's user, see main_app/sharding.py. `ReplicaRouter`
+routes what it leaves to the default database.
+
+* Each URL of the `DATABASE_REPLICA_URLS` setting adds a read replica of the
+primary (default) database: aliases 'replica0', 'replica1' and so on, listed
+in `DATABASE_REPLICAS`. Replication itself is the database's business, e.g.
+PostgreSQL streaming replication: replicas are never migrated or written.
+Users whose data is on another shard read it from that shard.
+
+* Only the report views (`generate_report`, `generate_xlsx_report`) and the
+entry and task lists read from a replica, chosen at random for every query.
+Everything else, and every write, goes to the primary. Sessions, users and
+profiles are always read from the primary, so authentication never sees a
+stale session.
+
+* A replica lags behind the primary. For `REPLICA_STICKY_SECONDS` after a
+write (any successful POST, PUT, PATCH or DELETE), `ReplicaPinningMiddleware`
+sets a short-lived cookie and the user's reads all go to the primary, so
+they read their own writes: an entry saved then listed is never missing.
+"""
+
+# Apps whose models may be read from a replica.
+REPLICA_APP_LABELS = {'main_app'}
+
+# Cookie pinning a client to the primary after a write.
+PIN_COOKIE_NAME = 'replica_pin'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_shard_request = ContextVar('shard_request', default=None)
+
+###############################################################################
+# READ SCOPES
+###############################################################################
+
+def is_pinned(request):
+    """
+    Return whether a client must read from the primary.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The request of the client.
+
+    Returns
+    -------
+    bool
+        True if the client wrote within the last `REPLICA_STICKY_SECONDS`.
+    """
+    return PIN_COOKIE_NAME in request.COOKIES
+
+@contextmanager
+def replica_reads(request):
+    """
+    Let the reads of the block go to the replicas, unless the client is
+    pinned to the primary.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The request being served.
+    """
+    if not settings.DATABASE_REPLICAS or is_pinned(request):
+        yield
+        return
+
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+def use_replicas(view):
+    """
+    Decorate a function view so that it reads from the replicas.
+
+    Parameters
+    ----------
+    view : callable
+        The view.
+
+    Returns
+    -------
+    callable
+        The decorated view.
+    """
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with replica_reads(request):
+            return view(request, *args, **kwargs)
+
+    return wrapped
+
+class ReplicaReadsMixin:
+    """
+    Viewset mixin reading from the replicas in the actions listed in
+    `replica_actions`.
+    """
+
+    replica_actions = ('list',)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.action_map.get(request.method.lower()) not in self.replica_actions:
+            return super().dispatch(request, *args, **kwargs)
+
+        with replica_reads(request):
+            return super().dispatch(request, *args, **kwargs)
+
+###############################################################################
+# ROUTER
+###############################################################################
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of replica scopes to a random replica
+    and everything else to the primary. See the notes above.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not _replica_reads.get():
+            return None
+        if model._meta.app_label not in REPLICA_APP_LABELS:
+            return None
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Instances read from a replica are saved to the primary.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+
+        return None
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Your data is being moved, try again in a moment."
+    default_code = 'shard_moving'
+
+def _request_shard():
+    """
+    Return the shard of the user of the current request.
+
+    The shard is looked up once per request, when the user is authenticated:
+    session users by AuthenticationMiddleware, API users by DRF.
+
+    Returns
+    -------
+    tuple or None
+        The database alias and moving flag of the shard (see
+        `sharding.shard_of()`), or None outside an authenticated request.
+    """
+    request = _shard_request.get()
+    if request is None:
+        return None
+
+    shard = getattr(request, '_shard', None)
+    if shard is None:
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        shard = request._shard = sharding.shard_of(user.pk)
+
+    return shard
+
+class ShardRouter:
+    """
+    Database router sending the queries on the data of a user to the user's
+    shard. See main_app/sharding.py.
+    """
+
+    def _shard(self, model, hints):
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._meta.label == settings.AUTH_USER_MODEL:
+                shard = _request_shard()
+                request = _shard_request.get()
+                if shard is None or request.user.pk != instance.pk:
+                    shard = sharding.shard_of(instance.pk)
+                return shard
+            if instance._state.db and sharding.is_sharded(type(instance)):
+                return instance._state.db, False
+
+        return _request_shard()
+
+    def db_for_read(self, model, **hints):
+        if not sharding.is_enabled():
+            return None
+
+        if not sharding.is_sharded(model):
+            # E.g. the user of a task read from a shard.
+            instance = hints.get('instance')
+            if instance is not None and instance._state.db in settings.DATABASE_SHARDS[1:]:
+                return DEFAULT_DB_ALIAS
+            return None
+
+        shard = self._shard(model, hints)
+        if shard is None or shard[0] == DEFAULT_DB_ALIAS:
+            return None
+
+        return shard[0]
+
+    def db_for_write(self, model, **hints):
+        if not sharding.is_sharded(model):
+            return None
+
+        current = _request_shard()
+        if current is not None and current[1]:
+            raise ShardMoving()
+
+        shard = self._shard(model, hints)
+        if shard is None or shard[0] == DEFAULT_DB_ALIAS:
+            return None
+
+        return shard[0]
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db in settings.DATABASE_SHARDS and obj2._state.db in settings.DATABASE_SHARDS:
+            return True
+
+        return None
+
+###############################################################################
+# MIDDLEWARE
+###############################################################################
+
+class ReplicaPinningMiddleware:
+    """
+    Pin clients to the primary for `REPLICA_STICKY_SECONDS` after a write.
+
+    Methods
+    -------
+    __call__(request)
+        Serve the request and pin the client if it wrote.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """
+        Serve a request and pin its client to the primary if it wrote.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming request.
+
+        Returns
+        -------
+        HttpResponse
+            The response.
+        """
+        response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+                secure=request.is_secure(),
+            )
+
+        return response
+
+def _in_request(request, chunks):
+    """
+    Yield the chunks of a streaming response in the context of its request,
+    so that the queries run while streaming go to the request's shard.
+    """
+    chunks = iter(chunks)
+    while True:
+        token = _shard_request.set(request)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _shard_request.reset(token)
+        yield chunk
+
+class ShardMiddleware:
+    """
+    Route the queries of a request on user data to the user's shard.
+
+    Methods
+    -------
+    __call__(request)
+        Serve the request in its shard context.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """
+        Serve a request with its queries on user data routed to the user's
+        shard.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming request.
+
+        Returns
+        -------
+        HttpResponse
+            The response.
+        """
+        token = _shard_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _shard_request.reset(token)
+
+        if response.streaming:
+            response.streaming_content = _in_request(request, response.streaming_content)
+
+        return response
@@ -46,29 +46,111 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Static files are served before any session or authentication work.
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
+# Opt-in Prometheus metrics exposed at /metrics to staff users and to scrapers
+# sending 'Authorization: Bearer <METRICS_TOKEN>'. Under gunicorn, set
+# PROMETHEUS_MULTIPROC_DIR to aggregate the metrics of all workers. See
+# thintimer/metrics.py.
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+PROMETHEUS_MULTIPROC_DIR = config('PROMETHEUS_MULTIPROC_DIR', default='')
+
+if PROMETHEUS_MULTIPROC_DIR:
+    # prometheus_client reads the directory from the environment.
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', PROMETHEUS_MULTIPROC_DIR)
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'thintimer.metrics.MetricsMiddleware')
+
+# Opt-in per-request profiling: wall, database and CPU time, query counts and
+# duplicate queries of sampled requests (and of requests sent with an
+# 'X-Profile' header and an 'X-Profile-Token' header matching
+# PROFILING_TOKEN), logged and returned in a Server-Timing header. See
+# thintimer/profiling.py.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.01, cast=float)
+PROFILING_CPROFILE = config('PROFILING_CPROFILE', default=False, cast=bool)
+PROFILING_LOG_FILE = config('PROFILING_LOG_FILE', default='')
+PROFILING_TOKEN = config('PROFILING_TOKEN', default='')
+
+if PROFILING_ENABLED:
+    # First, after the metrics block, so that the timings include the other
+    # middleware, MetricsMiddleware too.
+    MIDDLEWARE.insert(0, 'thintimer.profiling.ProfilingMiddleware')
+
+# Compression of responses of at least COMPRESSION_MIN_SIZE bytes, with the
+# first of COMPRESSION_ENCODINGS the client accepts (an empty list disables
+# it). Compressed files, XLSX reports, zip exports and pages embedding the
+# CSRF token are sent as they are. See thintimer/compression.py.
+COMPRESSION_ENCODINGS = config('COMPRESSION_ENCODINGS', default='br,zstd,gzip', cast=Csv())
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+
+if COMPRESSION_ENCODINGS:
+    # After WhiteNoise, which serves its own precompressed files, and before
+    # the middleware that may change the response.
+    MIDDLEWARE.insert(MIDDLEWARE.index('whitenoise.middleware.WhiteNoiseMiddleware') + 1, 'thintimer.compression.CompressionMiddleware')
+
+# Opt-in slow-query log: queries slower than the threshold are logged with
+# the view that ran them, and on PostgreSQL a sample of them with their
+# EXPLAIN (ANALYZE, BUFFERS) plan, taken after the view returns and cancelled
+# after SLOW_QUERY_EXPLAIN_TIMEOUT_MS. Summarize a day with the
+# 'slow_query_digest' command. The default threshold of 0 disables the log;
+# 200 is a good start. See thintimer/querylog.py.
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=0, cast=float)
+SLOW_QUERY_EXPLAIN_RATE = config('SLOW_QUERY_EXPLAIN_RATE', default=0.05, cast=float)
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = config('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', default=5000, cast=int)
+SLOW_QUERY_LOG_FILE = config('SLOW_QUERY_LOG_FILE', default='')
+
+if SLOW_QUERY_THRESHOLD_MS > 0:
+    MIDDLEWARE.append('thintimer.querylog.SlowQueryMiddleware')
+
+# JSON is rendered and parsed with orjson; clients may also negotiate
+# MessagePack. See thintimer/renderers.py.
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'thintimer.renderers.ORJSONRenderer',
+        'thintimer.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'thintimer.renderers.ORJSONParser',
+        'thintimer.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Emit API durations (task and entry totals) as integer seconds instead of
+# strings such as '02:00:00'. Clients can choose per request with
+# '?durations=seconds' or '?durations=string'.
+API_DURATIONS_AS_SECONDS = config('API_DURATIONS_AS_SECONDS', default=False, cast=bool)
+
 ROOT_URLCONF = 'thintimer.urls'
 
+# Templates are compiled once per process and kept in memory by the cached
+# loader, except in development where they are re-read on every render.
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -76,6 +158,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
@@ -89,8 +172,115 @@ WSGI_APPLICATION = 'thintimer.wsgi.application'
 #     'default': dj_database_url.config(default=config('DATABASE_URL'), conn_max_age=600)
 # }
 
+# Persistent connections are kept for DATABASE_CONN_MAX_AGE seconds and, with
+# DATABASE_CONN_HEALTH_CHECKS, checked before a new request reuses them.
+DATABASE_CONN_MAX_AGE = config('DATABASE_CONN_MAX_AGE', default=600, cast=int)
+DATABASE_CONN_HEALTH_CHECKS = config('DATABASE_CONN_HEALTH_CHECKS', default=True, cast=bool)
+
 DATABASES = {
-    'default': dj_database_url.config(conn_max_age=600)
+    'default': dj_database_url.config(conn_max_age=DATABASE_CONN_MAX_AGE, conn_health_checks=DATABASE_CONN_HEALTH_CHECKS)
+}
+
+# Read replicas of the default database, one URL each. Reports and the entry
+# and task lists read from them, except for REPLICA_STICKY_SECONDS after a
+# user's write, when that user reads from the primary. See
+# thintimer/routers.py.
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+DATABASE_REPLICAS = []
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica{index}'] = dj_database_url.parse(
+        url, conn_max_age=DATABASE_CONN_MAX_AGE, conn_health_checks=DATABASE_CONN_HEALTH_CHECKS,
+    )
+    DATABASES[f'replica{index}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+if DATABASE_REPLICAS:
+    MIDDLEWARE.append('thintimer.routers.ReplicaPinningMiddleware')
+
+# Sharding of tasks and entries by user. Each URL of DATABASE_SHARD_URLS adds
+# a shard ('shard1', 'shard2', ...) next to the default database, which keeps
+# the users and the shard map. Migrate each shard with 'migrate --database
+# shardN' and move users between shards with the 'rebalance_shards' command.
+# See main_app/sharding.py.
+DATABASE_SHARD_URLS = config('DATABASE_SHARD_URLS', default='', cast=Csv())
+DATABASE_SHARDS = ['default']
+for index, url in enumerate(DATABASE_SHARD_URLS, start=1):
+    DATABASES[f'shard{index}'] = dj_database_url.parse(
+        url, conn_max_age=DATABASE_CONN_MAX_AGE, conn_health_checks=DATABASE_CONN_HEALTH_CHECKS,
+    )
+    DATABASE_SHARDS.append(f'shard{index}')
+
+if len(DATABASE_SHARDS) > 1:
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1, 'thintimer.routers.ShardMiddleware',
+    )
+
+DATABASE_ROUTERS = ['thintimer.routers.ShardRouter', 'thintimer.routers.ReplicaRouter']
+
+# Connection pooling of the PostgreSQL databases. 'pool' shares at most
+# DATABASE_POOL_MAX_SIZE connections per database between the threads of each
+# worker, waiting up to DATABASE_POOL_TIMEOUT seconds for a free one;
+# 'pgbouncer' suits PgBouncer in transaction mode, disabling server-side
+# cursors. Empty keeps one persistent connection per thread. See
+# thintimer/pool.py.
+DATABASE_POOLING = config('DATABASE_POOLING', default='')
+DATABASE_POOL_MAX_SIZE = config('DATABASE_POOL_MAX_SIZE', default=10, cast=int)
+DATABASE_POOL_TIMEOUT = config('DATABASE_POOL_TIMEOUT', default=30, cast=float)
+DATABASE_POOL_MAX_IDLE = config('DATABASE_POOL_MAX_IDLE', default=300, cast=float)
+
+# SQLite profile of single-node installs: WAL journal, synchronous=NORMAL,
+# SQLITE_MMAP_SIZE bytes memory-mapped, a page cache of SQLITE_CACHE_SIZE_KB,
+# a busy timeout of SQLITE_BUSY_TIMEOUT milliseconds, and transactions taking
+# the write lock when they begin. See thintimer/sqlite_tuned/base.py.
+SQLITE_TUNED = config('SQLITE_TUNED', default=True, cast=bool)
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int)
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)
+SQLITE_CACHE_SIZE_KB = config('SQLITE_CACHE_SIZE_KB', default=64 * 1024, cast=int)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': SQLITE_MMAP_SIZE,
+    # Negative sizes are in KiB rather than pages.
+    'cache_size': -SQLITE_CACHE_SIZE_KB,
+    'busy_timeout': SQLITE_BUSY_TIMEOUT,
+}
+
+for database in DATABASES.values():
+    if database['ENGINE'] == 'django.db.backends.sqlite3' and SQLITE_TUNED:
+        database['ENGINE'] = 'thintimer.sqlite_tuned'
+        database['PRAGMAS'] = SQLITE_PRAGMAS
+    if database['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    if DATABASE_POOLING == 'pool':
+        database['ENGINE'] = 'thintimer.postgresql_pool'
+        database['CONN_MAX_AGE'] = 0
+        database['POOL'] = {
+            'max_size': DATABASE_POOL_MAX_SIZE, 'timeout': DATABASE_POOL_TIMEOUT, 'max_idle': DATABASE_POOL_MAX_IDLE,
+        }
+    elif DATABASE_POOLING == 'pgbouncer':
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Native range partitioning of the entries table by start time (PostgreSQL
+# only). One of 'month' or 'year', or empty to keep a single table. See
+# main_app/partitions.py and the 'manage_entry_partitions' command.
+ENTRY_PARTITION_INTERVAL = config('ENTRY_PARTITION_INTERVAL', default='')
+
+# Reject entries overlapping another entry of the same user. On PostgreSQL
+# the migrations then also add an exclusion constraint. See
+# main_app/overlaps.py.
+ENTRY_PREVENT_OVERLAPS = config('ENTRY_PREVENT_OVERLAPS', default=False, cast=bool)
+
+# Default age, in days, after which the 'archive_entries' command moves
+# entries to the compressed archive. See main_app/archive.py.
+ENTRY_ARCHIVE_AFTER_DAYS = config('ENTRY_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+
+# Caches. The metered backend counts hits and misses for /metrics.
+CACHES = {
+    'default': {
+        'BACKEND': 'thintimer.metrics.MeteredLocMemCache',
+    },
 }
 
 # Password validation
@@ -133,8 +323,28 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
-# For WhiteNoise to collect static files.
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# For WhiteNoise to collect static files. collectstatic also builds the
+# minified script bundles below; the collected files are named after their
+# content, precompressed with gzip and brotli, and served with immutable
+# cache headers. See thintimer/storage.py.
+STATICFILES_STORAGE = 'thintimer.storage.BundledStaticFilesStorage'
+
+# Only the hashed names are referenced by templates.
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
+
+# Script bundles: each page loads its scripts as one minified file, with the
+# 'static_bundle' template tag. Without STATIC_BUNDLES_ENABLED (by default in
+# development) the source scripts are loaded one by one instead.
+STATIC_BUNDLES = {
+    'js/main.bundle.js': ['js/main.js'],
+    'js/edit_entries.bundle.js': ['js/edit_entries.js', 'js/main.js'],
+    'js/run_reports.bundle.js': ['js/run_reports.js', 'js/main.js'],
+    'js/task_management.bundle.js': ['js/task_management.js', 'js/main.js'],
+    'js/settings.bundle.js': ['js/settings.js', 'js/main.js'],
+    'js/timer.bundle.js': ['js/timer.js'],
+    'js/signup.bundle.js': ['js/signup.js'],
+}
+STATIC_BUNDLES_ENABLED = config('STATIC_BUNDLES_ENABLED', default=not DEBUG, cast=bool)
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
@@ -161,3 +371,29 @@ SESSION_COOKIE_SECURE = config('SESSION_COOKIE_SECURE', default=False, cast=bool
 CSRF_COOKIE_SECURE = config('CSRF_COOKIE_SECURE', default=False, cast=bool)
 SECURE_SSL_REDIRECT = config('SECURE_SSL_REDIRECT', default=False, cast=bool)
 SECURE_HSTS_SECONDS = config('SECURE_HSTS_SECONDS', default=3600, cast=int)
+
+# Logging.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'thintimer.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'thintimer.slow_queries': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Rotating log files of the profiling middleware and the slow-query log.
+for logger_name, log_file in [
+    ('thintimer.profiling', PROFILING_LOG_FILE), ('thintimer.slow_queries', SLOW_QUERY_LOG_FILE),
+]:
+    if log_file:
+        LOGGING['handlers'][logger_name] = {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': log_file,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+        }
+        LOGGING['loggers'][logger_name]['handlers'] = [logger_name]
@@ -0,0 +1,57 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Third-party imports: Django natives.
+from django.db.backends.sqlite3 import base
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the tuned SQLite profile.
+
+* Single-node installs run on SQLite. With Django's defaults, the rollback
+journal blocks every reader while a write commits, each commit waits for two
+fsyncs, and a transaction that reads before it writes fails at once with
+"database is locked" when another connection wrote in the meantime.
+
+* With `SQLITE_TUNED` (the default), the SQLite databases use this backend,
+which applies the `PRAGMAS` of their settings to every new connection:
+`journal_mode=WAL` lets readers run alongside the writer,
+`synchronous=NORMAL` skips the fsync of each commit in WAL mode (a power
+loss may lose the last commits, never corrupt the file), `mmap_size` and
+`cache_size` keep more of the file in memory, and `busy_timeout` makes a
+connection wait that many milliseconds for the write lock before failing.
+
+* Transactions begin with BEGIN IMMEDIATE, taking the write lock up front:
+writers queue on the busy timeout instead of failing half-way. Entry writes
+update the task total in the same short transaction (see `Entry.save()`).
+
+* `benchmark_sqlite_writes()` of main_app/benchmarks.py compares the
+throughput of concurrent entry creation with and without this profile.
+"""
+
+###############################################################################
+# BACKEND
+###############################################################################
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend for concurrent writers. See the notes above.
+
+    The pragmas are given by the `PRAGMAS` dictionary of the database
+    settings, e.g. {'journal_mode': 'WAL', 'busy_timeout': 5000}.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f"PRAGMA {name} = {value}")
+
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        # Take the write lock now rather than on the first write.
+        self.cursor().execute("BEGIN IMMEDIATE")
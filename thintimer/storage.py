@@ -0,0 +1,78 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+# Third-party imports: Other.
+from rjsmin import jsmin
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on the static files pipeline.
+
+* `collectstatic` builds the bundles of the `STATIC_BUNDLES` setting: each
+bundle is the concatenation of its source scripts, in order, minified with
+rjsmin. A page then loads a single script, see the `static_bundle` template
+tag in main_app/templatetags/bundles.py.
+
+* Bundles go through the same post-processing as the other files: WhiteNoise
+names them after a hash of their content and writes gzip and brotli
+(with the `brotli` package) versions next to them, which it serves to
+clients accepting those encodings without compressing anything per request.
+
+* File names change with their content, so WhiteNoise serves them with
+far-future, immutable cache headers. WhiteNoiseMiddleware sits before the
+session and authentication middleware, so static requests are answered
+without touching the session.
+"""
+
+###############################################################################
+# STORAGE
+###############################################################################
+
+def build_bundle(storage, sources):
+    """
+    Concatenate and minify scripts.
+
+    Parameters
+    ----------
+    storage : Storage
+        The storage holding the collected source files.
+    sources : list of str
+        The paths of the scripts, in load order.
+
+    Returns
+    -------
+    str
+        The minified bundle.
+    """
+    parts = []
+    for source in sources:
+        with storage.open(source) as handle:
+            parts.append(handle.read().decode('utf-8'))
+
+    # Scripts may omit their final semicolon.
+    return jsmin(';\n'.join(parts))
+
+class BundledStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise storage that also builds the minified script bundles of the
+    `STATIC_BUNDLES` setting.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for name, sources in getattr(settings, 'STATIC_BUNDLES', {}).items():
+                if self.exists(name):
+                    self.delete(name)
+                self._save(name, ContentFile(build_bundle(self, sources).encode('utf-8')))
+                paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run=dry_run, **options)
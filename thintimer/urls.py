@@ -19,6 +19,7 @@ from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from user_auth import views as ua_views # Import the view from your user_auth app
 from main_app import views as m_views # Import the view from your main_app app
+from thintimer import metrics
 
 from rest_framework.routers import DefaultRouter
 
@@ -62,6 +63,9 @@ urlpatterns = [
     # Define the admin route to the Django admin panel.
     path('admin/', admin.site.urls),
 
+    # Prometheus metrics, for monitoring and capacity planning.
+    path('metrics', metrics.metrics_view, name='metrics'),
+
     # Define API endpoints for user authentication.
     path('api/login/', ua_views.user_login, name='user_login'),  # Login endpoint.
     path('api/logout/', ua_views.user_logout, name='user_logout'), # Logout endpoint.
@@ -71,10 +75,12 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/report/', m_views.generate_report, name='generate_report'),
     path('api/generate_xlsx_report/', m_views.generate_xlsx_report, name='generate_xlsx_report'),
+    path('api/export/', m_views.export_account, name='export_account'),
 
     # Define the routes for settings.
     path('api/update_username/', ua_views.update_username, name='update_username'),
     path('api/update_email/', ua_views.update_email, name='update_email'),
+    path('api/update_time_zone/', ua_views.update_time_zone, name='update_time_zone'),
     path('api/reset_password/', ua_views.reset_password, name='reset_password'),
     path('api/delete_account/', ua_views.delete_account, name='delete_account'),
 
@@ -1,3 +1,28 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
 
 # Create your models here.
+
+class Profile(models.Model):
+    """
+    Per-user preferences.
+
+    `time_zone` is an IANA time zone name, e.g. 'Europe/Paris'. Days in the
+    editor and the reports are the user's local days. See
+    user_auth/timezones.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
+    time_zone = models.CharField(max_length=64, default=settings.TIME_ZONE)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(time_zone_cache_key(self.user_id))
+
+    def delete(self, *args, **kwargs):
+        super().delete(*args, **kwargs)
+        cache.delete(time_zone_cache_key(self.user_id))
+
+def time_zone_cache_key(user_id):
+    return f'user_auth:time_zone:{user_id}'
@@ -4,6 +4,8 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
+from .timezones import is_valid
+
 # Define serializers for user-related operations.
 
 """
@@ -58,3 +60,17 @@ class UserSignUpSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password')
+
+class TimeZoneSerializer(serializers.Serializer):
+    """
+    Serializer for the time zone of a user.
+
+    It validates that 'time_zone' is a known IANA time zone name, such as
+    'Europe/Paris'.
+    """
+    time_zone = serializers.CharField(max_length=64)
+
+    def validate_time_zone(self, value):
+        if not is_valid(value):
+            raise serializers.ValidationError("Unknown time zone.")
+        return value
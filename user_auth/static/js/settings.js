@@ -75,6 +75,45 @@ document.getElementById('updateEmailForm').addEventListener('submit', function(e
   updateEmail(event.target);
 });
 
+// Function to handle time zone updates.
+// It performs an API call to '/api/update_time_zone/' to update the time zone.
+function updateTimeZone(form) {
+  // Collects form data.
+  const formData = new FormData(form);
+
+  // CSRF token for security.
+  const csrftoken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+
+  // Fetch API for updating the time zone.
+  fetch('/api/update_time_zone/', {
+    method: 'POST',
+    headers: {
+      'X-CSRFToken': csrftoken // CSRF token attached to request header.
+    },
+    body: formData
+  })
+  .then(response => response.json())
+  .then(data => {
+    if (data.status !== 'success') {
+      alert('Unknown time zone.');
+    }
+  })
+  .catch(error => {
+    // Handle errors
+  });
+}
+
+// Attach submit event listener to 'updateTimeZoneForm'.
+document.getElementById('updateTimeZoneForm').addEventListener('submit', function(event) {
+  event.preventDefault();
+  updateTimeZone(event.target);
+});
+
+// Fill in the time zone of the browser.
+document.getElementById('detectTimeZone').addEventListener('click', function() {
+  document.getElementById('timeZone').value = Intl.DateTimeFormat().resolvedOptions().timeZone;
+});
+
 // Function to handle password updates.
 // It performs an API call to '/api/reset_password/' to update the email.
 function resetPassword(form) {
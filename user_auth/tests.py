@@ -8,11 +8,15 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.cache import cache
 
 # Third-party imports: Django DRF.
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+# Local imports.
+from .timezones import get_time_zone
+
 ###############################################################################
 # DRF API TEST CASES
 ###############################################################################
@@ -209,6 +213,31 @@ class UpdateEmailTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+# Test class for updating the time zone.
+class UpdateTimeZoneTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.client.login(username='testuser', password='testpass')
+        self.url = reverse('update_time_zone')
+        self.addCleanup(cache.clear)
+
+    def test_valid_time_zone_update(self):
+        self.assertEqual(get_time_zone(self.user).key, 'UTC')
+        response = self.client.post(self.url, {'time_zone': 'Asia/Tokyo'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.user.profile.time_zone, 'Asia/Tokyo')
+        self.assertEqual(get_time_zone(self.user).key, 'Asia/Tokyo')
+
+    def test_invalid_time_zone_update(self):
+        response = self.client.post(self.url, {'time_zone': 'Mars/Olympus'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_anonymous_time_zone_update(self):
+        self.client.logout()
+        response = self.client.post(self.url, {'time_zone': 'Asia/Tokyo'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 # Test class for updating password.
 class UpdatePasswordTests(APITestCase):
     def setUp(self):
@@ -0,0 +1,170 @@
+###############################################################################
+# IMPORTS
+###############################################################################
+
+# Standard library imports.
+import zoneinfo
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+# Third-party imports: Django natives.
+from django.conf import settings
+from django.core.cache import cache
+
+# Local imports.
+from .models import Profile, time_zone_cache_key
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+"""
+Notes on per-user time zones.
+
+* Each user may have a `Profile.time_zone`; users without a profile use the
+`TIME_ZONE` setting. `get_time_zone()` caches the name per user in the
+Django cache for `CACHE_TIMEOUT` seconds, so reading it costs no query on
+most requests. Saving the profile invalidates the cached name, but the
+default cache is local to each worker process: the other workers keep the
+old zone until their copy expires, hence the short timeout. With a shared
+cache backend (e.g. Redis) the invalidation reaches every worker.
+
+* Entries are stored in UTC. Per-day and report queries filter them with
+`start_time` ranges whose bounds are the UTC instants of the user's local
+midnights, computed by `day_range()` and memoized: the database then uses
+plain indexed range comparisons, and no per-row conversion is needed. A
+month is the range from its first to its last day.
+
+* Grouping by local day, week or month happens in the database with the
+user's time zone (`Trunc*(..., tzinfo=...)`).
+
+* Archived entries are only kept as daily totals per UTC day (see
+main_app/archive.py), which cannot be split into local days. Reports of
+users in other time zones count archived time in the UTC day it started, so
+near midnight it may fall in the neighbouring local day, week or month, and
+a report range selects archived days by their UTC date.
+"""
+
+# Seconds a worker may use a time zone changed in another worker.
+CACHE_TIMEOUT = 60
+
+###############################################################################
+# TIME ZONES
+###############################################################################
+
+def is_valid(name):
+    """
+    Return whether a name is a known IANA time zone.
+
+    Parameters
+    ----------
+    name : str
+        The time zone name, e.g. 'America/New_York'.
+
+    Returns
+    -------
+    bool
+        True if the time zone exists.
+    """
+    try:
+        zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+
+    return True
+
+def get_time_zone(user):
+    """
+    Return a user's time zone.
+
+    Parameters
+    ----------
+    user : User
+        The user; anonymous users get the default time zone.
+
+    Returns
+    -------
+    zoneinfo.ZoneInfo
+        The user's time zone, or the `TIME_ZONE` setting.
+    """
+    if not getattr(user, 'is_authenticated', False):
+        return zoneinfo.ZoneInfo(settings.TIME_ZONE)
+
+    key = time_zone_cache_key(user.pk)
+    name = cache.get(key)
+    if name is None:
+        name = Profile.objects.filter(user=user).values_list('time_zone', flat=True).first() or settings.TIME_ZONE
+        cache.set(key, name, CACHE_TIMEOUT)
+
+    return zoneinfo.ZoneInfo(name)
+
+def set_time_zone(user, name):
+    """
+    Store a user's time zone.
+
+    Parameters
+    ----------
+    user : User
+        The user.
+    name : str
+        A valid IANA time zone name.
+
+    Returns
+    -------
+    Profile
+        The user's profile.
+    """
+    profile, _ = Profile.objects.get_or_create(user=user)
+    profile.time_zone = name
+    profile.save()
+
+    return profile
+
+###############################################################################
+# DAY BOUNDARIES
+###############################################################################
+
+@lru_cache(maxsize=4096)
+def day_range(start_date, end_date, tzinfo):
+    """
+    Return the instants bounding whole local days.
+
+    Parameters
+    ----------
+    start_date : datetime.date
+        The first day.
+    end_date : datetime.date
+        The last day, included.
+    tzinfo : tzinfo
+        The time zone of the days.
+
+    Returns
+    -------
+    tuple of datetime.datetime
+        The aware start of the first day and start of the day after the last
+        one, for `start_time__gte` and `start_time__lt` filters.
+    """
+    start = datetime.combine(start_date, time.min, tzinfo=tzinfo)
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tzinfo)
+
+    return start, end
+
+def user_day_range(user, start_date, end_date):
+    """
+    Return the instants bounding whole days in a user's time zone.
+
+    Parameters
+    ----------
+    user : User
+        The user.
+    start_date : datetime.date
+        The first local day.
+    end_date : datetime.date
+        The last local day, included.
+
+    Returns
+    -------
+    tuple of datetime.datetime
+        See `day_range()`.
+    """
+    return day_range(start_date, end_date, get_time_zone(user))
@@ -11,10 +11,11 @@ from django.db import IntegrityError
 from django.shortcuts import render, redirect
 
 # Third-party imports: Django DRF
-from rest_framework import status
+from rest_framework import permissions, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from .serializers import UserLoginSerializer, UserSignUpSerializer
+from rest_framework.decorators import api_view, permission_classes
+from .serializers import TimeZoneSerializer, UserLoginSerializer, UserSignUpSerializer
+from .timezones import get_time_zone, set_time_zone
 
 ###############################################################################
 # DJANGO REST API FRAMEWORK (DRF) VIEWS
@@ -223,6 +224,36 @@ def update_email(request):
     # Return Response object indicating success
     return Response({'status': 'success'})
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def update_time_zone(request):
+    """
+    Updates the time zone of the authenticated user.
+
+    Days in the entry editor and in reports are days in this time zone.
+
+    Parameters
+    ----------
+    request : Request
+        The request object containing the IANA time zone name in POST data.
+
+    Returns
+    -------
+    Response
+        Response object indicating the status of the operation.
+
+    """
+    # Validate the time zone name.
+    serializer = TimeZoneSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({'status': 'failure', 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Store it in the user's profile.
+    set_time_zone(request.user, serializer.validated_data['time_zone'])
+
+    # Return Response object indicating success
+    return Response({'status': 'success'})
+
 @api_view(['POST'])
 def reset_password(request):
     """
@@ -329,4 +360,4 @@ def settings(request):
         HTTP response, rendering the signup.html template.
     """
 
-    return render(request, 'settings.html')
+    return render(request, 'settings.html', {'time_zone': get_time_zone(request.user).key})